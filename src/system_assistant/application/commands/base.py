@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, AsyncIterator
 
 
 class Command:
@@ -10,3 +10,7 @@ class BaseCommandHandler[T: Command, R: Any](ABC):
     @abstractmethod
     async def handle(self, command: T) -> R:
         ...
+
+    async def stream(self, command: T) -> AsyncIterator[Any]:
+        """Result in parts as soon as they are ready. By default the whole result at once"""
+        yield await self.handle(command)
@@ -1,10 +1,13 @@
+import asyncio
 from dataclasses import dataclass
+from typing import AsyncIterator
 import uuid
 
 from loguru import logger
 
 from system_assistant.application.gateways.chat import ChatGateway
 from system_assistant.application.services.ai.base import AIAgent
+from system_assistant.application.services.ai.context import ContextWindowManager
 from system_assistant.core.types import SystemContext
 from system_assistant.domain.entities.chat import Chat
 from system_assistant.domain.vo import ID, Message
@@ -25,10 +28,15 @@ class RequestSystemHelpCommandHandler(BaseCommandHandler[RequestSystemHelpComman
     def __init__(
         self,
         chat_gateway: ChatGateway,
-        ai_agent: AIAgent
+        ai_agent: AIAgent,
+        history_limit: int = 50,
+        context_window: ContextWindowManager | None = None,
     ) -> None:
         self._chat_gateway = chat_gateway
         self._ai_agent = ai_agent
+        self._history_limit = history_limit
+        self._context_window = context_window
+        self._summaries: set[asyncio.Task] = set()
 
     def _create_chat(self, command: RequestSystemHelpCommand) -> Chat:
         title = command.message if len(command.message) < 200 else f'{command.message}...'
@@ -36,7 +44,7 @@ class RequestSystemHelpCommandHandler(BaseCommandHandler[RequestSystemHelpComman
             operating_system=command.system_context.operating_system,
             distribution=command.system_context.distribution,
             current_dir=command.system_context.cwd,
-            directory_list=command.system_context.directory_list,
+            directory_digest=command.system_context.directory_digest(),
         )
         chat = Chat(
             id=command.chat_id or str(uuid.uuid4()),
@@ -45,20 +53,66 @@ class RequestSystemHelpCommandHandler(BaseCommandHandler[RequestSystemHelpComman
         )
         return chat
 
-    async def handle(self, command: RequestSystemHelpCommand) -> AIAnswer:
-        logger.info(f'Handling "{command.__class__.__name__}" command')
-        message = Message(sender='user', content=command.message)
-
+    async def _load_chat(self, command: RequestSystemHelpCommand) -> Chat:
+        chat = None
         if command.chat_id is not None:
-            chat = await self._chat_gateway.get_by_id(command.chat_id)
-            if chat is None:
-                chat = self._create_chat(command)
-        else:
+            chat = await self._chat_gateway.get_window(command.chat_id, limit=self._history_limit)
+        if chat is None:
             chat = self._create_chat(command)
+        chat.add_message(Message(sender='user', content=command.message))
+        return chat
+
+    async def _fit(self, chat: Chat) -> Chat:
+        return chat if self._context_window is None else await self._context_window.fit(chat)
 
-        chat.add_message(message)
-        ai_answer = await self._ai_agent.chat(chat)
-        chat.add_message(Message(sender='assistant', content=ai_answer['content']))  # type: ignore
+    async def _save_answer(self, chat: Chat, content: str):
+        chat.add_message(Message(sender='assistant', content=content))
         await self._chat_gateway.save(chat)
-        logger.info(f'Saved chat: chat_id={command.chat_id}')
+        logger.info(f'Saved chat: chat_id={chat.id}')
+        if self._context_window is not None:
+            # Off the answer's path: the summary is for the next turns. One still running
+            # at exit is lost, the messages it covered are summarized next time
+            task = asyncio.create_task(self._summarize(chat, self._context_window))
+            self._summaries.add(task)
+            task.add_done_callback(self._summaries.discard)
+
+    async def _load_earlier(self, chat: Chat) -> list[Message]:
+        """
+        Messages between the summary and the loaded window, they slid out of the window
+        before they were summarized. At most `history_limit` of them a turn
+        """
+        if len(chat.messages) < 2 or chat.messages[1].seq is None:
+            return []
+        summarized = chat.summary_seq if chat.summary_seq is not None else 0
+        missing = chat.messages[1].seq - summarized - 1
+        if missing <= 0:
+            return []
+        window = await self._chat_gateway.get_window(
+            chat.id, limit=min(missing, self._history_limit), after_seq=summarized,
+        )
+        return [] if window is None else window.messages[1:]
+
+    async def _summarize(self, chat: Chat, context_window: ContextWindowManager):
+        try:
+            if await context_window.summarize(chat, await self._load_earlier(chat)):
+                # Stored only if no newer summary was saved meanwhile
+                await self._chat_gateway.save(chat)
+        except Exception as e:
+            logger.error(f'Failed to save chat summary: chat_id={chat.id}, error={e}')
+
+    async def handle(self, command: RequestSystemHelpCommand) -> AIAnswer:
+        logger.info(f'Handling "{command.__class__.__name__}" command')
+        chat = await self._load_chat(command)
+        ai_answer = await self._ai_agent.chat(await self._fit(chat))
+        await self._save_answer(chat, ai_answer['content'])  # type: ignore
         return ai_answer
+
+    async def stream(self, command: RequestSystemHelpCommand) -> AsyncIterator[str]:
+        """Answer chunks as the AI agent generates them, the chat is saved once it is complete"""
+        logger.info(f'Streaming "{command.__class__.__name__}" command')
+        chat = await self._load_chat(command)
+        chunks = []
+        async for chunk in self._ai_agent.stream(await self._fit(chat)):
+            chunks.append(chunk)
+            yield chunk
+        await self._save_answer(chat, ''.join(chunks))
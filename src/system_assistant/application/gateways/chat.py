@@ -1,28 +1,242 @@
+from dataclasses import dataclass
+import hashlib
+import json
+from pathlib import Path
 import typing as t
 
 from loguru import logger
 
+from system_assistant.application.gateways.search_index import (
+    InvertedIndex,
+    make_snippet,
+    tokenize,
+)
+from system_assistant.core.cache import LRUCache
+from system_assistant.core.types import SearchHit
 from system_assistant.domain.entities.chat import Chat
-from system_assistant.domain.vo import ID
+from system_assistant.domain.vo import ID, Message
+
+
+_MESSAGE_OVERHEAD = 120
+"""Rough size of a `Message` object itself, without its content"""
+
+
+def approximate_size(chat: Chat) -> int:
+    """Approximate memory taken by the chat, in bytes"""
+    return len(chat.title) + sum(
+        message.content_size + _MESSAGE_OVERHEAD for message in chat.messages
+    )
+
+
+def is_newer_summary(chat: Chat, summary_seq: int | None) -> bool:
+    """
+    Whether the summary of `chat` covers more messages than the stored one, which covers
+    them up to `summary_seq`. Summaries are saved in the background, so the next save of
+    a chat loaded before that must not replace the summary with its older one
+    """
+    return chat.summary_seq is not None and (summary_seq is None or chat.summary_seq > summary_seq)
+
+
+def dump_chat(chat: Chat) -> dict[str, t.Any]:
+    """JSON-serializable representation of the chat, read back with `load_chat`"""
+    return {
+        'id': chat.id,
+        'title': chat.title,
+        'summary': chat.summary,
+        'summary_seq': chat.summary_seq,
+        'messages': [[m.sender, m.content, m.seq] for m in chat.messages],
+    }
+
+
+def load_chat(data: dict[str, t.Any], persisted: bool = True) -> Chat:
+    """
+    Chat from `dump_chat` output. With `persisted=False` messages lose their `seq`,
+    so a gateway saves all of them as new
+    """
+    return Chat(
+        id=data['id'],
+        title=data['title'],
+        messages=[
+            Message(sender=sender, content=content, seq=seq if persisted else None)
+            for sender, content, seq in data['messages']
+        ],
+        summary=data['summary'],
+        summary_seq=data['summary_seq'],
+    )
 
 
 class ChatGateway(t.Protocol):
     async def get_by_id(self, id: ID) -> Chat | None:
         raise NotImplementedError
 
+    async def get_window(self, id: ID, limit: int, after_seq: int | None = None) -> Chat | None:
+        """
+        Load the chat with its system prompt (first message) and at most `limit` other messages:
+        the latest ones, or the ones right after `after_seq` if the cursor is provided
+        """
+        raise NotImplementedError
+
     async def save(self, chat: Chat) -> ID:
         ...
 
+    async def save_many(self, chats: list[Chat]) -> None:
+        """Save a batch of chats, in a single transaction where the storage supports it"""
+        ...
+
+    def iter_chats(self, batch_size: int = 500) -> t.AsyncIterator[list[Chat]]:
+        """Stream every stored chat with all its messages, at most `batch_size` chats at a time"""
+        raise NotImplementedError
+
+    async def search(self, text: str, limit: int = 10, offset: int = 0) -> list[SearchHit]:
+        """Full-text search over messages of all chats, best matches first"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Release connections and persist everything that is still pending"""
+        ...
+
+
+@dataclass(eq=False, slots=True)
+class MemoryStoreStats:
+    resident_chats: int
+    resident_bytes: int
+    spilled_chats: int
+    evictions: int
+    hits: int
+    misses: int
+
 
 class InMemoryChatGateway:
-    def __init__(self):
-        self.chats = {}
+    """
+    Keeps chats in memory within a budget of `max_bytes` (approximate size) and `max_chats`.
+    Least recently used chats, and chats not used for `ttl` seconds, are evicted.
+    With `spill_dir` evicted chats are written there and loaded back on the next access.
+    Messages are searched through an inverted index that is updated on every save
+    """
+
+    def __init__(
+        self,
+        max_bytes: int | None = None,
+        max_chats: int = 10_000,
+        ttl: float | None = None,
+        spill_dir: Path | None = None,
+    ):
+        self.chats: LRUCache[ID, Chat] = LRUCache(
+            max_chats, max_bytes, weigh=approximate_size, on_evict=self._on_evict, ttl=ttl,
+        )
+        self._spill_dir = spill_dir
+        self._spilled: set[ID] = set()
+        self._index = InvertedIndex()
+        if spill_dir is not None:
+            spill_dir.mkdir(parents=True, exist_ok=True)
+
+    def stats(self) -> MemoryStoreStats:
+        return MemoryStoreStats(
+            resident_chats=len(self.chats),
+            resident_bytes=self.chats.weight,
+            spilled_chats=len(self._spilled),
+            evictions=self.chats.stats.evictions,
+            hits=self.chats.stats.hits,
+            misses=self.chats.stats.misses,
+        )
 
     async def get_by_id(self, id: ID) -> Chat | None:
-        chat = self.chats.get(id, None)
-        return chat
+        return self._get(id)
+
+    async def get_window(self, id: ID, limit: int, after_seq: int | None = None) -> Chat | None:
+        chat = self._get(id)
+        if chat is None:
+            return None
+        # Messages are stored in order and `seq` is the position in the list
+        if after_seq is None:
+            start = max(1, len(chat.messages) - limit)
+        else:
+            start = max(1, after_seq + 1)
+        return chat.with_messages(chat.messages[:1] + chat.messages[start:start + limit])
 
     async def save(self, chat: Chat) -> ID:
-        self.chats[chat.id] = chat
-        logger.debug(self.chats)
+        stored = self._get(chat.id) or chat
+        new_messages = chat.unsaved_messages()
+        if stored is not chat:
+            stored.messages.extend(new_messages)
+            if is_newer_summary(chat, stored.summary_seq):
+                stored.summary, stored.summary_seq = chat.summary, chat.summary_seq
+        first_seq = len(stored.messages) - len(new_messages)
+        for seq, message in enumerate(new_messages, start=first_seq):
+            message.seq = seq
+            self._index.add(chat.id, message)
+        self.chats.put(chat.id, stored)
+        logger.debug(f'Saved chat in memory: id={chat.id}, new_messages={len(new_messages)}')
         return chat.id
+
+    async def save_many(self, chats: list[Chat]) -> None:
+        for chat in chats:
+            await self.save(chat)
+
+    async def iter_chats(self, batch_size: int = 500) -> t.AsyncIterator[list[Chat]]:
+        # Spilled chats are read without being loaded back, so iterating doesn't evict anything
+        batch = []
+        for id in [*self.chats, *self._spilled]:
+            chat = self.chats.peek(id)
+            if chat is None and id in self._spilled:
+                chat = self._read_spilled(id)
+            if chat is None:
+                continue
+            batch.append(chat)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def search(self, text: str, limit: int = 10, offset: int = 0) -> list[SearchHit]:
+        terms = tokenize(text)
+        hits = []
+        for chat_id, seq, rank in self._index.search(text)[offset:offset + limit]:
+            chat = self.chats.peek(chat_id) or self._get(chat_id)
+            if chat is None:
+                continue
+            message = chat.messages[seq]
+            hits.append(SearchHit(
+                chat_id=chat_id,
+                chat_title=chat.title,
+                seq=seq,
+                sender=message.sender,
+                snippet=make_snippet(message.content, terms),
+                rank=rank,
+            ))
+        return hits
+
+    async def close(self) -> None:
+        for id in self._spilled:
+            self._spill_path(id).unlink(missing_ok=True)
+        self._spilled.clear()
+
+    def _get(self, id: ID) -> Chat | None:
+        chat = self.chats.get(id)
+        if chat is None and id in self._spilled:
+            chat = self._load_spilled(id)
+            self.chats.put(id, chat)
+        return chat
+
+    def _spill_path(self, id: ID) -> Path:
+        assert self._spill_dir is not None
+        return self._spill_dir / f'{hashlib.sha256(id.encode()).hexdigest()}.json'
+
+    def _on_evict(self, id: ID, chat: Chat):
+        if self._spill_dir is None:
+            self._index.remove_chat(id, chat.messages)
+            logger.debug(f'Evicted chat from memory: id={id}')
+            return
+        self._spill_path(id).write_text(json.dumps(dump_chat(chat)))
+        self._spilled.add(id)
+        logger.debug(f'Spilled chat to disk: id={id}')
+
+    def _read_spilled(self, id: ID) -> Chat:
+        return load_chat(json.loads(self._spill_path(id).read_text()))
+
+    def _load_spilled(self, id: ID) -> Chat:
+        chat = self._read_spilled(id)
+        self._spill_path(id).unlink()
+        self._spilled.discard(id)
+        return chat
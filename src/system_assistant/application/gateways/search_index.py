@@ -0,0 +1,78 @@
+from collections import defaultdict
+import math
+import re
+
+from system_assistant.domain.vo import ID, Message
+
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list[str]:
+    return [word.lower() for word in _WORD_RE.findall(text)]
+
+
+def make_snippet(content: str, terms: list[str], width: int = 60) -> str:
+    """Part of the content around the first matched term, with matched terms in brackets"""
+    lowered = content.lower()
+    positions = [lowered.find(term) for term in terms if term in lowered]
+    start = max(0, min(positions, default=0) - width // 2)
+    snippet = content[start:start + width * 2]
+    for term in terms:
+        snippet = re.sub(f'(?i)\\b({re.escape(term)})', r'[\1]', snippet)
+    prefix = '...' if start > 0 else ''
+    suffix = '...' if start + width * 2 < len(content) else ''
+    return f'{prefix}{snippet}{suffix}'
+
+
+class InvertedIndex:
+    """
+    In-memory full-text index over chat messages: word -> postings of `(chat_id, seq)`
+    with term frequencies. Hits must contain every query word and are ranked by TF-IDF
+    """
+
+    def __init__(self):
+        self._postings: defaultdict[str, dict[tuple[ID, int], int]] = defaultdict(dict)
+        self._documents: defaultdict[ID, set[int]] = defaultdict(set)
+
+    def add(self, chat_id: ID, message: Message):
+        assert message.seq is not None, 'Only persisted messages can be indexed'
+        for word in tokenize(message.content):
+            postings = self._postings[word]
+            key = (chat_id, message.seq)
+            postings[key] = postings.get(key, 0) + 1
+        self._documents[chat_id].add(message.seq)
+
+    def remove_chat(self, chat_id: ID, messages: list[Message]):
+        for message in messages:
+            for word in set(tokenize(message.content)):
+                postings = self._postings.get(word)
+                if postings is None:
+                    continue
+                postings.pop((chat_id, message.seq), None)  # type: ignore
+                if not postings:
+                    del self._postings[word]
+        self._documents.pop(chat_id, None)
+
+    def search(self, text: str) -> list[tuple[ID, int, float]]:
+        """`(chat_id, seq, rank)` of the matched messages, best first (lower rank is better)"""
+        terms = set(tokenize(text))
+        if not terms or any(term not in self._postings for term in terms):
+            return []
+        documents_count = sum(len(seqs) for seqs in self._documents.values())
+        candidates: set[tuple[ID, int]] | None = None
+        for term in sorted(terms, key=lambda term: len(self._postings[term])):
+            keys = self._postings[term].keys()
+            candidates = set(keys) if candidates is None else candidates & keys
+            if not candidates:
+                return []
+        assert candidates is not None
+        scored = []
+        for key in candidates:
+            score = sum(
+                postings[key] * math.log(1 + documents_count / len(postings))
+                for postings in (self._postings[term] for term in terms)
+            )
+            scored.append((key[0], key[1], -score))
+        scored.sort(key=lambda hit: hit[2])
+        return scored
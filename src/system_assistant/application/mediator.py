@@ -1,6 +1,6 @@
 from collections import defaultdict
 from dataclasses import dataclass, field
-from typing import Any, overload
+from typing import Any, AsyncIterator, overload
 
 from system_assistant.application.commands.base import (BaseCommandHandler,
                                                         Command)
@@ -9,20 +9,23 @@ from system_assistant.application.queries.base import BaseQueryHandler, Query
 
 @dataclass(eq=False, repr=False, slots=True)
 class Mediator:
-    query_handlers: dict[type[Query], BaseQueryHandler] = field(
-        kw_only=True, default_factory=dict,
+    query_handlers: dict[type[Query], list[BaseQueryHandler]] = field(
+        kw_only=True, default_factory=lambda: defaultdict(list)
     )
     command_handlers: dict[type[Command], list[BaseCommandHandler]] = field(
         kw_only=True, default_factory=lambda: defaultdict(list)
     )
 
     async def handle_query(self, query: Query) -> Any:
-        return await self.query_handlers[query.__class__].handle(query)
+        return await self.query_handlers[query.__class__][0].handle(query)
 
     async def handle_command(self, command: Command) -> Any:
         result = await self.command_handlers[command.__class__][0].handle(command)
         return result
 
+    def stream_command(self, command: Command) -> AsyncIterator[Any]:
+        return self.command_handlers[command.__class__][0].stream(command)
+
     @overload
     def register_handlers(
         self, command_or_query: type[Query], handlers: list[BaseQueryHandler],
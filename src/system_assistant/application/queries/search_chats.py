@@ -0,0 +1,24 @@
+from dataclasses import dataclass
+
+from loguru import logger
+
+from system_assistant.application.gateways.chat import ChatGateway
+from system_assistant.core.types import SearchHit
+
+from .base import BaseQueryHandler, Query
+
+
+@dataclass(eq=False, slots=True, repr=False)
+class SearchChatsQuery(Query):
+    text: str
+    limit: int = 10
+    offset: int = 0
+
+
+class SearchChatsQueryHandler(BaseQueryHandler[SearchChatsQuery, list[SearchHit]]):
+    def __init__(self, chat_gateway: ChatGateway) -> None:
+        self._chat_gateway = chat_gateway
+
+    async def handle(self, query: SearchChatsQuery) -> list[SearchHit]:
+        logger.info(f'Handling "{query.__class__.__name__}" query')
+        return await self._chat_gateway.search(query.text, limit=query.limit, offset=query.offset)
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Protocol
+import asyncio
+from typing import AsyncIterator, Callable, Protocol
 
 from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import ID
 from system_assistant.core.types import AIAnswer
 
 
@@ -17,12 +19,40 @@ class FakeLLM(LLM):
 
 
 class AIAgent(Protocol):
-    """LLM extended with tools"""
-    temperature: float
-    tools: list[Callable]
+    """LLM extended with tools, its settings are changed by `update_settings`"""
+
+    @property
+    def model(self) -> str: ...
+
+    @property
+    def temperature(self) -> float: ...
+
+    @property
+    def tools(self) -> list[Callable]: ...
+
+    @abstractmethod
+    async def chat(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AIAnswer:
+        """`temperature` and `tools` override the settings for this answer only"""
+        ...
 
     @abstractmethod
-    async def chat(self, chat: Chat) -> AIAnswer:
+    def stream(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AsyncIterator[str]:
+        """Answer text as it is generated, chunk by chunk; joined chunks make the whole answer"""
+        ...
+
+    @abstractmethod
+    def used_tools(self, chat_id: ID) -> list[str]:
+        """Names of the tools called while answering in the chat last time"""
         ...
 
     @abstractmethod
@@ -31,12 +61,32 @@ class AIAgent(Protocol):
 
 
 class FakeAIAgent:
+    model = 'fake'
+
     def __init__(self):
         self.temperature = 1.0
         self.tools = []
 
-    async def chat(self, chat: Chat) -> AIAnswer:
+    async def chat(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AIAnswer:
         return AIAnswer(chat_id=chat.id, is_successful=True, content="I'm fake AI agent")
 
+    async def stream(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AsyncIterator[str]:
+        for chunk in ("I'm ", 'fake ', 'AI ', 'agent'):
+            await asyncio.sleep(0)
+            yield chunk
+
+    def used_tools(self, chat_id: ID) -> list[str]:
+        return []
+
     def update_settings(self, temperature: float | None = None, tools: list | None = None):
         ...
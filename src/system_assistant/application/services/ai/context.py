@@ -0,0 +1,154 @@
+import asyncio
+from functools import cache
+from typing import Callable
+
+from loguru import logger
+
+from system_assistant.application.services.ai.base import LLM
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message, Sender
+
+
+_MESSAGE_TOKENS_OVERHEAD = 4
+"""Tokens that a chat API adds around every message (role, separators)"""
+
+_SUMMARY_PROMPT = """
+Summarize the conversation between a user and an OS assistant below in under 200 words.
+Keep everything that may matter later: paths, file names, commands, container names, decisions.
+Answer with the summary only.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+"""
+
+
+@cache
+def _get_encoder() -> Callable[[str], list[int]] | None:
+    try:
+        import tiktoken
+        return tiktoken.get_encoding('cl100k_base').encode
+    except Exception as e:  # tiktoken isn't installed or can't download its encoding
+        logger.warning(f'Counting tokens approximately, tiktoken is unavailable: {e}')
+        return None
+
+
+async def load_encoder():
+    """Load the tokenizer in a thread: tiktoken downloads its encoding on first use"""
+    if _get_encoder.cache_info().currsize == 0:
+        await asyncio.to_thread(_get_encoder)
+
+
+def count_text_tokens(text: str) -> int:
+    encode = _get_encoder()
+    if encode is None:
+        return len(text) // 4 + 1
+    return len(encode(text))
+
+
+def count_tokens(message: Message) -> int:
+    """Number of tokens in the message, cached on the message"""
+    if message.tokens is None:
+        message.tokens = count_text_tokens(message.content) + _MESSAGE_TOKENS_OVERHEAD
+    return message.tokens
+
+
+class ContextWindowManager:
+    """
+    Fits a chat into the token budget before it is sent to the agent.
+    The system prompt and the latest messages are kept as they are, older messages,
+    loaded or not, are folded into `Chat.summary`, which is updated incrementally
+    and saved with the chat.
+    `fit` never waits for the LLM: `summarize` is called once the answer is saved, so
+    messages that just left the window reach the summary for the next turns
+    """
+
+    def __init__(
+        self,
+        llm: LLM,
+        max_tokens: int = 8000,
+        min_recent: int = 2,
+        summary_reserve: int = 300,
+    ):
+        self._llm = llm
+        self._max_tokens = max_tokens
+        self._min_recent = min_recent
+        # Tokens kept for the summary, it is asked to stay under 200 words
+        self._summary_reserve = summary_reserve
+
+    def _count_recent(self, history: list[Message], budget: int) -> int:
+        kept, used = 0, 0
+        for message in reversed(history):
+            tokens = count_tokens(message)
+            if kept >= self._min_recent and used + tokens > budget:
+                break
+            kept, used = kept + 1, used + tokens
+        return kept
+
+    def _split(self, chat: Chat) -> tuple[list[Message], list[Message]] | None:
+        """Messages left out of the context and the ones kept, `None` if everything fits"""
+        prompt, history = chat.messages[0], chat.messages[1:]
+        budget = self._max_tokens - count_tokens(prompt)
+        if not chat.summary and self._count_recent(history, budget) == len(history):
+            return None
+        summary_tokens = count_text_tokens(chat.summary or '') + _MESSAGE_TOKENS_OVERHEAD
+        kept = self._count_recent(history, budget - max(summary_tokens, self._summary_reserve))
+        return history[:len(history) - kept], history[len(history) - kept:]
+
+    async def fit(self, chat: Chat) -> Chat:
+        if not chat.messages:
+            return chat
+        await load_encoder()
+        split = self._split(chat)
+        if split is None:
+            return chat
+        _, recent = split
+
+        messages = [chat.messages[0]]
+        if chat.summary:
+            messages.append(Message(
+                sender=Sender.ASSISTANT,
+                content=f'Summary of the earlier conversation: {chat.summary}',
+            ))
+        messages.extend(recent)
+        logger.debug(f'Fitted chat into context: chat_id={chat.id}, kept={len(recent)}')
+        return chat.with_messages(messages)
+
+    async def summarize(self, chat: Chat, earlier: list[Message] | None = None) -> bool:
+        """
+        Fold the saved messages that are left out of the context into the summary: the ones
+        that no longer fit and `earlier` ones, which precede the loaded messages of the chat.
+        Only messages right after `summary_seq` are taken, so the summary never skips any.
+        Returns whether the summary changed, i.e. the chat should be saved again
+        """
+        if not chat.messages:
+            return False
+        await load_encoder()
+        split = self._split(chat)
+        dropped = split[0] if split is not None else []
+        not_summarized = []
+        # The system prompt is the message 0
+        next_seq = (chat.summary_seq if chat.summary_seq is not None else 0) + 1
+        for message in [*(earlier or []), *dropped]:
+            if message.seq is None or message.seq < next_seq:
+                continue
+            if message.seq > next_seq:
+                break  # the rest is folded in once the messages before it are
+            not_summarized.append(message)
+            next_seq += 1
+        if not not_summarized:
+            return False
+        text = _SUMMARY_PROMPT.format(
+            summary=chat.summary or '-',
+            messages='\n'.join(f'{m.sender}: {m.content}' for m in not_summarized),
+        )
+        try:
+            chat.summary = await self._llm.make_request(text)
+        except Exception as e:
+            logger.error(f'Failed to summarize chat: chat_id={chat.id}, error={e}')
+            return False
+        chat.summary_seq = not_summarized[-1].seq
+        logger.debug(f'Summarized chat: chat_id={chat.id}, summarized={len(not_summarized)}')
+        return True
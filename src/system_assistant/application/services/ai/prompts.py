@@ -1,8 +1,9 @@
-import os
 from pathlib import Path
 import platform
+import sys
 
 from system_assistant.core import ROOT
+from system_assistant.core.digest import digest_directory
 
 
 _SYSTEM_ASSISTANT_PROMPT = """
@@ -13,7 +14,8 @@ Context:
 OS: {os}
 Distribution: {distribution}
 Current working directory: {current_dir}
-Directory list: {directory_list}
+Current working directory contents:
+{directory_digest}
 
 Important:
 
@@ -28,15 +30,18 @@ def construct_system_assistant_prompt(
     operating_system: str | None = None,
     distribution: str | None = None,
     current_dir: Path | None = None,
-    directory_list: list[str] | None = None,
+    directory_digest: str | None = None,
 ) -> str:
     operating_system = operating_system or platform.system()
     distribution = distribution or platform.freedesktop_os_release()['NAME']
     current_dir = current_dir or ROOT
-    directory_list = directory_list or os.listdir()
-    return _SYSTEM_ASSISTANT_PROMPT.format_map({
+    if directory_digest is None:
+        directory_digest = digest_directory(current_dir)
+    prompt = _SYSTEM_ASSISTANT_PROMPT.format_map({
         'os': operating_system,
         'distribution': distribution,
         'current_dir': current_dir,
-        'directory_list': directory_list
+        'directory_digest': directory_digest,
     })
+    # Every chat starts with the prompt, so chats with the same context share one string
+    return sys.intern(prompt)
@@ -0,0 +1,70 @@
+import asyncio
+import re
+from typing import AsyncIterator, Awaitable, Callable
+
+from loguru import logger
+
+from system_assistant.core.types import Speech
+
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?;:])\s+|\n+')
+
+
+async def split_sentences(chunks: AsyncIterator[str], min_length: int = 20) -> AsyncIterator[str]:
+    """
+    Sentences of the streamed text, each one as soon as it is complete.
+    Sentences shorter than `min_length` are joined with the next one
+    """
+    buffer = ''
+    position = 0
+    async for chunk in chunks:
+        buffer += chunk
+        while (match := _SENTENCE_END_RE.search(buffer, position)) is not None:
+            if len(buffer[:match.start()].strip()) < min_length:
+                position = match.end()
+                continue
+            yield buffer[:match.start()].strip()
+            buffer, position = buffer[match.end():], 0
+    if buffer.strip():
+        yield buffer.strip()
+
+
+async def speak(
+    sentences: AsyncIterator[str],
+    synthesize: Callable[[str], Awaitable[Speech]],
+    play: Callable[[Speech], None],
+    prefetch: int = 2,
+):
+    """
+    Play sentences in order while the next ones are being synthesized:
+    at most `prefetch` sentences are synthesized ahead of the one playing.
+    `play` blocks until the sound is over, so it runs in a thread
+    """
+    queue: asyncio.Queue[tuple[str, asyncio.Task[Speech]] | None] = asyncio.Queue()
+    room = asyncio.Semaphore(prefetch)
+
+    async def synthesize_ahead():
+        try:
+            async for sentence in sentences:
+                await room.acquire()
+                queue.put_nowait((sentence, asyncio.create_task(synthesize(sentence))))
+        finally:
+            queue.put_nowait(None)
+
+    producer = asyncio.create_task(synthesize_ahead())
+    try:
+        while (item := await queue.get()) is not None:
+            room.release()
+            sentence, synthesis = item
+            try:
+                speech = await synthesis
+            except Exception as e:
+                logger.error(f'Failed to synthesize sentence: sentence={sentence!r}, error={e}')
+                continue
+            await asyncio.to_thread(play, speech)
+        await producer
+    finally:
+        producer.cancel()
+        while not queue.empty():
+            if (item := queue.get_nowait()) is not None:
+                item[1].cancel()
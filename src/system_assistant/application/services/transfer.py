@@ -0,0 +1,148 @@
+import asyncio
+from dataclasses import dataclass, field
+import gzip
+import itertools
+import json
+from pathlib import Path
+import time
+import typing as t
+
+from loguru import logger
+
+from system_assistant.application.gateways.chat import ChatGateway, dump_chat, load_chat
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+
+
+@dataclass(eq=False, slots=True)
+class TransferProgress:
+    chats: int = 0
+    messages: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: float | None = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def __str__(self) -> str:
+        elapsed = max(self.elapsed, 1e-9)
+        return (
+            f'chats={self.chats}, messages={self.messages}, elapsed={self.elapsed:.1f}s, '
+            f'{self.chats / elapsed:.0f} chats/s, {self.messages / elapsed:.0f} messages/s'
+        )
+
+
+type ProgressCallback = t.Callable[[TransferProgress], None]
+
+
+async def transfer_chats(
+    batches: t.AsyncIterator[list[Chat]],
+    write: t.Callable[[list[Chat]], t.Awaitable[None]],
+    max_pending_batches: int = 2,
+    on_progress: ProgressCallback | None = None,
+) -> TransferProgress:
+    """
+    Read batches and write them concurrently: the next batches are read while the
+    current one is written. At most `max_pending_batches` batches wait in between,
+    so memory stays constant whatever the number of chats
+    """
+    progress = TransferProgress()
+    queue: asyncio.Queue[list[Chat] | Exception | None] = asyncio.Queue(max_pending_batches)
+
+    async def read():
+        try:
+            async for batch in batches:
+                await queue.put(batch)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(None)
+
+    reader = asyncio.create_task(read())
+    try:
+        while (batch := await queue.get()) is not None:
+            if isinstance(batch, Exception):
+                raise batch
+            await write(batch)
+            progress.chats += len(batch)
+            progress.messages += sum(len(chat.messages) for chat in batch)
+            if on_progress is not None:
+                on_progress(progress)
+    finally:
+        reader.cancel()
+    progress.finished_at = time.perf_counter()
+    logger.info(f'Transferred chats: {progress}')
+    return progress
+
+
+def _open(path: Path, mode: t.Literal['r', 'w']) -> t.TextIO:
+    """Files ending with `.gz` are gzip-compressed"""
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt' if mode == 'r' else 'wt', encoding='utf-8')
+    return path.open(mode, encoding='utf-8')
+
+
+async def read_chats(path: Path, batch_size: int = 500) -> t.AsyncIterator[list[Chat]]:
+    """Stream chats from a JSONL file, as new chats: every message is saved again on import"""
+    file = await asyncio.to_thread(_open, path, 'r')
+    try:
+        while lines := await asyncio.to_thread(lambda: list(itertools.islice(file, batch_size))):
+            yield [load_chat(json.loads(line), persisted=False) for line in lines]
+    finally:
+        file.close()
+
+
+async def export_chats(
+    gateway: ChatGateway,
+    path: Path,
+    batch_size: int = 500,
+    on_progress: ProgressCallback | None = None,
+) -> TransferProgress:
+    """Write every chat of the gateway to a JSONL file, one chat per line"""
+    file = await asyncio.to_thread(_open, path, 'w')
+
+    async def write(batch: list[Chat]):
+        lines = ''.join(f'{json.dumps(dump_chat(chat))}\n' for chat in batch)
+        await asyncio.to_thread(file.write, lines)
+
+    try:
+        return await transfer_chats(
+            gateway.iter_chats(batch_size), write, on_progress=on_progress,
+        )
+    finally:
+        await asyncio.to_thread(file.close)
+
+
+async def import_chats(
+    gateway: ChatGateway,
+    path: Path,
+    batch_size: int = 500,
+    on_progress: ProgressCallback | None = None,
+) -> TransferProgress:
+    """
+    Save chats from a JSONL file written by `export_chats`, a batch per transaction.
+    Messages are appended, so importing a chat that is already stored duplicates them
+    """
+    return await transfer_chats(
+        read_chats(path, batch_size), gateway.save_many, on_progress=on_progress,
+    )
+
+
+def _as_new(chat: Chat) -> Chat:
+    return chat.with_messages([Message(sender=m.sender, content=m.content) for m in chat.messages])
+
+
+async def copy_chats(
+    source: ChatGateway,
+    target: ChatGateway,
+    batch_size: int = 500,
+    on_progress: ProgressCallback | None = None,
+) -> TransferProgress:
+    """Copy every chat from one gateway to another without an intermediate file"""
+
+    async def batches() -> t.AsyncIterator[list[Chat]]:
+        async for batch in source.iter_chats(batch_size):
+            yield [_as_new(chat) for chat in batch]
+
+    return await transfer_chats(batches(), target.save_many, on_progress=on_progress)
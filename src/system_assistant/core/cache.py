@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import time
+from typing import Callable, Iterator
+
+
+@dataclass(eq=False, slots=True)
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LRUCache[K, V]:
+    """
+    Least-recently-used mapping bounded by the number of entries and,
+    optionally, by the total weight of the values (e.g. approximate size in bytes).
+    With `ttl` entries also expire after `ttl` seconds without being read or updated
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_weight: int | None = None,
+        weigh: Callable[[V], int] = lambda _: 1,
+        on_evict: Callable[[K, V], None] | None = None,
+        ttl: float | None = None,
+    ):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._weigh = weigh
+        self._on_evict = on_evict
+        self._entries: OrderedDict[K, tuple[V, int, float]] = OrderedDict()
+        self._weight = 0
+
+    @property
+    def weight(self) -> int:
+        return self._weight
+
+    def get(self, key: K) -> V | None:
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        value, weight, _ = entry
+        self._entries[key] = (value, weight, self._expires_at())
+        self._entries.move_to_end(key)
+        return value
+
+    def peek(self, key: K) -> V | None:
+        """Get the value without touching its recency or the stats"""
+        self._expire()
+        entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    def put(self, key: K, value: V):
+        """Insert or update the value. Call it again after the value changed to re-weigh it"""
+        weight = self._weigh(value)
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._weight -= previous[1]
+        self._entries[key] = (value, weight, self._expires_at())
+        self._weight += weight
+        self._expire()
+        self._evict()
+
+    def pop(self, key: K) -> V | None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._weight -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        self._entries.clear()
+        self._weight = 0
+
+    def _expires_at(self) -> float:
+        return float('inf') if self.ttl is None else time.monotonic() + self.ttl
+
+    def _expire(self):
+        if self.ttl is None:
+            return
+        # Every read or update moves the entry to the end, so the oldest entries expire first
+        now = time.monotonic()
+        while self._entries and next(iter(self._entries.values()))[2] <= now:
+            self._evict_oldest()
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_weight is not None and self._weight > self.max_weight)
+        ):
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        key, (value, weight, _) = self._entries.popitem(last=False)
+        self._weight -= weight
+        self.stats.evictions += 1
+        if self._on_evict is not None:
+            self._on_evict(key, value)
+
+    def __contains__(self, key: object) -> bool:
+        self._expire()
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self._entries)
@@ -20,8 +20,40 @@ class Config:
     _google_api_key: str = ''
     _gemini_api_key: str = ''
     _brave_search_api_key: str = ''
+    deepseek_base_url: str = os.getenv('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
+    gemini_base_url: str = os.getenv(
+        'GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com/v1beta/openai/',
+    )
     dgraph_url: str = os.getenv('DGRAPH_URL', 'dgraph://localhost:9080')
     sqlite_url: str = os.getenv('SQLITE_URL', str(f'sqlite+aiosqlite:///{ROOT / 'database.db'}'))
+    history_limit: int = int(os.getenv('HISTORY_LIMIT', '50'))
+    context_max_tokens: int = int(os.getenv('CONTEXT_MAX_TOKENS', '8000'))
+    chat_cache_max_entries: int = int(os.getenv('CHAT_CACHE_MAX_ENTRIES', '128'))
+    chat_cache_max_bytes: int = int(os.getenv('CHAT_CACHE_MAX_BYTES', str(64 * 2**20)))
+    memory_storage_max_bytes: int = int(os.getenv('MEMORY_STORAGE_MAX_BYTES', str(256 * 2**20)))
+    memory_storage_max_chats: int = int(os.getenv('MEMORY_STORAGE_MAX_CHATS', '10000'))
+    memory_storage_ttl: float = float(os.getenv('MEMORY_STORAGE_TTL', '0'))
+    memory_storage_spill_dir: str = os.getenv('MEMORY_STORAGE_SPILL_DIR', '')
+    agent_max_threads: int = int(os.getenv('AGENT_MAX_THREADS', '1000'))
+    agent_max_checkpoints: int = int(os.getenv('AGENT_MAX_CHECKPOINTS', '2'))
+    agent_cache_max_entries: int = int(os.getenv('AGENT_CACHE_MAX_ENTRIES', '8'))
+    http_max_connections: int = int(os.getenv('HTTP_MAX_CONNECTIONS', '20'))
+    http_max_keepalive_connections: int = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', '10'))
+    http_keepalive_expiry: float = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '120'))
+    http_timeout: float = float(os.getenv('HTTP_TIMEOUT', '120'))
+    http2: bool = os.getenv('HTTP2', '1') == '1'
+    tool_max_workers: int = int(os.getenv('TOOL_MAX_WORKERS', '8'))
+    tool_timeout: float = float(os.getenv('TOOL_TIMEOUT', '120'))
+    fs_cache_max_entries: int = int(os.getenv('FS_CACHE_MAX_ENTRIES', '1024'))
+    find_max_workers: int = int(os.getenv('FIND_MAX_WORKERS', '8'))
+    find_index_dir: str = os.getenv('FIND_INDEX_DIR', '')
+    hedge_percentile: float = float(os.getenv('HEDGE_PERCENTILE', '0.95'))
+    hedge_default_delay: float = float(os.getenv('HEDGE_DEFAULT_DELAY', '3'))
+    circuit_failure_threshold: int = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '3'))
+    circuit_reset_timeout: float = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+    llm_cache_max_entries: int = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1000'))
+    llm_cache_ttl: float = float(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 60 * 60)))
+    llm_cache_max_temperature: float = float(os.getenv('LLM_CACHE_MAX_TEMPERATURE', '0'))
 
     @property
     def google_api_key(self) -> str:
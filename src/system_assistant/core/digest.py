@@ -0,0 +1,170 @@
+from collections import Counter
+from dataclasses import dataclass
+from fnmatch import translate
+import heapq
+import os
+from pathlib import Path
+import re
+import time
+from typing import Literal
+
+from system_assistant.core.cache import LRUCache
+
+
+type EntryKind = Literal['folder', 'file', 'link', 'other']
+
+NOTABLE = (
+    'Dockerfile*', '*.dockerfile', 'docker-compose*.yml', 'docker-compose*.yaml',
+    'compose*.yml', 'compose*.yaml', 'Makefile', 'pyproject.toml', 'setup.py', 'setup.cfg',
+    'requirements*.txt', 'package.json', 'Cargo.toml', 'go.mod', 'README*', '.env*', '.git',
+)
+_NOTABLE = re.compile('|'.join(translate(pattern) for pattern in NOTABLE), re.I)
+MAX_NAME_LENGTH = 80
+# Directory timestamps this close to the scan may hide a change made in the same tick
+RACY_NS = 2_000_000_000
+
+
+@dataclass(eq=False, slots=True)
+class _Entry:
+    name: str
+    inode: int
+    kind: EntryKind
+    mtime: float
+
+
+def _short(name: str) -> str:
+    return name if len(name) <= MAX_NAME_LENGTH else f'{name[:MAX_NAME_LENGTH - 3]}...'
+
+
+class DirectoryDigest:
+    """
+    Summary of a directory for the system prompt, the same size whatever the directory
+    holds: counts by kind and extension, notable files, then the first `max_entries` of
+    the rest ranked folders first, then files newest first, hidden ones last.
+    The text is kept until the directory's modification time changes; a rescan stats
+    only the entries it hasn't seen before
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int = 30,
+        max_notable: int = 10,
+        max_extensions: int = 6,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_notable = max_notable
+        self.max_extensions = max_extensions
+        self.scans = 0
+        self.stats = 0
+        self._entries: dict[str, _Entry] = {}
+        self._mtime_ns: int | None = None
+        self._scanned_ns = 0
+        self._text = ''
+
+    def render(self) -> str:
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            self._mtime_ns = None
+            return f"Can't be read: {e.strerror or e}"
+        if mtime_ns == self._mtime_ns and mtime_ns + RACY_NS < self._scanned_ns:
+            return self._text
+        self._scanned_ns = time.time_ns()
+        try:
+            self._entries = self._scan()
+        except OSError as e:
+            self._mtime_ns = None
+            return f"Can't be read: {e.strerror or e}"
+        self._mtime_ns = mtime_ns
+        self._text = self._format()
+        return self._text
+
+    def _scan(self) -> dict[str, _Entry]:
+        self.scans += 1
+        entries: dict[str, _Entry] = {}
+        with os.scandir(self.path) as scanned:
+            for item in scanned:
+                known = self._entries.get(item.name)
+                if known is not None and known.inode == item.inode():
+                    entries[item.name] = known
+                    continue
+                entries[item.name] = self._entry(item)
+        return entries
+
+    def _entry(self, item: os.DirEntry) -> _Entry:
+        kind: EntryKind = 'other'
+        mtime = 0.0
+        try:
+            if item.is_symlink():
+                kind = 'link'
+            elif item.is_dir(follow_symlinks=False):
+                kind = 'folder'
+            elif item.is_file(follow_symlinks=False):
+                kind = 'file'
+                self.stats += 1
+                mtime = item.stat(follow_symlinks=False).st_mtime
+        except OSError:
+            pass
+        return _Entry(item.name, item.inode(), kind, mtime)
+
+    def _format(self) -> str:
+        entries = list(self._entries.values())
+        if not entries:
+            return 'Empty folder'
+        kinds = Counter(e.kind for e in entries)
+        hidden = sum(e.name.startswith('.') for e in entries)
+        counts = ', '.join(
+            f'{kinds[kind]} {kind}s' for kind in ('folder', 'file', 'link', 'other') if kinds[kind]
+        )
+        lines = [f'{counts} ({hidden} hidden)' if hidden else counts]
+
+        extensions = Counter(
+            os.path.splitext(e.name)[1].lower() or 'no extension'
+            for e in entries if e.kind == 'file' and not e.name.startswith('.')
+        )
+        if extensions:
+            common = extensions.most_common(self.max_extensions)
+            text = ', '.join(f'{extension} {count}' for extension, count in common)
+            if len(extensions) > len(common):
+                text += f', {len(extensions) - len(common)} more types'
+            lines.append(f'File types: {text}')
+
+        notable = sorted(
+            (e for e in entries if _NOTABLE.match(e.name)), key=lambda e: e.name.lower(),
+        )
+        if notable:
+            labels = ', '.join(self._label(e) for e in notable[:self.max_notable])
+            more = len(notable) - self.max_notable
+            lines.append(f'Notable: {labels}' + (f', ... {more} more' if more > 0 else ''))
+
+        rest = [e for e in entries if not _NOTABLE.match(e.name)]
+        shown = heapq.nsmallest(
+            self.max_entries,
+            rest,
+            key=lambda e: (e.name.startswith('.'), e.kind != 'folder', -e.mtime, e.name.lower()),
+        )
+        if shown:
+            lines.append(f'Entries: {", ".join(self._label(e) for e in shown)}')
+        if len(rest) > len(shown):
+            lines.append(
+                f'... {len(rest) - len(shown)} more entries not shown, '
+                f'list the folder or find files with the tools to see them',
+            )
+        return '\n'.join(lines)
+
+    def _label(self, entry: _Entry) -> str:
+        return _short(entry.name) + ('/' if entry.kind == 'folder' else '')
+
+
+_digests = LRUCache[Path, DirectoryDigest](max_entries=16)
+
+
+def digest_directory(path: Path) -> str:
+    """`DirectoryDigest` of the directory, kept between calls"""
+    digest = _digests.get(path)
+    if digest is None:
+        digest = DirectoryDigest(path)
+        _digests.put(path, digest)
+    return digest.render()
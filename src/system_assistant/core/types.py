@@ -1,11 +1,11 @@
 import platform
-import os
 
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Literal, Required, TypedDict
 
 from system_assistant.core import ROOT
+from system_assistant.core.digest import digest_directory
 from system_assistant.domain.vo import ID
 
 
@@ -26,7 +26,6 @@ class SystemContext:
     operating_system: str
     distribution: str
     cwd: Path
-    directory_list: list[str]
 
     @classmethod
     def default(cls, cwd: Path | None = None) -> 'SystemContext':
@@ -34,15 +33,30 @@ class SystemContext:
             operating_system=platform.system(),
             distribution=platform.freedesktop_os_release()['NAME'],
             cwd=cwd or ROOT,
-            directory_list=os.listdir(),
         )
 
+    def directory_digest(self) -> str:
+        """Bounded summary of what `cwd` holds now, see `DirectoryDigest`"""
+        return digest_directory(self.cwd)
+
 
 @dataclass(eq=False, slots=True)
 class LLMConfiguration:
     llm_temperature: float
     llm: str
     llm_enable_tools: bool
+    llm_cache: bool = False
+
+
+@dataclass(eq=False, slots=True)
+class SearchHit:
+    chat_id: ID
+    chat_title: str
+    seq: int
+    sender: str
+    snippet: str
+    rank: float
+    """Relevance of the hit, lower is better"""
 
 
 class AIAnswer(TypedDict, total=True):
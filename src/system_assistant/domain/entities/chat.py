@@ -9,10 +9,40 @@ class Chat:
     id: ID
     title: str
     messages: list[Message] = field(default_factory=list)
+    summary: str | None = None
+    """Summary of the messages that no longer fit into the LLM context"""
+    summary_seq: int | None = None
+    """`seq` of the last message covered by `summary`"""
 
     def add_message(self, message: Message):
         self.messages.append(message)
 
+    def with_messages(self, messages: list[Message]) -> 'Chat':
+        """Copy of the chat with other messages, e.g. a window of its history"""
+        return Chat(
+            id=self.id,
+            title=self.title,
+            messages=messages,
+            summary=self.summary,
+            summary_seq=self.summary_seq,
+        )
+
+    def unsaved_messages(self) -> list[Message]:
+        """
+        Messages added since the chat was loaded or saved last time.
+        Messages are only appended, so the scan stops at the first persisted one
+        """
+        index = len(self.messages)
+        while index > 0 and self.messages[index - 1].seq is None:
+            index -= 1
+        return self.messages[index:]
+
+    def next_seq(self) -> int:
+        for message in reversed(self.messages):
+            if message.seq is not None:
+                return message.seq + 1
+        return 0
+
     def __eq__(self, other) -> bool:
         return self.id == other.id if isinstance(other, Chat) else False
 
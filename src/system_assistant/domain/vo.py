@@ -1,15 +1,66 @@
-from typing import Literal
-from dataclasses import dataclass
+from enum import StrEnum
+import sys
+from typing import ClassVar
+import zlib
 
 type ID = str
 
 type AssistantModel = str
 
 
-Sender = Literal['user', 'assistant']
+class Sender(StrEnum):
+    USER = 'user'
+    ASSISTANT = 'assistant'
 
 
-@dataclass(eq=False)
 class Message:
+    """
+    Chat message, kept compact because chats can hold a lot of them:
+    slotted, `sender` is a shared `Sender` member, the system prompt (first message, `seq == 0`)
+    is interned so identical prompts share one string, and contents longer than
+    `compress_above` characters are kept zlib-compressed and decompressed on access
+    """
+
+    __slots__ = ('sender', '_content', 'seq', 'tokens')
+
+    compress_above: ClassVar[int | None] = 4096
+    """Compress contents longer than this, `None` to never compress"""
+
     sender: Sender
-    content: str
+    _content: str | bytes
+    seq: int | None
+    """Position of the message in the chat. `None` until the message is persisted"""
+    tokens: int | None
+    """Cached number of LLM tokens in the message, `None` until counted"""
+
+    def __init__(self, sender: Sender | str, content: str, *, seq: int | None = None):
+        self.sender = Sender(sender)
+        if seq == 0:
+            self._content = sys.intern(content)
+        else:
+            self.content = content
+        self.seq = seq
+        self.tokens = None
+
+    @property
+    def content(self) -> str:
+        content = self._content
+        return content if isinstance(content, str) else zlib.decompress(content).decode()
+
+    @content.setter
+    def content(self, value: str):
+        self.tokens = None
+        if self.compress_above is not None and len(value) > self.compress_above:
+            compressed = zlib.compress(value.encode())
+            if len(compressed) < len(value):
+                self._content = compressed
+                return
+        self._content = value
+
+    @property
+    def content_size(self) -> int:
+        """Size of the content as it is kept in memory"""
+        return len(self._content)
+
+    def __repr__(self) -> str:
+        return f'Message(sender={self.sender!r}, content={self.content!r}, seq={self.seq!r})'
@@ -4,19 +4,35 @@ import typing as t
 import uuid
 from pathlib import Path
 import click
+import httpx
 from loguru import logger
 from punq import (  # type: ignore
     Container,
+    Scope,
 )
 
+from system_assistant.application.gateways.chat import ChatGateway
 from system_assistant.application.mediator import Mediator
+from system_assistant.application.queries.search_chats import (
+    SearchChatsQuery,
+    SearchChatsQueryHandler,
+)
+from system_assistant.application.services.ai.context import load_encoder
 from system_assistant.application.services.text_to_speech.base import BaseTextToSpeechService
+from system_assistant.application.services.transfer import (
+    TransferProgress,
+    export_chats,
+    import_chats,
+)
 from system_assistant.core import ROOT
 from system_assistant.core.config import Config
+from system_assistant.core.exceptions import UnexpectedApplicationException
 from system_assistant.core.types import (
     LLMConfiguration,
+    SearchHit,
     SystemContext,
 )
+from system_assistant.infrastructure.db.dgraph.init import init_db as init_dgraph
 from system_assistant.infrastructure.db.sqlite.init import (
     init_db,
 )
@@ -28,18 +44,31 @@ from system_assistant.infrastructure.ioc import (
     register_mediator_handlers,
     register_services,
 )
-from system_assistant.infrastructure.services.ai.tools.docker import DOCKER_TOOLS
-from system_assistant.infrastructure.services.ai.tools.os import OS_TOOLS
+from system_assistant.infrastructure.services.ai.tools.executor import ToolExecutor
+from system_assistant.infrastructure.services.ai.tools.find import (
+    build_find_files_tool, find_index_path,
+)
+from system_assistant.infrastructure.services.ai.tools.os import OS_TOOLS, fs_cache
 from system_assistant.infrastructure.services.ai.tools.search import build_brave_search_tool
+from system_assistant.infrastructure.services.http import prewarm
 from system_assistant.infrastructure.services.sound.base import SoundService
+from system_assistant.infrastructure.services.text_to_speech.google import (
+    GOOGLE_TEXT_TO_SPEECH_BASE_URL,
+)
 
 from .assistants.base import Context, BaseSystemAssistant
 from .assistants.voice import SystemAssistant
 
 
-@click.command()
+@click.group(invoke_without_command=True)
 @click.option(
-    '--llm', default='deepseek', help='LLM, available: deepseek|gemini', show_default=True,
+    '--llm',
+    default='deepseek',
+    help=(
+        'LLM, available: deepseek|gemini. Several LLMs separated by commas, e.g. '
+        '"deepseek,gemini", are asked in turn when the previous one is slow or failing'
+    ),
+    show_default=True,
 )
 @click.option('--temperature', default=1.0, help='LLM temperature', show_default=True)
 @click.option(
@@ -49,6 +78,13 @@ from .assistants.voice import SystemAssistant
     show_default=True,
     is_flag=True,
 )
+@click.option(
+    '--llm-cache',
+    default=False,
+    help='Answer repeated questions from a cache, only turns with temperature 0 are cached',
+    show_default=True,
+    is_flag=True,
+)
 @click.option(
     '--cwd',
     default=str(ROOT),
@@ -66,6 +102,13 @@ from .assistants.voice import SystemAssistant
     help='Storage. Available: memory|sqlite|dgraph',
     show_default=True,
 )
+@click.option(
+    '--write-behind',
+    default=False,
+    help='Persist chat history in background so saving does not delay answers',
+    show_default=True,
+    is_flag=True,
+)
 @click.option(
     '--chat-id',
     default=None,
@@ -92,17 +135,24 @@ from .assistants.voice import SystemAssistant
     ),
     show_default=True,
 )
+@click.pass_context
 def system_assistant(
+    ctx: click.Context,
     temperature: float,
     llm: str,
     enable_tools: bool,
+    llm_cache: bool,
     cwd: str,
     debug: bool,
     chat_id: str | None,
     storage: str,
+    write_behind: bool,
     input: str,
     output: str,
 ):
+    if ctx.invoked_subcommand is not None:
+        return
+
     chat_id = chat_id or str(uuid.uuid4())
 
     loop = asyncio.get_event_loop()
@@ -121,11 +171,12 @@ def system_assistant(
     logger.debug(f'LLM temperature={temperature}')
     logger.debug(f'LLM={llm}')
     logger.debug(f'enable-tools={enable_tools}')
+    logger.debug(f'llm-cache={llm_cache}')
     logger.debug(f'cwd={cwd}')
     logger.debug(f'chat-id={chat_id}')
 
     llm_configuration = LLMConfiguration(
-        llm_temperature=temperature, llm=llm, llm_enable_tools=enable_tools,
+        llm_temperature=temperature, llm=llm, llm_enable_tools=enable_tools, llm_cache=llm_cache,
     )
     context = Context(
         llm_conf=llm_configuration,
@@ -134,13 +185,18 @@ def system_assistant(
         system_context=SystemContext.default(cwd=Path(cwd))
     )
 
-    container = build_cli_container(storage, llm_configuration)
+    container = build_cli_container(
+        storage, llm_configuration, write_behind=write_behind, cwd=Path(cwd),
+    )
     config = t.cast(Config, container.resolve(Config))
 
     if storage == 'sqlite':
         loop.run_until_complete(init_db(config))
+    elif storage == 'dgraph':
+        loop.run_until_complete(init_dgraph(config))
 
     mediator = t.cast(Mediator, container.resolve(Mediator))
+    chat_gateway = t.cast(ChatGateway, container.resolve(ChatGateway))
     sound_service = t.cast(SoundService, container.resolve(SoundService))
     text_to_speech_service = t.cast(
         BaseTextToSpeechService, container.resolve(BaseTextToSpeechService),
@@ -155,28 +211,162 @@ def system_assistant(
         input=input,  # type: ignore
         output=output,  # type: ignore
     )
-    loop.run_until_complete(assistant.run())
+    http_client = t.cast(httpx.AsyncClient, container.resolve(httpx.AsyncClient))
+    # Connections are opened while the user types (or speaks) the first question
+    prewarming = loop.create_task(prewarm(http_client, _prewarm_urls(config, llm, output)))
+    # Same for the tokenizer of the context window
+    loading_encoder = loop.create_task(load_encoder())
+    try:
+        loop.run_until_complete(assistant.run())
+    finally:
+        prewarming.cancel()
+        loading_encoder.cancel()
+        try:
+            loop.run_until_complete(chat_gateway.close())
+        except UnexpectedApplicationException as e:
+            logger.error(e)
+        loop.run_until_complete(http_client.aclose())
+        t.cast(ToolExecutor, container.resolve(ToolExecutor)).shutdown()
+        logger.debug(f'File system cache stats: {fs_cache.stats}')
+
+
+def _prewarm_urls(config: Config, llm: str, output: str) -> list[str]:
+    base_urls = {'deepseek': config.deepseek_base_url, 'gemini': config.gemini_base_url}
+    urls = [base_urls[name.strip()] for name in llm.split(',') if name.strip() in base_urls]
+    if output == 'voice':
+        urls.append(GOOGLE_TEXT_TO_SPEECH_BASE_URL)
+    return urls
+
+
+def build_storage_container(storage: str) -> Container:
+    """Config and chat gateway only: storage commands need no LLM, tool or speech API keys"""
+    container = Container()
+    container.register(Config, instance=Config(), scope=Scope.singleton)
+    register_gateway(container, storage)
+    return container
+
+
+def _run_on_storage[R](storage: str, operation: t.Callable[[ChatGateway], t.Awaitable[R]]) -> R:
+    """Run a one-off operation against the storage, without the assistant itself"""
+    logger.configure(handlers=[{"sink": sys.stderr, "level": "WARNING"}])
+
+    container = build_storage_container(storage)
+    config = t.cast(Config, container.resolve(Config))
+    chat_gateway = t.cast(ChatGateway, container.resolve(ChatGateway))
+
+    async def run() -> R:
+        try:
+            if storage == 'sqlite':
+                await init_db(config)
+            elif storage == 'dgraph':
+                await init_dgraph(config)
+            return await operation(chat_gateway)
+        finally:
+            await chat_gateway.close()
+
+    return asyncio.run(run())
+
+
+def _echo_progress(progress: TransferProgress):
+    click.echo(f'\r{progress}', nl=False, err=True)
+
+
+@system_assistant.command()
+@click.argument('text')
+@click.option(
+    '--storage',
+    default='sqlite',
+    help='Storage to search. Available: sqlite|dgraph',
+    show_default=True,
+)
+@click.option('--limit', default=10, help='Maximum number of hits', show_default=True)
+@click.option('--offset', default=0, help='Number of hits to skip', show_default=True)
+def search(text: str, storage: str, limit: int, offset: int):
+    """Full-text search over saved chat history"""
+
+    async def run(chat_gateway: ChatGateway) -> list[SearchHit]:
+        return await SearchChatsQueryHandler(chat_gateway).handle(
+            SearchChatsQuery(text=text, limit=limit, offset=offset),
+        )
+
+    for hit in _run_on_storage(storage, run):
+        click.echo(f'{hit.chat_id} | {hit.chat_title} | #{hit.seq} {hit.sender}: {hit.snippet}')
+
+
+@system_assistant.command()
+@click.argument('path', type=click.Path(dir_okay=False, path_type=Path))
+@click.option(
+    '--storage',
+    default='sqlite',
+    help='Storage to export. Available: sqlite|dgraph',
+    show_default=True,
+)
+@click.option('--batch-size', default=500, help='Chats read at once', show_default=True)
+def export(path: Path, storage: str, batch_size: int):
+    """Export every chat to a JSONL file, gzip-compressed if PATH ends with .gz"""
+
+    async def run(chat_gateway: ChatGateway) -> TransferProgress:
+        return await export_chats(chat_gateway, path, batch_size, on_progress=_echo_progress)
+
+    progress = _run_on_storage(storage, run)
+    click.echo(f'\rExported {progress}', err=True)
+
+
+@system_assistant.command(name='import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option(
+    '--storage',
+    default='sqlite',
+    help='Storage to import into. Available: sqlite|dgraph',
+    show_default=True,
+)
+@click.option(
+    '--batch-size', default=500, help='Chats saved in one transaction', show_default=True,
+)
+def import_(path: Path, storage: str, batch_size: int):
+    """Import chats from a file written by the export command"""
+
+    async def run(chat_gateway: ChatGateway) -> TransferProgress:
+        return await import_chats(chat_gateway, path, batch_size, on_progress=_echo_progress)
+
+    progress = _run_on_storage(storage, run)
+    click.echo(f'\rImported {progress}', err=True)
 
 
 def build_cli_container(
     storage: str,
     llm_cf: LLMConfiguration,
+    write_behind: bool = False,
+    cwd: Path | None = None,
 ) -> Container:
     container = init_base_container()
 
     config = t.cast(Config, container.resolve(Config))
 
-    brave_search_tool = build_brave_search_tool(config)
+    fs_cache.max_entries = config.fs_cache_max_entries
+
+    tools = []
+    if llm_cf.llm_enable_tools:
+        # Imported with the tools only: the docker module connects to the daemon on import
+        from system_assistant.infrastructure.services.ai.tools.docker import DOCKER_TOOLS
 
-    tools = [*OS_TOOLS, *DOCKER_TOOLS, brave_search_tool] if llm_cf.llm_enable_tools else []
+        brave_search_tool = build_brave_search_tool(config)
+        find_files_tool = build_find_files_tool(
+            cwd,
+            index_path=find_index_path(config, cwd) if cwd else None,
+            max_workers=config.find_max_workers,
+        )
+        tools = [*OS_TOOLS, find_files_tool, *DOCKER_TOOLS, brave_search_tool]
 
+    # The gateway goes first: with sqlite storage it provides the agent checkpointer
+    register_gateway(container, storage, write_behind=write_behind)
     register_llm(
         container,
         llm_tools=tools,
         llm_type=llm_cf.llm,
         llm_temperature=llm_cf.llm_temperature,
+        llm_cache=llm_cf.llm_cache,
     )
-    register_gateway(container, storage)
     register_services(container)
     register_mediator_handlers(container)
     register_mediator(container)
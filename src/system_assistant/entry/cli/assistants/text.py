@@ -1,7 +1,6 @@
-from pprint import pprint
+import asyncio
 
 from system_assistant.application.commands.request_system_help import RequestSystemHelpCommand
-from system_assistant.core.types import AIAnswer
 
 from .base import BaseSystemAssistant
 
@@ -11,15 +10,15 @@ class TextSystemAssistant(BaseSystemAssistant):
 
     async def run(self):
         while True:
-            user_input = input('Enter message ("q" to exit): ')
+            user_input = await asyncio.to_thread(input, 'Enter message ("q" to exit): ')
             if user_input.lower() == 'q':
                 break
-            ai_response: AIAnswer = await self.mediator.handle_command(
+            async for chunk in self.mediator.stream_command(
                 RequestSystemHelpCommand(
                     system_context=self.context.system_context,
                     message=user_input,
                     chat_id=self.context.chat_id,
                 )
-            )
-            pprint(ai_response)
-            print(ai_response['content'])
+            ):
+                print(chunk, end='', flush=True)
+            print()
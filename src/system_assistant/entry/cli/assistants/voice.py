@@ -1,12 +1,14 @@
+import asyncio
 from dataclasses import dataclass
-from typing import Literal
+from functools import partial
+from typing import AsyncIterator, Literal
 
 import speech_recognition as sr  # type: ignore[import-untyped]
 from loguru import logger
 
 from system_assistant.application.commands.request_system_help import RequestSystemHelpCommand
 from system_assistant.application.services.text_to_speech.base import BaseTextToSpeechService
-from system_assistant.core.types import AIAnswer
+from system_assistant.application.services.text_to_speech.pipeline import speak, split_sentences
 from system_assistant.infrastructure.services.sound.base import SoundService
 
 from .base import BaseSystemAssistant
@@ -19,6 +21,7 @@ class SystemAssistant(BaseSystemAssistant):
     recognizer_type: Literal['google', 'whisper'] = 'whisper'
     input: Literal['text', 'voice'] = 'voice'
     output: Literal['text', 'voice'] = 'voice'
+    speech_prefetch: int = 2
 
     def _recognize(self, recognizer: sr.Recognizer, audio) -> str:
         if self.recognizer_type == 'google':
@@ -53,12 +56,29 @@ class SystemAssistant(BaseSystemAssistant):
             )
         return ''
 
-    async def _answer_text(self, text: str):
-        print(f'Asisstant answers: {text}')
-
-    async def _answer_voice(self, text: str):
-        speech = await self.text_to_speech_service.synthesize(text=text.strip(), output='bytes')
-        self.sound_service.play_sound(speech)  # type: ignore
+    def _ask(self, text: str) -> AsyncIterator[str]:
+        return self.mediator.stream_command(
+            RequestSystemHelpCommand(
+                message=text,
+                system_context=self.context.system_context,
+                chat_id=self.context.chat_id,
+            )
+        )
+
+    async def _answer_text(self, chunks: AsyncIterator[str]):
+        print('Asisstant answers: ', end='', flush=True)
+        async for chunk in chunks:
+            print(chunk, end='', flush=True)
+        print()
+
+    async def _answer_voice(self, chunks: AsyncIterator[str]):
+        """Sentences are spoken as soon as they are generated and synthesized"""
+        await speak(
+            split_sentences(chunks),
+            partial(self.text_to_speech_service.synthesize, output='bytes'),
+            self.sound_service.play_sound,  # type: ignore
+            prefetch=self.speech_prefetch,
+        )
 
     async def run(self):
         if self.input == 'text':
@@ -69,7 +89,8 @@ class SystemAssistant(BaseSystemAssistant):
     async def _run_with_text_input(self):
         answer = self._answer_text if self.output == 'text' else self._answer_voice
         while True:
-            text = self._get_text_input().strip()
+            # Read input off the event loop so background work (e.g. saving chats) keeps running
+            text = (await asyncio.to_thread(self._get_text_input)).strip()
             if not text:
                 logger.warning('No text input from user')
                 continue
@@ -77,15 +98,7 @@ class SystemAssistant(BaseSystemAssistant):
                 logger.info('Exit')
                 return
 
-            ai_answer: AIAnswer = await self.mediator.handle_command(
-                RequestSystemHelpCommand(
-                    message=text,
-                    system_context=self.context.system_context,
-                    chat_id=self.context.chat_id,
-                )
-            )
-            logger.debug(ai_answer)
-            await answer(ai_answer['content'])
+            await answer(self._ask(text))
             text = ''
 
     async def _run_with_voice_input(self):
@@ -98,7 +111,7 @@ class SystemAssistant(BaseSystemAssistant):
             text = ''
 
             while True:
-                text = self._get_audio_input(r, source).strip()
+                text = (await asyncio.to_thread(self._get_audio_input, r, source)).strip()
 
                 if not text:
                     continue
@@ -106,13 +119,5 @@ class SystemAssistant(BaseSystemAssistant):
                     logger.info('Exit')
                     return
 
-                ai_answer: AIAnswer = await self.mediator.handle_command(
-                    RequestSystemHelpCommand(
-                        message=text,
-                        system_context=self.context.system_context,
-                        chat_id=self.context.chat_id,
-                    )
-                )
-                logger.debug(ai_answer)
-                await answer(ai_answer['content'])
+                await answer(self._ask(text))
                 text = ''
@@ -0,0 +1,15 @@
+import asyncio
+
+import pydgraph  # type: ignore[import-untyped]
+
+from system_assistant.core.config import Config
+
+from .schema import set_schema
+
+
+async def init_db(config: Config):
+    client = pydgraph.open(config.dgraph_url)
+    try:
+        await asyncio.to_thread(set_schema, client)
+    finally:
+        client.close()
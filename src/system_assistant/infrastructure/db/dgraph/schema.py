@@ -1,20 +1,28 @@
 import pydgraph  # type: ignore[import-untyped]
 
 CHAT_SCHEMA = """
-id: string @index(exact) .
+id: string @index(exact) @upsert .
 title: string .
-content: string .
+summary: string .
+summary_seq: int .
+last_seq: int .
+content: string @index(fulltext) .
 sender: string .
+seq: int @index(int) .
 message: [uid] @reverse .
 
 type Message {
     sender
     content
+    seq
 }
 
 type Chat {
     id
     title
+    summary
+    summary_seq
+    last_seq
     message
 }
 """
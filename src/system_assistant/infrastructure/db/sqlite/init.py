@@ -1,3 +1,4 @@
+from sqlalchemy import Connection, event, inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
 
 from system_assistant.core.config import Config
@@ -9,9 +10,80 @@ async def init_db(config: Config):
     engine = get_engine(config)
 
     async with engine.begin() as conn:
+        await conn.run_sync(_migrate_message_seq)
+        await conn.run_sync(_migrate_chat_summary)
         await conn.run_sync(mapper_registry.metadata.create_all)
+        await conn.run_sync(_create_message_fts)
 
 
 def get_engine(config: Config) -> AsyncEngine:
     engine = create_async_engine(url=config.sqlite_url, echo=True)
+    event.listen(engine.sync_engine, 'connect', _set_pragmas)
     return engine
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    """
+    WAL lets reads run alongside a write, so the chat gateway and the agent checkpointer
+    don't block each other; with WAL `synchronous=NORMAL` is still safe from corruption
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+def _migrate_message_seq(conn: Connection):
+    """Add `message.seq` to databases created before messages were numbered"""
+    inspector = inspect(conn)
+    if not inspector.has_table('message'):
+        return
+    if 'seq' in {column['name'] for column in inspector.get_columns('message')}:
+        return
+    conn.execute(text('ALTER TABLE message ADD COLUMN seq INTEGER NOT NULL DEFAULT 0'))
+    conn.execute(text(
+        'UPDATE message SET seq = ('
+        'SELECT COUNT(*) FROM message AS prev '
+        'WHERE prev.chat_id = message.chat_id AND prev.id < message.id'
+        ')'
+    ))
+    conn.execute(text(
+        'CREATE UNIQUE INDEX IF NOT EXISTS ix_message_chat_id_seq ON message (chat_id, seq)'
+    ))
+
+
+def _migrate_chat_summary(conn: Connection):
+    """Add `chat.summary` and `chat.summary_seq` to databases created before summaries"""
+    inspector = inspect(conn)
+    if not inspector.has_table('chat'):
+        return
+    columns = {column['name'] for column in inspector.get_columns('chat')}
+    if 'summary' not in columns:
+        conn.execute(text('ALTER TABLE chat ADD COLUMN summary TEXT'))
+    if 'summary_seq' not in columns:
+        conn.execute(text('ALTER TABLE chat ADD COLUMN summary_seq INTEGER'))
+
+
+def _create_message_fts(conn: Connection):
+    """
+    FTS5 index over `message.content`. Triggers keep it in sync with every insert,
+    so saving a chat only indexes its new messages
+    """
+    exists = inspect(conn).has_table('message_fts')
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS message_fts "
+        "USING fts5(content, content='message', content_rowid='id')"
+    ))
+    conn.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS message_fts_insert AFTER INSERT ON message BEGIN '
+        'INSERT INTO message_fts(rowid, content) VALUES (new.id, new.content); '
+        'END'
+    ))
+    conn.execute(text(
+        'CREATE TRIGGER IF NOT EXISTS message_fts_delete AFTER DELETE ON message BEGIN '
+        "INSERT INTO message_fts(message_fts, rowid, content) "
+        "VALUES ('delete', old.id, old.content); "
+        'END'
+    ))
+    if not exists:
+        conn.execute(text("INSERT INTO message_fts(message_fts) VALUES ('rebuild')"))
@@ -1,19 +1,61 @@
-from sqlalchemy import Table, Column, String, Text, ForeignKey, Integer
+from sqlalchemy import (
+    Table, Column, Float, String, Text, ForeignKey, Index, Integer, LargeBinary, TypeDecorator,
+)
 from sqlalchemy.orm import registry, relationship
 
 from system_assistant.domain.entities.chat import Chat, Message
+from system_assistant.domain.vo import Sender
 
 
 mapper_registry = registry()
 
 
+class MessageRecord(Message):
+    """
+    `Message` loaded through the ORM. The ORM needs `__dict__` and weak references,
+    which the slotted `Message` doesn't have, so only this subclass is mapped
+    """
+
+    def to_domain(self) -> Message:
+        return Message(sender=self.sender, content=self.content, seq=self.seq)
+
+
+class ChatRecord(Chat):
+    """
+    `Chat` loaded through the ORM. Converted to `Chat` before it leaves the gateway,
+    so plain messages can be added to it
+    """
+
+    def to_domain(self) -> Chat:
+        return Chat(
+            id=self.id,
+            title=self.title,
+            messages=[message.to_domain() for message in self.messages],  # type: ignore
+            summary=self.summary,
+            summary_seq=self.summary_seq,
+        )
+
+
+class SenderType(TypeDecorator[Sender]):
+    impl = String(10)
+    cache_ok = True
+
+    def process_bind_param(self, value: Sender | str | None, dialect) -> str | None:
+        return None if value is None else str(value)
+
+    def process_result_value(self, value: str | None, dialect) -> Sender | None:
+        return None if value is None else Sender(value)
+
+
 message_table = Table(
     'message',
     mapper_registry.metadata,
     Column('id', Integer, primary_key=True),
     Column('chat_id', String, ForeignKey('chat.id'), nullable=False),
-    Column('sender', String(10), nullable=False),
+    Column('seq', Integer, nullable=False),
+    Column('sender', SenderType, nullable=False),
     Column('content', Text, nullable=False),
+    Index('ix_message_chat_id_seq', 'chat_id', 'seq', unique=True),
 )
 
 
@@ -22,20 +64,74 @@ chat_table = Table(
     mapper_registry.metadata,
     Column('id', String, primary_key=True, unique=True),
     Column('title', String(100), nullable=False),
+    Column('summary', Text, nullable=True),
+    Column('summary_seq', Integer, nullable=True),
+)
+
+# LangGraph agent threads, see `SQLiteCheckpointSaver`
+agent_checkpoint_table = Table(
+    'agent_checkpoint',
+    mapper_registry.metadata,
+    Column('thread_id', String, primary_key=True),
+    Column('checkpoint_ns', String, primary_key=True),
+    Column('checkpoint_id', String, primary_key=True),
+    Column('parent_checkpoint_id', String, nullable=True),
+    Column('type', String, nullable=False),
+    Column('checkpoint', LargeBinary, nullable=False),
+    Column('metadata_type', String, nullable=False),
+    Column('metadata', LargeBinary, nullable=False),
+)
+
+
+agent_checkpoint_blob_table = Table(
+    'agent_checkpoint_blob',
+    mapper_registry.metadata,
+    Column('thread_id', String, primary_key=True),
+    Column('checkpoint_ns', String, primary_key=True),
+    Column('channel', String, primary_key=True),
+    Column('version', String, primary_key=True),
+    Column('type', String, nullable=False),
+    Column('blob', LargeBinary, nullable=False),
+)
+
+
+agent_checkpoint_write_table = Table(
+    'agent_checkpoint_write',
+    mapper_registry.metadata,
+    Column('thread_id', String, primary_key=True),
+    Column('checkpoint_ns', String, primary_key=True),
+    Column('checkpoint_id', String, primary_key=True),
+    Column('task_id', String, primary_key=True),
+    Column('idx', Integer, primary_key=True),
+    Column('channel', String, nullable=False),
+    Column('type', String, nullable=False),
+    Column('blob', LargeBinary, nullable=False),
+    Column('task_path', String, nullable=False, default=''),
+)
+
+# Cached LLM answers, see `CachedAIAgent`
+llm_response_table = Table(
+    'llm_response',
+    mapper_registry.metadata,
+    Column('key', String, primary_key=True),
+    Column('content', Text, nullable=False),
+    Column('latency', Float, nullable=False),
+    Column('created_at', Float, nullable=False),
+    Column('used_at', Float, nullable=False, index=True),
 )
 
 mapper_registry.map_imperatively(
-    Chat,
+    ChatRecord,
     chat_table,
     properties={
         'messages': relationship(
-            'Message',
-            backref='chat',
+            MessageRecord,
             collection_class=list,
             cascade='all, delete-orphan',
-            lazy='joined',
+            lazy='selectin',
+            order_by=message_table.c.seq,
         )
     }
 )
 
-mapper_registry.map_imperatively(Message, message_table)
+mapper_registry.map_imperatively(MessageRecord, message_table)
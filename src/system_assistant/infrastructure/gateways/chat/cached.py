@@ -0,0 +1,121 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from loguru import logger
+
+from system_assistant.application.gateways.chat import (
+    ChatGateway,
+    approximate_size,
+    is_newer_summary,
+)
+from system_assistant.core.cache import CacheStats, LRUCache
+from system_assistant.core.types import SearchHit
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import ID, Message
+
+
+@dataclass(eq=False, slots=True)
+class _CachedChat:
+    chat: Chat
+    complete: bool
+    """`False` if only the system prompt and the latest messages are cached"""
+
+
+class CachedChatGateway:
+    """
+    Read-through LRU cache in front of a persistent `ChatGateway`.
+    Writes go through to the backend first and are then applied to the cached chat,
+    so a chat that is in use is served from memory.
+    Cached chats are bounded by count and by approximate size in bytes
+    """
+
+    def __init__(self, gateway: ChatGateway, max_entries: int = 128, max_bytes: int = 64 * 2**20):
+        self._gateway = gateway
+        self._cache: LRUCache[ID, _CachedChat] = LRUCache(
+            max_entries, max_bytes, weigh=lambda entry: approximate_size(entry.chat),
+        )
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._cache.stats
+
+    async def get_by_id(self, id: ID) -> Chat | None:
+        entry = self._cache.peek(id)
+        if entry is not None and entry.complete:
+            self._cache.get(id)  # records the hit and refreshes recency
+            return self._copy(entry.chat)
+        self.stats.misses += 1
+        chat = await self._gateway.get_by_id(id)
+        if chat is not None:
+            self._cache.put(id, _CachedChat(self._copy(chat), complete=True))
+        return chat
+
+    async def get_window(self, id: ID, limit: int, after_seq: int | None = None) -> Chat | None:
+        entry = self._cache.peek(id)
+        if entry is not None and (window := self._window(entry, limit, after_seq)) is not None:
+            self._cache.get(id)  # records the hit and refreshes recency
+            return window
+        self.stats.misses += 1
+        chat = await self._gateway.get_window(id, limit, after_seq)
+        if chat is not None and after_seq is None:
+            # Fewer messages than requested means the whole chat was loaded
+            complete = len(chat.messages) - 1 < limit
+            self._cache.put(id, _CachedChat(self._copy(chat), complete=complete))
+        return chat
+
+    async def save(self, chat: Chat) -> ID:
+        new_messages = chat.unsaved_messages()
+        is_new_chat = len(new_messages) == len(chat.messages)
+        chat_id = await self._gateway.save(chat)
+        self._apply(chat, new_messages, is_new_chat)
+        return chat_id
+
+    async def save_many(self, chats: list[Chat]) -> None:
+        # Taken before the write, which marks every message as saved
+        new_messages = [chat.unsaved_messages() for chat in chats]
+        is_new_chat = [len(new) == len(chat.messages) for chat, new in zip(chats, new_messages)]
+        await self._gateway.save_many(chats)
+        for chat, new, is_new in zip(chats, new_messages, is_new_chat):
+            self._apply(chat, new, is_new)
+
+    async def iter_chats(self, batch_size: int = 500) -> AsyncIterator[list[Chat]]:
+        async for batch in self._gateway.iter_chats(batch_size):
+            yield batch
+
+    async def search(self, text: str, limit: int = 10, offset: int = 0) -> list[SearchHit]:
+        return await self._gateway.search(text, limit, offset)
+
+    async def close(self) -> None:
+        logger.debug(f'Chat cache stats: {self.stats}')
+        self._cache.clear()
+        await self._gateway.close()
+
+    def _apply(self, chat: Chat, new_messages: list[Message], is_new_chat: bool):
+        """Apply a persisted save to the cached chat"""
+        entry = self._cache.peek(chat.id)
+        if entry is not None:
+            entry.chat.messages.extend(new_messages)
+            if is_newer_summary(chat, entry.chat.summary_seq):
+                entry.chat.summary, entry.chat.summary_seq = chat.summary, chat.summary_seq
+            self._cache.put(chat.id, entry)
+        else:
+            self._cache.put(chat.id, _CachedChat(self._copy(chat), complete=is_new_chat))
+
+    @staticmethod
+    def _copy(chat: Chat) -> Chat:
+        return chat.with_messages(list(chat.messages))
+
+    @staticmethod
+    def _window(entry: _CachedChat, limit: int, after_seq: int | None) -> Chat | None:
+        """Build the window from the cached messages, or `None` if they don't cover it"""
+        prompt, rest = entry.chat.messages[:1], entry.chat.messages[1:]
+        if after_seq is None:
+            if not entry.complete and len(rest) < limit:
+                return None
+            start = max(0, len(rest) - limit)
+        else:
+            if not entry.complete and (not rest or rest[0].seq > after_seq + 1):  # type: ignore
+                return None
+            start = bisect_right(rest, after_seq, key=lambda message: message.seq)  # type: ignore
+        return entry.chat.with_messages(prompt + rest[start:start + limit])
@@ -1,46 +1,361 @@
-from dataclasses import asdict
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import itertools
 import json
+from typing import Any, AsyncIterator, Callable
 
 import pydgraph  # type: ignore[import-untyped]
+import pydgraph.errors  # type: ignore[import-untyped]
 from loguru import logger
 
+from system_assistant.application.gateways.search_index import make_snippet, tokenize
+from system_assistant.core.types import SearchHit
 from system_assistant.domain.entities.chat import Chat
-from system_assistant.domain.vo import ID
+from system_assistant.domain.vo import ID, Message, Sender
 
 
+MAX_UPSERT_ATTEMPTS = 5
+
 _GET_CHAT_DATA_QUERY = """
 query chat($id: string){
     chat(func: eq(id, $id)) {
         id,
         title,
-        messages {
+        summary,
+        summary_seq,
+        message(orderasc: seq) {
+            sender,
+            content,
+            seq
+        }
+    }
+}
+"""
+
+_GET_LATEST_MESSAGES_QUERY = """
+query window($id: string, $first: int){
+    chat(func: eq(id, $id)) {
+        id,
+        title,
+        summary,
+        summary_seq,
+        system: message @filter(eq(seq, 0)) {
+            sender,
+            content,
+            seq
+        }
+        page: message(orderdesc: seq, first: $first) @filter(gt(seq, 0)) {
+            sender,
+            content,
+            seq
+        }
+    }
+}
+"""
+
+_GET_MESSAGES_AFTER_QUERY = """
+query window($id: string, $first: int, $after: int){
+    chat(func: eq(id, $id)) {
+        id,
+        title,
+        summary,
+        summary_seq,
+        system: message @filter(eq(seq, 0)) {
             sender,
-            content
+            content,
+            seq
+        }
+        page: message(orderasc: seq, first: $first) @filter(gt(seq, $after)) {
+            sender,
+            content,
+            seq
+        }
+    }
+}
+"""
+
+_CHATS_PAGE_FIELDS = """
+        uid,
+        id,
+        title,
+        summary,
+        summary_seq,
+        message(orderasc: seq) {
+            sender,
+            content,
+            seq
+        }
+"""
+
+_FIRST_CHATS_QUERY = """
+query chats($first: int){
+    chats(func: type(Chat), first: $first) {%s}
+}
+""" % _CHATS_PAGE_FIELDS
+
+_NEXT_CHATS_QUERY = """
+query chats($first: int, $after: string){
+    chats(func: type(Chat), first: $first, after: $after) {%s}
+}
+""" % _CHATS_PAGE_FIELDS
+
+_SEARCH_MESSAGES_QUERY = """
+query search($text: string, $first: int, $offset: int){
+    hits(func: alloftext(content, $text), first: $first, offset: $offset) {
+        sender,
+        content,
+        seq,
+        chat: ~message {
+            id,
+            title
         }
     }
 }
 """
 
+_LAST_SEQ_QUERY = """
+query chat($id: string){
+    chat(func: eq(id, $id)) {
+        last_seq,
+        summary_seq,
+        message(orderdesc: seq, first: 1) {
+            seq
+        }
+    }
+}
+"""
+
+_UPSERT_CHAT_QUERY = """
+query chat($id: string){
+    chat as var(func: eq(id, $id))
+}
+"""
+
+
+def _to_messages(data: list[dict]) -> list[Message]:
+    return [Message(sender=m['sender'], content=m['content'], seq=m.get('seq')) for m in data]
+
+
+def _to_chat(data: dict[str, Any], messages: list[Message]) -> Chat:
+    return Chat(
+        id=data['id'],
+        title=data['title'],
+        messages=messages,
+        summary=data.get('summary'),
+        summary_seq=data.get('summary_seq'),
+    )
+
+
+def _to_chat_obj(chat: Chat, messages: list[Message]) -> dict[str, Any]:
+    """Upsert mutation of the chat with its unsaved `messages`, numbered by `_numbered`"""
+    # `uid(chat)` resolves to the existing chat node or creates a new one
+    return {
+        'uid': 'uid(chat)',
+        'dgraph.type': 'Chat',
+        'id': chat.id,
+        'title': chat.title,
+        **({'summary': chat.summary, 'summary_seq': chat.summary_seq} if chat.summary else {}),
+        'message': [
+            {
+                'uid': f'_:message{index}',
+                'dgraph.type': 'Message',
+                'sender': message.sender,
+                'content': message.content,
+            }
+            for index, message in enumerate(messages)
+        ],
+    }
+
+
+def _numbered(chat_obj: dict[str, Any], first_seq: int) -> dict[str, Any]:
+    messages = [
+        {**message, 'seq': seq} for seq, message in enumerate(chat_obj['message'], start=first_seq)
+    ]
+    if not messages:
+        return chat_obj
+    # Written by every save that adds messages, so concurrent ones conflict on it
+    return {**chat_obj, 'message': messages, 'last_seq': first_seq + len(messages) - 1}
+
+
+def _stored_seqs(txn: pydgraph.Txn, chat_id: ID) -> tuple[int, int | None]:
+    """The next message `seq` of the stored chat and its `summary_seq`"""
+    result = json.loads(txn.query(_LAST_SEQ_QUERY, variables={'$id': chat_id}).json)
+    if not result['chat']:
+        return 0, None
+    data = result['chat'][0]
+    # Chats saved before `last_seq` existed only have their messages
+    last_seq = max(data.get('last_seq', -1), *(m['seq'] for m in data.get('message', [])), -1)
+    return last_seq + 1, data.get('summary_seq')
+
+
+def _without_older_summary(chat_obj: dict[str, Any], summary_seq: int | None) -> dict[str, Any]:
+    """Like `is_newer_summary`: a chat loaded before the last summary doesn't replace it"""
+    new_seq = chat_obj.get('summary_seq')
+    if new_seq is None or summary_seq is None or new_seq > summary_seq:
+        return chat_obj
+    return {key: value for key, value in chat_obj.items() if key not in ('summary', 'summary_seq')}
+
 
 class DgraphChatGateway:
-    def __init__(self, dgraph_url: str):
-        self.client = pydgraph.open(dgraph_url)
+    """
+    pydgraph is synchronous, so every request runs in a thread pool on one of
+    `pool_size` clients (each with its own gRPC channel) and never blocks the event loop.
+    `save` is an upsert that writes only the messages added since the chat was loaded,
+    numbered by the storage so several writers of one chat never share a `seq`
+    """
+
+    def __init__(
+        self,
+        dgraph_url: str,
+        pool_size: int = 4,
+        client_factory: Callable[[str], pydgraph.DgraphClient] = pydgraph.open,
+    ):
+        self._clients = [client_factory(dgraph_url) for _ in range(pool_size)]
+        self._next_client = itertools.cycle(self._clients)
+        self._executor = ThreadPoolExecutor(pool_size, thread_name_prefix='dgraph')
+
+    async def _run[R](self, operation: Callable[[pydgraph.DgraphClient], R]) -> R:
+        client = next(self._next_client)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, operation, client)
+
+    @staticmethod
+    def _query(
+        client: pydgraph.DgraphClient, query: str, variables: dict[str, str],
+    ) -> dict[str, Any]:
+        txn = client.txn(read_only=True)
+        res = txn.query(query=query, variables=variables)
+        return json.loads(res.json)
 
     async def get_by_id(self, id: ID) -> Chat | None:
-        variables = {'$id': id}
-        txn = self.client.txn(read_only=True)
-        res = txn.query(query=_GET_CHAT_DATA_QUERY, variables=variables)
-        chat_json = json.loads(res.json)
+        chat_json = await self._run(
+            partial(self._query, query=_GET_CHAT_DATA_QUERY, variables={'$id': id}),
+        )
         if not chat_json['chat']:
             return None
-        return Chat(**chat_json['chat'][0])
+        data = chat_json['chat'][0]
+        return _to_chat(data, _to_messages(data.get('message', [])))
 
-    async def save(self, chat: Chat) -> ID:
-        txn = self.client.txn()
+    async def get_window(self, id: ID, limit: int, after_seq: int | None = None) -> Chat | None:
+        if after_seq is None:
+            query = _GET_LATEST_MESSAGES_QUERY
+            variables = {'$id': id, '$first': str(limit)}
+        else:
+            query = _GET_MESSAGES_AFTER_QUERY
+            variables = {'$id': id, '$first': str(limit), '$after': str(max(after_seq, 0))}
+        chat_json = await self._run(partial(self._query, query=query, variables=variables))
+        if not chat_json['chat']:
+            return None
+        data = chat_json['chat'][0]
+        page = _to_messages(data.get('page', []))
+        if after_seq is None:
+            page.reverse()
+        return _to_chat(data, _to_messages(data.get('system', [])) + page)
+
+    @staticmethod
+    def _upsert_once(
+        client: pydgraph.DgraphClient, chat_objs: list[tuple[ID, dict[str, Any]]],
+    ) -> list[int]:
+        txn = client.txn()
         try:
-            response = txn.mutate(set_obj=asdict(chat), commit_now=True)
-            logger.debug(response)
-        except Exception as e:
-            logger.error(str(e))
+            next_seqs: dict[ID, int] = {}
+            summary_seqs: dict[ID, int | None] = {}
+            first_seqs = []
+            for index, (chat_id, chat_obj) in enumerate(chat_objs):
+                if chat_id not in next_seqs:
+                    next_seqs[chat_id], summary_seqs[chat_id] = _stored_seqs(txn, chat_id)
+                first_seqs.append(next_seqs[chat_id])
+                chat_obj = _without_older_summary(chat_obj, summary_seqs[chat_id])
+                if 'summary_seq' in chat_obj:
+                    summary_seqs[chat_id] = chat_obj['summary_seq']
+                mutation = txn.create_mutation(set_obj=_numbered(chat_obj, next_seqs[chat_id]))
+                next_seqs[chat_id] += len(chat_obj['message'])
+                txn.do_request(txn.create_request(
+                    query=_UPSERT_CHAT_QUERY,
+                    variables={'$id': chat_id},
+                    mutations=[mutation],
+                    commit_now=index == len(chat_objs) - 1,
+                ))
+            return first_seqs
+        finally:
             txn.discard()
+
+    @classmethod
+    def _upsert(
+        cls, client: pydgraph.DgraphClient, chat_objs: list[tuple[ID, dict[str, Any]]],
+    ) -> list[int]:
+        """
+        Upsert every chat in one transaction and return the first `seq` given to the new
+        messages of each. Messages are numbered after the last `seq` stored for their chat,
+        read in the same transaction; two writers of one chat both set its `last_seq`, so
+        one of the commits is aborted and retried after the other's messages
+        """
+        attempt = 1
+        while True:
+            try:
+                return cls._upsert_once(client, chat_objs)
+            except pydgraph.errors.AbortedError:
+                if attempt == MAX_UPSERT_ATTEMPTS:
+                    raise
+                logger.debug(f'Chat upsert conflicted, retrying: attempt={attempt}')
+                attempt += 1
+
+    async def save(self, chat: Chat) -> ID:
+        await self.save_many([chat])
         return chat.id
+
+    async def save_many(self, chats: list[Chat]) -> None:
+        """Errors are raised to the caller, nothing is numbered unless the commit succeeded"""
+        pending = [(chat, chat.unsaved_messages()) for chat in chats]
+        first_seqs = await self._run(partial(
+            self._upsert,
+            chat_objs=[(chat.id, _to_chat_obj(chat, messages)) for chat, messages in pending],
+        ))
+        for (_, messages), first_seq in zip(pending, first_seqs):
+            for seq, message in enumerate(messages, start=first_seq):
+                message.seq = seq
+        logger.debug(f'Saved chats: count={len(chats)}')
+
+    async def iter_chats(self, batch_size: int = 500) -> AsyncIterator[list[Chat]]:
+        """Pagination by uid with `first`/`after`"""
+        variables = {'$first': str(batch_size)}
+        query = _FIRST_CHATS_QUERY
+        while True:
+            result = await self._run(partial(self._query, query=query, variables=variables))
+            if not result['chats']:
+                return
+            yield [
+                _to_chat(data, _to_messages(data.get('message', []))) for data in result['chats']
+            ]
+            variables = {'$first': str(batch_size), '$after': result['chats'][-1]['uid']}
+            query = _NEXT_CHATS_QUERY
+
+    async def search(self, text: str, limit: int = 10, offset: int = 0) -> list[SearchHit]:
+        """Dgraph fulltext index does not score matches, hits keep the order it returns them in"""
+        terms = tokenize(text)
+        if not terms:
+            return []
+        variables = {'$text': ' '.join(terms), '$first': str(limit), '$offset': str(offset)}
+        result = await self._run(
+            partial(self._query, query=_SEARCH_MESSAGES_QUERY, variables=variables),
+        )
+        hits = []
+        for position, data in enumerate(result['hits'], start=offset):
+            if not data.get('chat'):
+                continue
+            chat = data['chat'][0]
+            hits.append(SearchHit(
+                chat_id=chat['id'],
+                chat_title=chat['title'],
+                seq=data['seq'],
+                sender=Sender(data['sender']),
+                snippet=make_snippet(data['content'], terms),
+                rank=position,
+            ))
+        return hits
+
+    async def close(self) -> None:
+        for client in self._clients:
+            client.close()
+        self._executor.shutdown(wait=False)
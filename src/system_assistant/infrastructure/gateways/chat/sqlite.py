@@ -1,24 +1,230 @@
+from typing import Any, AsyncIterator
+
+from sqlalchemy import case, func, insert, or_, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncEngine
 from loguru import logger
 
+from system_assistant.core.types import SearchHit
 from system_assistant.domain.entities.chat import Chat
-from system_assistant.domain.vo import ID
+from system_assistant.domain.vo import ID, Message, Sender
+from system_assistant.infrastructure.db.sqlite.tables import (
+    ChatRecord,
+    chat_table,
+    message_table,
+)
+
+
+_SEARCH_QUERY = text("""
+SELECT
+    message.chat_id,
+    chat.title,
+    message.seq,
+    message.sender,
+    snippet(message_fts, 0, '[', ']', '...', 12) AS snippet,
+    bm25(message_fts) AS rank
+FROM message_fts
+JOIN message ON message.id = message_fts.rowid
+JOIN chat ON chat.id = message.chat_id
+WHERE message_fts MATCH :query
+ORDER BY rank
+LIMIT :limit OFFSET :offset
+""")
+
+
+def _to_fts_query(text: str) -> str:
+    """Match every word of the text literally, FTS5 operators in it are not interpreted"""
+    return ' '.join('"{}"'.format(word.replace('"', '""')) for word in text.split())
 
 
 class SQLiteChatGateway:
     def __init__(self, engine: AsyncEngine):
+        self.engine = engine
         self.session_factory = async_sessionmaker(engine, expire_on_commit=True, autoflush=False)
 
     async def get_by_id(self, id: ID) -> Chat | None:
         logger.info(f'Get chat by id: id={id}')
         async with self.session_factory() as session:
-            chat = await session.get(Chat, id)
-        return chat
+            record = await session.get(ChatRecord, id)
+            return None if record is None else record.to_domain()
+
+    async def get_window(self, id: ID, limit: int, after_seq: int | None = None) -> Chat | None:
+        """Keyset-paginated load over the `(chat_id, seq)` index"""
+        logger.info(f'Get chat window: id={id}, limit={limit}, after_seq={after_seq}')
+        columns = (message_table.c.seq, message_table.c.sender, message_table.c.content)
+        in_chat = message_table.c.chat_id == id
+        if after_seq is None:
+            page = (
+                select(*columns)
+                .where(in_chat, message_table.c.seq > 0)
+                .order_by(message_table.c.seq.desc())
+                .limit(limit)
+            )
+        else:
+            page = (
+                select(*columns)
+                .where(in_chat, message_table.c.seq > max(after_seq, 0))
+                .order_by(message_table.c.seq)
+                .limit(limit)
+            )
+        async with self.session_factory() as session:
+            chat_row = (await session.execute(
+                select(chat_table.c.title, chat_table.c.summary, chat_table.c.summary_seq)
+                .where(chat_table.c.id == id)
+            )).first()
+            if chat_row is None:
+                return None
+            system_rows = (await session.execute(
+                select(*columns).where(in_chat, message_table.c.seq == 0)
+            )).all()
+            page_rows = list((await session.execute(page)).all())
+
+        if after_seq is None:
+            page_rows.reverse()
+        messages = [
+            Message(sender=row.sender, content=row.content, seq=row.seq)
+            for row in (*system_rows, *page_rows)
+        ]
+        return Chat(
+            id=id,
+            title=chat_row.title,
+            messages=messages,
+            summary=chat_row.summary,
+            summary_seq=chat_row.summary_seq,
+        )
 
     async def save(self, chat: Chat) -> ID:
+        """
+        Append-only save: upserts the chat row and inserts only the messages
+        that were added since the chat was loaded, so the cost doesn't grow with history
+        """
         logger.info(f'Save chat: id={chat.id}')
-        chat_id = chat.id
+        await self.save_many([chat])
+        return chat.id
+
+    async def save_many(self, chats: list[Chat]) -> None:
+        """`save` for a batch of chats: three statements in total, in one transaction"""
+        pending = [(chat.id, chat.unsaved_messages()) for chat in chats]
+        assigned: list[tuple[list[Message], int]] = []
+        async with self.session_factory() as session, session.begin():
+            upsert_chat = sqlite_insert(chat_table)
+            # Like `is_newer_summary`: a chat loaded before the last summary keeps it
+            newer_summary = or_(
+                chat_table.c.summary_seq.is_(None),
+                upsert_chat.excluded.summary_seq > chat_table.c.summary_seq,
+            )
+            await session.execute(
+                upsert_chat.on_conflict_do_update(
+                    index_elements=[chat_table.c.id],
+                    set_={
+                        'summary': case(
+                            (newer_summary, upsert_chat.excluded.summary),
+                            else_=chat_table.c.summary,
+                        ),
+                        'summary_seq': case(
+                            (newer_summary, upsert_chat.excluded.summary_seq),
+                            else_=chat_table.c.summary_seq,
+                        ),
+                    },
+                ),
+                [
+                    {
+                        'id': chat.id,
+                        'title': chat.title,
+                        'summary': chat.summary,
+                        'summary_seq': chat.summary_seq,
+                    }
+                    for chat in chats
+                ],
+            )
+            chat_ids = list({id for id, messages in pending if messages})
+            if not chat_ids:
+                return
+            last_seqs = dict((await session.execute(
+                select(message_table.c.chat_id, func.max(message_table.c.seq))
+                .where(message_table.c.chat_id.in_(chat_ids))
+                .group_by(message_table.c.chat_id)
+            )).tuples().all())
+            next_seqs = {id: last_seqs[id] + 1 if id in last_seqs else 0 for id in chat_ids}
+            rows: list[dict[str, Any]] = []
+            for id, messages in pending:
+                if not messages:
+                    continue
+                assigned.append((messages, next_seqs[id]))
+                rows.extend(
+                    {
+                        'chat_id': id,
+                        'seq': seq,
+                        'sender': message.sender,
+                        'content': message.content,
+                    }
+                    for seq, message in enumerate(messages, start=next_seqs[id])
+                )
+                next_seqs[id] += len(messages)
+            await session.execute(insert(message_table), rows)
+        for messages, first_seq in assigned:
+            for seq, message in enumerate(messages, start=first_seq):
+                message.seq = seq
+        logger.debug(f'Saved messages: chats={len(chat_ids)}, count={len(rows)}')
+
+    async def iter_chats(self, batch_size: int = 500) -> AsyncIterator[list[Chat]]:
+        """Keyset pagination over chat ids; each batch of messages is loaded by a single query"""
+        last_id: ID | None = None
+        while True:
+            chats_query = select(chat_table).order_by(chat_table.c.id).limit(batch_size)
+            if last_id is not None:
+                chats_query = chats_query.where(chat_table.c.id > last_id)
+            async with self.session_factory() as session:
+                chat_rows = (await session.execute(chats_query)).all()
+                if not chat_rows:
+                    return
+                message_rows = (await session.execute(
+                    select(
+                        message_table.c.chat_id,
+                        message_table.c.seq,
+                        message_table.c.sender,
+                        message_table.c.content,
+                    )
+                    .where(message_table.c.chat_id.in_([row.id for row in chat_rows]))
+                    .order_by(message_table.c.chat_id, message_table.c.seq)
+                )).all()
+            chats = {
+                row.id: Chat(
+                    id=row.id,
+                    title=row.title,
+                    messages=[],
+                    summary=row.summary,
+                    summary_seq=row.summary_seq,
+                )
+                for row in chat_rows
+            }
+            for row in message_rows:
+                chats[row.chat_id].messages.append(
+                    Message(sender=row.sender, content=row.content, seq=row.seq),
+                )
+            yield list(chats.values())
+            last_id = chat_rows[-1].id
+
+    async def search(self, text: str, limit: int = 10, offset: int = 0) -> list[SearchHit]:
+        logger.info(f'Search messages: text={text!r}, limit={limit}, offset={offset}')
+        query = _to_fts_query(text)
+        if not query:
+            return []
         async with self.session_factory() as session:
-            session.add(chat)
-            await session.commit()
-        return chat_id
+            rows = (await session.execute(
+                _SEARCH_QUERY, {'query': query, 'limit': limit, 'offset': offset},
+            )).all()
+        return [
+            SearchHit(
+                chat_id=row.chat_id,
+                chat_title=row.title,
+                seq=row.seq,
+                sender=Sender(row.sender),
+                snippet=row.snippet,
+                rank=row.rank,
+            )
+            for row in rows
+        ]
+
+    async def close(self) -> None:
+        await self.engine.dispose()
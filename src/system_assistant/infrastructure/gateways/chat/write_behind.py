@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator
+
+from loguru import logger
+
+from system_assistant.application.gateways.chat import ChatGateway, is_newer_summary
+from system_assistant.core.exceptions import UnexpectedApplicationException
+from system_assistant.core.types import SearchHit
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import ID
+
+
+class WriteBehindChatGateway:
+    """
+    Wraps any `ChatGateway` and takes `save` off the response critical path:
+    saves are acknowledged right away and flushed by a background task, a batch
+    per `save_many` call. Pending saves of the same chat are coalesced into one
+    write, and `save` waits for room once `max_pending` chats are waiting to be flushed.
+    A failed batch is retried with exponential backoff up to `max_retries` times, then
+    given up; `close` raises if any chat was left unsaved
+    """
+
+    def __init__(
+        self,
+        gateway: ChatGateway,
+        max_pending: int = 100,
+        flush_interval: float = 0.05,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+        max_retry_backoff: float = 30.0,
+    ):
+        self._gateway = gateway
+        self._max_pending = max_pending
+        self._flush_interval = flush_interval
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._max_retry_backoff = max_retry_backoff
+        self._failures = 0
+        """Failed flushes in a row"""
+        self._unsaved: set[ID] = set()
+        """Chats whose batch was given up, until a later save of them goes through"""
+        self._pending: dict[ID, Chat] = {}
+        self._has_pending = asyncio.Event()
+        self._has_room = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._worker: asyncio.Task | None = None
+        self._closed = False
+        self._closing = asyncio.Event()
+
+    async def get_by_id(self, id: ID) -> Chat | None:
+        if id in self._pending:
+            await self.flush()
+        return await self._gateway.get_by_id(id)
+
+    async def get_window(self, id: ID, limit: int, after_seq: int | None = None) -> Chat | None:
+        if id in self._pending:
+            await self.flush()
+        return await self._gateway.get_window(id, limit, after_seq)
+
+    async def search(self, text: str, limit: int = 10, offset: int = 0) -> list[SearchHit]:
+        if self._pending:
+            await self.flush()
+        return await self._gateway.search(text, limit, offset)
+
+    async def save(self, chat: Chat) -> ID:
+        if self._closed:
+            return await self._gateway.save(chat)
+        async with self._has_room:
+            await self._has_room.wait_for(
+                lambda: chat.id in self._pending or len(self._pending) < self._max_pending,
+            )
+            self._queue(chat)
+        self._has_pending.set()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return chat.id
+
+    async def save_many(self, chats: list[Chat]) -> None:
+        """Bulk writes are already batched, they go straight to the wrapped gateway"""
+        if any(chat.id in self._pending for chat in chats):
+            await self.flush()
+        await self._gateway.save_many(chats)
+
+    async def iter_chats(self, batch_size: int = 500) -> AsyncIterator[list[Chat]]:
+        if self._pending:
+            await self.flush()
+        async for batch in self._gateway.iter_chats(batch_size):
+            yield batch
+
+    async def flush(self):
+        async with self._flush_lock:
+            batch, self._pending = self._pending, {}
+            self._has_pending.clear()
+            if batch:
+                try:
+                    await self._gateway.save_many(list(batch.values()))
+                except Exception as e:
+                    self._failures += 1
+                    logger.error(
+                        f'Failed to flush chats: ids={list(batch)}, '
+                        f'attempt={self._failures}, error={e}'
+                    )
+                    if not self._closed and self._failures <= self._max_retries:
+                        self._requeue(list(batch.values()))
+                    else:
+                        # Their messages stay unsaved on the chats, the next save retries them
+                        logger.error(f'Gave up flushing chats: ids={list(batch)}')
+                        self._unsaved.update(batch)
+                        self._failures = 0
+                else:
+                    logger.debug(f'Flushed chats: count={len(batch)}')
+                    self._failures = 0
+                    self._unsaved.difference_update(batch)
+            async with self._has_room:
+                self._has_room.notify_all()
+
+    def _queue(self, chat: Chat):
+        queued = self._pending.get(chat.id)
+        if queued is None or queued is chat:
+            self._pending[chat.id] = chat
+            return
+        # Another object of the same chat, e.g. loaded again: the queued one keeps its
+        # unsaved messages and takes the new ones, nothing is written twice or lost
+        known = {id(message) for message in queued.messages}
+        queued.messages.extend(m for m in chat.unsaved_messages() if id(m) not in known)
+        queued.title = chat.title
+        if is_newer_summary(chat, queued.summary_seq):
+            queued.summary, queued.summary_seq = chat.summary, chat.summary_seq
+
+    def _requeue(self, chats: list[Chat]):
+        # Saves queued while the batch was being written are newer, they go on top
+        newer, self._pending = self._pending, {}
+        for chat in [*chats, *newer.values()]:
+            self._queue(chat)
+        self._has_pending.set()
+
+    async def close(self):
+        """
+        Stop the background task and drain every pending save.
+        Raises `UnexpectedApplicationException` if some chats could not be saved
+        """
+        self._closed = True
+        self._closing.set()
+        self._has_pending.set()
+        if self._worker is not None:
+            await self._worker
+        await self.flush()
+        await self._gateway.close()
+        if self._unsaved:
+            raise UnexpectedApplicationException(
+                f'Chats were not saved: ids={sorted(self._unsaved)}'
+            )
+
+    async def _run(self):
+        while not self._closed:
+            await self._has_pending.wait()
+            # Give the next saves a moment to coalesce into the same flush
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+            if self._failures:
+                # Back off while the backend is failing, but don't hold `close` up
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._closing.wait(), self._retry_delay())
+
+    def _retry_delay(self) -> float:
+        return min(self._retry_backoff * 2 ** (self._failures - 1), self._max_retry_backoff)
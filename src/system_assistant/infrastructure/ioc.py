@@ -1,8 +1,13 @@
+from pathlib import Path
 import typing as t
 
+import httpx
 from langchain.tools import BaseTool
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from sqlalchemy.ext.asyncio import AsyncEngine
 from punq import (  # type: ignore[import-untyped]
     Container,
+    MissingDependencyError,
     Scope,
 )
 from system_assistant.application.commands.request_system_help import (
@@ -14,93 +19,217 @@ from system_assistant.application.gateways.chat import (
     InMemoryChatGateway,
 )
 from system_assistant.application.mediator import Mediator
+from system_assistant.application.queries.search_chats import (
+    SearchChatsQuery,
+    SearchChatsQueryHandler,
+)
 from system_assistant.application.services.ai.base import LLM  # noqa
 from system_assistant.application.services.ai.base import (
     AIAgent,
     FakeAIAgent,
     FakeLLM,
 )
+from system_assistant.application.services.ai.context import ContextWindowManager
 from system_assistant.application.services.text_to_speech.base import BaseTextToSpeechService
 from system_assistant.core.config import Config
 from system_assistant.infrastructure.db.sqlite.init import get_engine
+from system_assistant.infrastructure.gateways.chat.cached import CachedChatGateway
+from system_assistant.infrastructure.gateways.chat.dgraph import DgraphChatGateway
 from system_assistant.infrastructure.gateways.chat.sqlite import SQLiteChatGateway
+from system_assistant.infrastructure.gateways.chat.write_behind import WriteBehindChatGateway
+from system_assistant.infrastructure.services.ai.cached import CachedAIAgent
 from system_assistant.infrastructure.services.ai.deepseek import (  # noqa
     DeepSeek,
     DeepSeekOpenAIAgent,
 )
+from system_assistant.infrastructure.services.ai.checkpoint import SQLiteCheckpointSaver
 from system_assistant.infrastructure.services.ai.gemini import (  # noqa
     Gemini,
     GeminiOpenAIAgent,
 )
+from system_assistant.infrastructure.services.ai.hedged import HedgedAIAgent
 from system_assistant.infrastructure.services.ai.openai_agent import BaseReactOpenAIAgent
+from system_assistant.infrastructure.services.ai.tools.executor import ToolExecutor
+from system_assistant.infrastructure.services.http import build_http_client
 from system_assistant.infrastructure.services.sound.base import SoundService
 from system_assistant.infrastructure.services.sound.mpg123 import MPG123SoundService
 from system_assistant.infrastructure.services.text_to_speech.google import GoogleTextToSpeechService
 
 
+def _build_agent(
+    llm_type: str,
+    config: Config,
+    tools: list[BaseTool],
+    temperature: float,
+    memory_saver: BaseCheckpointSaver | None,
+    http_client: httpx.AsyncClient,
+    tool_executor: ToolExecutor,
+    thread_namespace: str = '',
+) -> tuple[AIAgent, LLM]:
+    agent_type: type[BaseReactOpenAIAgent]
+    if llm_type == 'gemini':
+        agent_type = GeminiOpenAIAgent
+        llm: LLM = Gemini(config.gemini_api_key, config.gemini_base_url, http_client)
+    elif llm_type == 'deepseek':
+        agent_type = DeepSeekOpenAIAgent
+        llm = DeepSeek(config.deepseek_api_key, config.deepseek_base_url, http_client)
+    elif llm_type == 'fake':
+        return FakeAIAgent(), FakeLLM()  # type: ignore
+    else:
+        raise ValueError(f'Unsupported LLM: {llm_type}')
+    agent = agent_type(
+        config,
+        tools=tools,
+        memory_saver=memory_saver,
+        temperature=temperature,
+        thread_namespace=thread_namespace,
+        http_client=http_client,
+        tool_executor=tool_executor,
+    )
+    return agent, llm  # type: ignore
+
+
 def register_llm(
     container: Container,
     llm_type: str = 'fake',
     llm_tools: list[BaseTool] | None = None,
     llm_temperature: float = 1.0,
+    llm_cache: bool = False,
 ) -> Container:
+    """`llm_type` may list several LLMs separated by commas, requests are hedged across them"""
 
     llm_tools = llm_tools or []
 
     config = t.cast(Config, container.resolve(Config))
+    http_client = t.cast(httpx.AsyncClient, container.resolve(httpx.AsyncClient))
+    # Registered by `register_gateway` to match the storage, agents keep their own otherwise
+    try:
+        memory_saver = t.cast(BaseCheckpointSaver, container.resolve(BaseCheckpointSaver))
+    except MissingDependencyError:
+        memory_saver = None
 
-    if llm_type == 'gemini':
-        ai_agent: BaseReactOpenAIAgent = GeminiOpenAIAgent(
-            config, tools=llm_tools, temperature=llm_temperature,
+    tool_executor = ToolExecutor(max_workers=config.tool_max_workers, timeout=config.tool_timeout)
+    container.register(ToolExecutor, instance=tool_executor)
+    names = [name.strip() for name in llm_type.split(',')]
+    built = [
+        _build_agent(
+            name,
+            config,
+            llm_tools,
+            llm_temperature,
+            memory_saver,
+            http_client,
+            tool_executor,
+            # Providers of a hedged agent share the checkpointer but not the threads
+            thread_namespace=name if len(names) > 1 else '',
         )
-        llm: LLM = Gemini(config.gemini_api_key)
-        container.register(Gemini, instance=llm, scope=Scope.singleton)
-        container.register(LLM, instance=llm)
+        for name in names
+    ]
+    # Plain requests, e.g. history summaries, go to the preferred LLM
+    llm = built[0][1]
+    container.register(LLM, instance=llm)
+    container.register(type(llm), instance=llm, scope=Scope.singleton)
 
-    elif llm_type == 'deepseek':
-        ai_agent = DeepSeekOpenAIAgent(
-            config, tools=llm_tools, temperature=llm_temperature,
+    agent = built[0][0]
+    if len(built) > 1:
+        agent = HedgedAIAgent(
+            [agent for agent, _ in built],
+            hedge_percentile=config.hedge_percentile,
+            default_delay=config.hedge_default_delay,
+            failure_threshold=config.circuit_failure_threshold,
+            reset_timeout=config.circuit_reset_timeout,
+        )
+    if llm_cache:
+        # Persisted next to the chats with sqlite storage, kept in memory otherwise
+        try:
+            engine = t.cast(AsyncEngine, container.resolve(AsyncEngine))
+        except MissingDependencyError:
+            engine = None
+        agent = CachedAIAgent(
+            agent,
+            engine=engine,
+            max_entries=config.llm_cache_max_entries,
+            ttl=config.llm_cache_ttl,
+            max_temperature=config.llm_cache_max_temperature,
         )
-        llm = DeepSeek(config.deepseek_api_key)
-        container.register(DeepSeek, instance=llm, scope=Scope.singleton)
-        container.register(LLM, instance=llm)
-
-    elif llm_type == 'fake':
-        llm = FakeLLM()
-        container.register(LLM, FakeLLM)
-        ai_agent = FakeAIAgent()  # type: ignore
-
-    else:
-        raise ValueError(f'Unsupported LLM: {llm_type}')
 
-    container.register(AIAgent, instance=ai_agent, scope=Scope.singleton)  # type: ignore
+    container.register(AIAgent, instance=agent, scope=Scope.singleton)
     return container
 
 
 def register_mediator_handlers(container: Container) -> Container:
-    container.register(RequestSystemHelpCommandHandler)
+    config = t.cast(Config, container.resolve(Config))
+    context_window = None
+    if config.context_max_tokens > 0:
+        context_window = ContextWindowManager(
+            t.cast(LLM, container.resolve(LLM)), max_tokens=config.context_max_tokens,
+        )
+    # Built by a factory: punq ignores keyword arguments of a plain registration
+    container.register(
+        RequestSystemHelpCommandHandler,
+        factory=lambda: RequestSystemHelpCommandHandler(
+            chat_gateway=t.cast(ChatGateway, container.resolve(ChatGateway)),
+            ai_agent=t.cast(AIAgent, container.resolve(AIAgent)),
+            history_limit=config.history_limit,
+            context_window=context_window,
+        ),
+    )
+    container.register(SearchChatsQueryHandler)
 
     return container
 
 
-def register_gateway(container: Container, storage: str) -> Container:
+def register_gateway(
+    container: Container,
+    storage: str,
+    write_behind: bool = False,
+) -> Container:
     config = t.cast(Config, container.resolve(Config))
 
+    gateway: ChatGateway
     if storage == 'memory':
-        container.register(ChatGateway, factory=InMemoryChatGateway)
+        spill_dir = config.memory_storage_spill_dir
+        gateway = InMemoryChatGateway(
+            max_bytes=config.memory_storage_max_bytes,
+            max_chats=config.memory_storage_max_chats,
+            ttl=config.memory_storage_ttl or None,
+            spill_dir=Path(spill_dir) if spill_dir else None,
+        )
     elif storage == 'sqlite':
         engine = get_engine(config)
-        container.register(ChatGateway, instance=SQLiteChatGateway(engine), scope=Scope.singleton)
+        container.register(AsyncEngine, instance=engine, scope=Scope.singleton)
+        gateway = SQLiteChatGateway(engine)
+        # Agent threads go to the same database, so resumed chats start warm
+        container.register(
+            BaseCheckpointSaver,
+            instance=SQLiteCheckpointSaver(engine, max_checkpoints=config.agent_max_checkpoints),
+            scope=Scope.singleton,
+        )
+    elif storage == 'dgraph':
+        gateway = DgraphChatGateway(config.dgraph_url)
     else:
         raise ValueError(f'Unsupported storage: {storage}')
 
+    if storage != 'memory' and config.chat_cache_max_entries > 0:
+        gateway = CachedChatGateway(
+            gateway,
+            max_entries=config.chat_cache_max_entries,
+            max_bytes=config.chat_cache_max_bytes,
+        )
+    # Write-behind goes outermost: the cache only sees saves once they are persisted
+    if write_behind:
+        gateway = WriteBehindChatGateway(gateway)
+
+    container.register(ChatGateway, instance=gateway, scope=Scope.singleton)
     return container
 
 
 def register_services(container: Container) -> Container:
     config = t.cast(Config, container.resolve(Config))
+    http_client = t.cast(httpx.AsyncClient, container.resolve(httpx.AsyncClient))
     container.register(
-        BaseTextToSpeechService, instance=GoogleTextToSpeechService(config.google_api_key),
+        BaseTextToSpeechService,
+        instance=GoogleTextToSpeechService(config.google_api_key, http_client),
     )
     container.register(SoundService, MPG123SoundService, scope=Scope.transient)
     return container
@@ -112,8 +241,13 @@ def register_mediator(container: Container) -> Container:
         container.resolve(RequestSystemHelpCommandHandler)
     )
 
+    search_chats_query_handler = t.cast(
+        SearchChatsQueryHandler, container.resolve(SearchChatsQueryHandler),
+    )
+
     mediator = Mediator()
     mediator.register_handlers(RequestSystemHelpCommand, [request_system_help_comand_handler])
+    mediator.register_handlers(SearchChatsQuery, [search_chats_query_handler])
 
     container.register(Mediator, instance=mediator, scope=Scope.singleton)
     return container
@@ -126,5 +260,9 @@ def init_base_container() -> Container:
 
     config = Config()
     container.register(Config, instance=config, scope=Scope.singleton)
+    # One connection pool for every provider client
+    container.register(
+        httpx.AsyncClient, instance=build_http_client(config), scope=Scope.singleton,
+    )
 
     return container
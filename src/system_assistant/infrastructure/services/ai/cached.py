@@ -0,0 +1,223 @@
+from dataclasses import dataclass
+import hashlib
+import json
+import re
+import time
+from typing import AsyncIterator, Callable
+
+from loguru import logger
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from system_assistant.application.services.ai.base import AIAgent
+from system_assistant.core.cache import LRUCache
+from system_assistant.core.types import AIAnswer
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import ID
+from system_assistant.infrastructure.db.sqlite.tables import llm_response_table
+from system_assistant.infrastructure.services.ai.tools import is_read_only
+
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+@dataclass(eq=False, slots=True)
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    bypasses: int = 0
+    """Answers that were not cached: too high temperature or side-effecting tools"""
+    saved_seconds: float = 0.0
+    """Sum of the original latencies of the answers served from the cache"""
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass(eq=False, slots=True)
+class _CachedResponse:
+    content: str
+    latency: float
+    created_at: float
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE_RE.sub(' ', text).strip().lower()
+
+
+def _tool_name(tool: Callable) -> str:
+    name = getattr(tool, 'name', None) or getattr(tool, '__name__', None)
+    return name if isinstance(name, str) else repr(tool)
+
+
+class CachedAIAgent:
+    """
+    `AIAgent` that answers repeated questions from a cache instead of the provider.
+    An answer is keyed on the model, temperature, tools, the summary and every normalized
+    message, so the same question in the same directory and conversation is a hit.
+    Only turns with temperature up to `max_temperature` are eligible, and answers of turns
+    that called a tool which is not read-only are never stored.
+    Entries live in an LRU bounded by `max_entries` and expire after `ttl` seconds;
+    with `engine` they are also persisted to SQLite and survive restarts
+    """
+
+    def __init__(
+        self,
+        agent: AIAgent,
+        engine: AsyncEngine | None = None,
+        max_entries: int = 1000,
+        ttl: float = 7 * 24 * 60 * 60,
+        max_temperature: float = 0.0,
+    ):
+        self._agent = agent
+        self._engine = engine
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_temperature = max_temperature
+        self.stats = ResponseCacheStats()
+        self._cache: LRUCache[str, _CachedResponse] = LRUCache(max_entries)
+
+    @property
+    def model(self) -> str:
+        return self._agent.model
+
+    @property
+    def temperature(self) -> float:
+        return self._agent.temperature
+
+    @property
+    def tools(self) -> list[Callable]:
+        return self._agent.tools
+
+    def used_tools(self, chat_id: ID) -> list[str]:
+        return self._agent.used_tools(chat_id)
+
+    def update_settings(self, temperature: float | None = None, tools: list | None = None):
+        self._agent.update_settings(temperature=temperature, tools=tools)
+
+    async def chat(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AIAnswer:
+        content = ''.join([chunk async for chunk in self.stream(chat, temperature, tools)])
+        return AIAnswer(is_successful=True, chat_id=chat.id, content=content)
+
+    async def stream(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AsyncIterator[str]:
+        temperature = self.temperature if temperature is None else temperature
+        tools = self.tools if tools is None else tools
+        if temperature > self.max_temperature:
+            self.stats.bypasses += 1
+            async for chunk in self._agent.stream(chat, temperature, tools):
+                yield chunk
+            return
+
+        key = self.key(chat, temperature, tools)
+        if (cached := await self._get(key)) is not None:
+            self.stats.hits += 1
+            self.stats.saved_seconds += cached.latency
+            logger.info(
+                f'Answer served from cache: chat_id={chat.id}, saved={cached.latency:.2f}s, '
+                f'hit_rate={self.stats.hit_rate:.2f}'
+            )
+            yield cached.content
+            return
+
+        self.stats.misses += 1
+        started_at = time.perf_counter()
+        chunks = []
+        async for chunk in self._agent.stream(chat, temperature, tools):
+            chunks.append(chunk)
+            yield chunk
+        latency = time.perf_counter() - started_at
+
+        tools_by_name = {_tool_name(tool): tool for tool in tools}
+        side_effects = [
+            name for name in self._agent.used_tools(chat.id)
+            if name not in tools_by_name or not is_read_only(tools_by_name[name])
+        ]
+        if side_effects:
+            self.stats.bypasses += 1
+            logger.debug(f'Answer is not cached, tools with side effects: tools={side_effects}')
+            return
+        await self._put(key, _CachedResponse(''.join(chunks), latency, time.time()))
+
+    def key(self, chat: Chat, temperature: float, tools: list[Callable]) -> str:
+        """
+        Hash of everything the answer depends on. The system prompt holds the OS and
+        the working directory, the history gives follow-ups like "do it again" their meaning.
+        The agent is handed the fitted context window, so the hashed history is bounded
+        """
+        state = {
+            'model': self.model,
+            'temperature': temperature,
+            'tools': sorted(_tool_name(tool) for tool in tools),
+            'summary': _normalize(chat.summary or ''),
+        }
+        digest = hashlib.sha256(json.dumps(state).encode())
+        for message in chat.messages:
+            digest.update(json.dumps((str(message.sender), _normalize(message.content))).encode())
+        return digest.hexdigest()
+
+    async def _get(self, key: str) -> _CachedResponse | None:
+        cached = self._cache.get(key)
+        if cached is None and self._engine is not None:
+            async with self._engine.begin() as conn:
+                row = (await conn.execute(
+                    select(llm_response_table).where(llm_response_table.c.key == key)
+                )).first()
+                if row is not None:
+                    await conn.execute(
+                        update(llm_response_table)
+                        .where(llm_response_table.c.key == key)
+                        .values(used_at=time.time())
+                    )
+            if row is not None:
+                cached = _CachedResponse(row.content, row.latency, row.created_at)
+                self._cache.put(key, cached)
+        if cached is None or cached.created_at + self.ttl > time.time():
+            return cached
+        self._cache.pop(key)
+        return None
+
+    async def _put(self, key: str, response: _CachedResponse):
+        self._cache.put(key, response)
+        if self._engine is None:
+            return
+        now = time.time()
+        async with self._engine.begin() as conn:
+            insert = sqlite_insert(llm_response_table).values(
+                key=key,
+                content=response.content,
+                latency=response.latency,
+                created_at=response.created_at,
+                used_at=now,
+            )
+            await conn.execute(insert.on_conflict_do_update(
+                index_elements=[llm_response_table.c.key],
+                set_={
+                    column: insert.excluded[column]
+                    for column in ('content', 'latency', 'created_at', 'used_at')
+                },
+            ))
+            # Expired entries and the least recently used ones beyond `max_entries`
+            await conn.execute(delete(llm_response_table).where(
+                llm_response_table.c.created_at <= now - self.ttl,
+            ))
+            kept = (
+                select(llm_response_table.c.key)
+                .order_by(llm_response_table.c.used_at.desc())
+                .limit(self.max_entries)
+            )
+            await conn.execute(delete(llm_response_table).where(
+                llm_response_table.c.key.not_in(kept),
+            ))
@@ -0,0 +1,367 @@
+from collections import OrderedDict, defaultdict
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from langchain_core.runnables.config import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import TASKS, WRITES_IDX_MAP, MemorySaver
+from loguru import logger
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from system_assistant.infrastructure.db.sqlite.tables import (
+    agent_checkpoint_blob_table as blob_table,
+    agent_checkpoint_table as checkpoint_table,
+    agent_checkpoint_write_table as write_table,
+)
+
+
+type BlobKey = tuple[str, str, str, str | int | float]
+"""Thread id, checkpoint namespace, channel and version of a `MemorySaver` blob"""
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    `MemorySaver` that keeps only the latest `max_checkpoints` checkpoints of a thread
+    (and the channel values they reference), and at most `max_threads` threads:
+    the least recently used ones are evicted
+    """
+
+    def __init__(self, max_threads: int = 1000, max_checkpoints: int = 2):
+        super().__init__()
+        # The latest checkpoint's parent is read back for pending sends, keep it too
+        self.max_checkpoints = max(max_checkpoints, 2)
+        self.max_threads = max_threads
+        self._threads: OrderedDict[str, None] = OrderedDict()
+        self._thread_blobs: defaultdict[str, set[BlobKey]] = defaultdict(set)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config['configurable']['thread_id']
+        if thread_id not in self._threads:
+            return None
+        self._threads.move_to_end(thread_id)
+        return super().get_tuple(config)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable']['checkpoint_ns']
+        self._thread_blobs[thread_id].update(
+            (thread_id, checkpoint_ns, channel, version)
+            for channel, version in new_versions.items()
+        )
+        self._prune(thread_id, checkpoint_ns)
+        self._threads[thread_id] = None
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self.max_threads:
+            evicted, _ = self._threads.popitem(last=False)
+            self.delete_thread(evicted)
+            logger.debug(f'Evicted agent thread: thread_id={evicted}')
+        return result
+
+    def delete_thread(self, thread_id: str):
+        self._threads.pop(thread_id, None)
+        self.storage.pop(thread_id, None)
+        for writes_key in [key for key in self.writes if key[0] == thread_id]:
+            del self.writes[writes_key]
+        for blob_key in self._thread_blobs.pop(thread_id, set()):
+            self.blobs.pop(blob_key, None)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        checkpoints: dict[str, Any] = self.storage[thread_id][checkpoint_ns]
+        # Checkpoint ids grow monotonically and are inserted in order
+        stale = list(checkpoints)[:-self.max_checkpoints]
+        if not stale:
+            return
+        for checkpoint_id in stale:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+        referenced = {
+            (thread_id, checkpoint_ns, channel, version)
+            for saved_checkpoint, _, _ in checkpoints.values()
+            for channel, version in self.serde.loads_typed(saved_checkpoint)[
+                'channel_versions'
+            ].items()
+        }
+        thread_blobs = self._thread_blobs[thread_id]
+        for key in [key for key in thread_blobs if key[1] == checkpoint_ns]:
+            if key not in referenced:
+                thread_blobs.discard(key)
+                self.blobs.pop(key, None)
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[int]):
+    """
+    Durable agent threads in the application SQLite database, on the engine shared
+    with `SQLiteChatGateway`. A checkpoint writes only the channel values that changed
+    since the previous one, and like `BoundedMemorySaver` only the latest
+    `max_checkpoints` checkpoints of a thread are kept
+    """
+
+    def __init__(self, engine: AsyncEngine, max_checkpoints: int = 2):
+        super().__init__()
+        self.engine = engine
+        self.max_checkpoints = max(max_checkpoints, 2)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable'].get('checkpoint_ns', '')
+        query = select(checkpoint_table).where(
+            checkpoint_table.c.thread_id == thread_id,
+            checkpoint_table.c.checkpoint_ns == checkpoint_ns,
+        )
+        if checkpoint_id := get_checkpoint_id(config):
+            query = query.where(checkpoint_table.c.checkpoint_id == checkpoint_id)
+        else:
+            query = query.order_by(checkpoint_table.c.checkpoint_id.desc()).limit(1)
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(query)).first()
+            if row is None:
+                return None
+            return await self._load_tuple(conn, row)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        query = select(checkpoint_table).order_by(checkpoint_table.c.checkpoint_id.desc())
+        if config is not None:
+            query = query.where(
+                checkpoint_table.c.thread_id == config['configurable']['thread_id'],
+            )
+            if (checkpoint_ns := config['configurable'].get('checkpoint_ns')) is not None:
+                query = query.where(checkpoint_table.c.checkpoint_ns == checkpoint_ns)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            query = query.where(checkpoint_table.c.checkpoint_id < before_id)
+        async with self.engine.connect() as conn:
+            rows = (await conn.execute(query)).all()
+            for row in rows:
+                if limit is not None and limit <= 0:
+                    return
+                metadata = self.serde.loads_typed((row.metadata_type, row.metadata))
+                if filter and any(metadata.get(k) != v for k, v in filter.items()):
+                    continue
+                if limit is not None:
+                    limit -= 1
+                yield await self._load_tuple(conn, row)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable']['checkpoint_ns']
+        c = checkpoint.copy()
+        c.pop('pending_sends')  # type: ignore[misc]
+        values: dict[str, Any] = c.pop('channel_values')  # type: ignore[misc]
+        checkpoint_type, checkpoint_data = self.serde.dumps_typed(c)
+        metadata_type, metadata_data = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata),
+        )
+        blobs = []
+        for channel, version in new_versions.items():
+            value_type, value = (
+                self.serde.dumps_typed(values[channel]) if channel in values else ('empty', b'')
+            )
+            blobs.append({
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                'channel': channel,
+                'version': str(version),
+                'type': value_type,
+                'blob': value,
+            })
+        async with self.engine.begin() as conn:
+            if blobs:
+                await conn.execute(sqlite_insert(blob_table).on_conflict_do_nothing(), blobs)
+            await conn.execute(sqlite_insert(checkpoint_table).on_conflict_do_nothing(), [{
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                'checkpoint_id': checkpoint['id'],
+                'parent_checkpoint_id': config['configurable'].get('checkpoint_id'),
+                'type': checkpoint_type,
+                'checkpoint': checkpoint_data,
+                'metadata_type': metadata_type,
+                'metadata': metadata_data,
+            }])
+            await self._prune(conn, thread_id, checkpoint_ns)
+        return {
+            'configurable': {
+                'thread_id': thread_id,
+                'checkpoint_ns': checkpoint_ns,
+                'checkpoint_id': checkpoint['id'],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = '',
+    ) -> None:
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, blob = self.serde.dumps_typed(value)
+            rows.append({
+                'thread_id': config['configurable']['thread_id'],
+                'checkpoint_ns': config['configurable'].get('checkpoint_ns', ''),
+                'checkpoint_id': config['configurable']['checkpoint_id'],
+                'task_id': task_id,
+                'idx': WRITES_IDX_MAP.get(channel, idx),
+                'channel': channel,
+                'type': value_type,
+                'blob': blob,
+                'task_path': task_path,
+            })
+        if not rows:
+            return
+        insert = sqlite_insert(write_table)
+        # Special writes (errors, interrupts) replace the previous ones, like in `MemorySaver`
+        if all(row['idx'] < 0 for row in rows):
+            statement = insert.on_conflict_do_update(
+                index_elements=list(write_table.primary_key.columns),
+                set_={
+                    'channel': insert.excluded.channel,
+                    'type': insert.excluded.type,
+                    'blob': insert.excluded.blob,
+                },
+            )
+        else:
+            statement = insert.on_conflict_do_nothing()
+        async with self.engine.begin() as conn:
+            await conn.execute(statement, rows)
+
+    async def _load_tuple(self, conn, row) -> CheckpointTuple:
+        checkpoint: Checkpoint = self.serde.loads_typed((row.type, row.checkpoint))
+        key = (row.thread_id, row.checkpoint_ns)
+        versions = [
+            (channel, str(version)) for channel, version in checkpoint['channel_versions'].items()
+        ]
+        channel_values = {}
+        if versions:
+            blob_rows = await conn.execute(
+                select(blob_table.c.channel, blob_table.c.type, blob_table.c.blob).where(
+                    blob_table.c.thread_id == row.thread_id,
+                    blob_table.c.checkpoint_ns == row.checkpoint_ns,
+                    tuple_(blob_table.c.channel, blob_table.c.version).in_(versions),
+                )
+            )
+            channel_values = {
+                blob.channel: self.serde.loads_typed((blob.type, blob.blob))
+                for blob in blob_rows
+                if blob.type != 'empty'
+            }
+        write_rows = (await conn.execute(
+            select(write_table)
+            .where(
+                write_table.c.thread_id == row.thread_id,
+                write_table.c.checkpoint_ns == row.checkpoint_ns,
+                write_table.c.checkpoint_id.in_(
+                    [row.checkpoint_id, row.parent_checkpoint_id or row.checkpoint_id],
+                ),
+            )
+            .order_by(write_table.c.task_path, write_table.c.task_id, write_table.c.idx)
+        )).all()
+        pending_sends = [
+            self.serde.loads_typed((w.type, w.blob))
+            for w in write_rows
+            if w.checkpoint_id == row.parent_checkpoint_id and w.channel == TASKS
+        ]
+        pending_writes = [
+            (w.task_id, w.channel, self.serde.loads_typed((w.type, w.blob)))
+            for w in write_rows
+            if w.checkpoint_id == row.checkpoint_id
+        ]
+        config: RunnableConfig = {
+            'configurable': {
+                'thread_id': key[0],
+                'checkpoint_ns': key[1],
+                'checkpoint_id': row.checkpoint_id,
+            }
+        }
+        return CheckpointTuple(
+            config=config,
+            checkpoint={
+                **checkpoint,
+                'channel_values': channel_values,
+                'pending_sends': pending_sends,
+            },
+            metadata=self.serde.loads_typed((row.metadata_type, row.metadata)),
+            pending_writes=pending_writes,
+            parent_config=(
+                {
+                    'configurable': {
+                        'thread_id': key[0],
+                        'checkpoint_ns': key[1],
+                        'checkpoint_id': row.parent_checkpoint_id,
+                    }
+                }
+                if row.parent_checkpoint_id
+                else None
+            ),
+        )
+
+    async def _prune(self, conn, thread_id: str, checkpoint_ns: str):
+        in_thread = (
+            checkpoint_table.c.thread_id == thread_id,
+            checkpoint_table.c.checkpoint_ns == checkpoint_ns,
+        )
+        stale_ids = (await conn.execute(
+            select(checkpoint_table.c.checkpoint_id)
+            .where(*in_thread)
+            .order_by(checkpoint_table.c.checkpoint_id.desc())
+            .offset(self.max_checkpoints)
+        )).scalars().all()
+        if not stale_ids:
+            return
+        await conn.execute(
+            delete(checkpoint_table).where(
+                *in_thread, checkpoint_table.c.checkpoint_id.in_(stale_ids),
+            )
+        )
+        await conn.execute(
+            delete(write_table).where(
+                write_table.c.thread_id == thread_id,
+                write_table.c.checkpoint_ns == checkpoint_ns,
+                write_table.c.checkpoint_id.in_(stale_ids),
+            )
+        )
+        retained = (await conn.execute(
+            select(checkpoint_table.c.type, checkpoint_table.c.checkpoint).where(*in_thread)
+        )).all()
+        referenced = {
+            (channel, str(version))
+            for retained_row in retained
+            for channel, version in self.serde.loads_typed(
+                (retained_row.type, retained_row.checkpoint),
+            )['channel_versions'].items()
+        }
+        await conn.execute(
+            delete(blob_table).where(
+                blob_table.c.thread_id == thread_id,
+                blob_table.c.checkpoint_ns == checkpoint_ns,
+                tuple_(blob_table.c.channel, blob_table.c.version).not_in(referenced),
+            )
+        )
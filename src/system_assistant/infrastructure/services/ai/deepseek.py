@@ -1,3 +1,5 @@
+import httpx
+from langchain.tools import BaseTool
 from langchain_openai.chat_models import ChatOpenAI
 from langgraph.graph.graph import CompiledGraph
 from langgraph.prebuilt import create_react_agent
@@ -20,8 +22,13 @@ DEEPSEEK_BASE_URL = 'https://api.deepseek.com'
 
 
 class DeepSeek(LLM):
-    def __init__(self, api_key: str) -> None:
-        self.client = AsyncOpenAI(api_key=api_key, base_url=DEEPSEEK_BASE_URL)
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = DEEPSEEK_BASE_URL,
+        http_client: httpx.AsyncClient | None = None,
+    ) -> None:
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
 
     async def make_request(self, text: str) -> str:
         logger.info(f'Request to DeepSeek: input_messages_length={len(text)}')
@@ -40,17 +47,20 @@ class DeepSeek(LLM):
 
 
 class DeepSeekOpenAIAgent(BaseReactOpenAIAgent):
-    def build_agent(self) -> ChatOpenAI | CompiledGraph:
+    model = DEEPSEEK_CHAT_MODEL
+
+    def build_agent(self, temperature: float, tools: list[BaseTool]) -> ChatOpenAI | CompiledGraph:
         _llm = ChatOpenAI(
             model=DEEPSEEK_CHAT_MODEL,
-            base_url=DEEPSEEK_BASE_URL,
+            base_url=self._config.deepseek_base_url,
             api_key=SecretStr(self._config.deepseek_api_key),
-            temperature=self.temperature
+            temperature=temperature,
+            http_async_client=self._http_client,
         )
-        if self.tools:
-            _llm = _llm.bind_tools(self.tools)  # type: ignore
+        if tools:
+            _llm = _llm.bind_tools(tools)  # type: ignore
             agent_executor = create_react_agent(
-                _llm, tools=self.tools, checkpointer=self._memory_saver,
+                _llm, tools=self._tool_executor.node(tools), checkpointer=self._memory_saver,
             )
             return agent_executor
         return _llm
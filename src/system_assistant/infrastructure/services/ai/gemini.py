@@ -1,3 +1,5 @@
+import httpx
+from langchain.tools import BaseTool
 from langchain_openai.chat_models import ChatOpenAI
 from langgraph.graph.graph import CompiledGraph
 from loguru import logger
@@ -19,8 +21,13 @@ GEMINI_API_BASE_URL = 'https://generativelanguage.googleapis.com/v1beta/openai/'
 
 
 class Gemini(LLM):
-    def __init__(self, api_key: str) -> None:
-        self.client = AsyncOpenAI(api_key=api_key, base_url=GEMINI_API_BASE_URL)
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = GEMINI_API_BASE_URL,
+        http_client: httpx.AsyncClient | None = None,
+    ) -> None:
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
 
     async def make_request(self, text: str) -> str:
         logger.info(f'Request to Gemini: input_messages_length={len(text)}')
@@ -31,7 +38,7 @@ class Gemini(LLM):
                 ),
                 ChatCompletionUserMessageParam(role='user', content=text),
             ],
-            model=GEMINI_API_BASE_URL,
+            model=GEMINI_MODEL,
             stream=False,
         )
         logger.info(f'Response from Gemini: response_id={response.id}')
@@ -39,16 +46,19 @@ class Gemini(LLM):
 
 
 class GeminiOpenAIAgent(BaseReactOpenAIAgent):
-    def build_agent(self) -> CompiledGraph:
+    model = GEMINI_MODEL
+
+    def build_agent(self, temperature: float, tools: list[BaseTool]) -> CompiledGraph:
         _llm = ChatOpenAI(
             model=GEMINI_MODEL,
-            base_url=GEMINI_API_BASE_URL,
+            base_url=self._config.gemini_base_url,
             api_key=SecretStr(self._config.gemini_api_key),
-            temperature=self.temperature,
+            temperature=temperature,
+            http_async_client=self._http_client,
         )
-        _llm = _llm.bind_tools(self.tools)  # type: ignore
+        _llm = _llm.bind_tools(tools)  # type: ignore
 
         agent_executor = create_react_agent(
-            model=_llm, tools=self.tools, checkpointer=self._memory_saver,
+            model=_llm, tools=self._tool_executor.node(tools), checkpointer=self._memory_saver,
         )
         return agent_executor
@@ -0,0 +1,265 @@
+import asyncio
+from bisect import bisect_left
+from dataclasses import dataclass, field
+import math
+import time
+from typing import AsyncIterator, Callable
+
+from loguru import logger
+
+from system_assistant.application.services.ai.base import AIAgent
+from system_assistant.core.cache import LRUCache
+from system_assistant.core.types import AIAnswer
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import ID
+from system_assistant.infrastructure.services.ai.tools import is_read_only
+
+
+class LatencyHistogram:
+    """
+    Latencies counted in exponentially growing buckets, so percentiles take constant memory.
+    Once `max_count` latencies are counted all counts are halved: recent latencies weigh more
+    """
+
+    def __init__(
+        self,
+        min_latency: float = 0.01,
+        max_latency: float = 300.0,
+        growth: float = 1.2,
+        max_count: int = 1000,
+    ):
+        size = math.ceil(math.log(max_latency / min_latency, growth)) + 1
+        self.bounds = [min_latency * growth ** i for i in range(size)]
+        """Upper bounds of the buckets"""
+        self.counts = [0.0] * (size + 1)
+        self.max_count = max_count
+        self.count = 0.0
+
+    def observe(self, latency: float):
+        self.counts[bisect_left(self.bounds, latency)] += 1
+        self.count += 1
+        if self.count >= self.max_count:
+            self.counts = [count / 2 for count in self.counts]
+            self.count /= 2
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` percentile, 0 < q <= 1"""
+        if not self.count:
+            return math.inf
+        seen = 0.0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return self.bounds[i] if i < len(self.bounds) else math.inf
+        return math.inf
+
+
+class CircuitBreaker:
+    """
+    Closed while the provider works. Opens after `failure_threshold` consecutive failures
+    and lets requests through again after `reset_timeout` seconds (half-open):
+    the first success closes the breaker, a failure opens it again at once
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        return self.state != 'open'
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+@dataclass(eq=False, slots=True)
+class Provider:
+    agent: AIAgent
+    breaker: CircuitBreaker
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    """Time to the first chunk of answers"""
+
+    @property
+    def name(self) -> str:
+        return self.agent.model
+
+
+@dataclass(eq=False, slots=True)
+class HedgeStats:
+    requests: int = 0
+    hedges: int = 0
+    """Requests sent to another provider because the first one was slow"""
+    hedge_wins: int = 0
+    """Hedged requests answered by the provider asked later"""
+    failovers: int = 0
+    """Requests sent to another provider because the first one failed"""
+
+
+async def _first_chunk(chunks: AsyncIterator[str]) -> str | None:
+    return await anext(chunks, None)
+
+
+class HedgedAIAgent:
+    """
+    `AIAgent` over several providers, in the order of preference. When the provider
+    doesn't send the first chunk within its `hedge_percentile` latency, the next one is
+    asked too, the first to answer wins and the other request is cancelled.
+    Requests with a tool that is not read-only bound are not hedged, both providers could
+    call it. A provider that fails before answering is replaced by the next one right away,
+    and providers whose circuit breaker is open are skipped.
+    Until a provider has `min_samples` measured answers `default_delay` is used
+    """
+
+    def __init__(
+        self,
+        agents: list[AIAgent],
+        hedge_percentile: float = 0.95,
+        default_delay: float = 3.0,
+        min_samples: int = 5,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+    ):
+        if not agents:
+            raise ValueError('At least one agent is required')
+        self.providers = [
+            Provider(agent, CircuitBreaker(failure_threshold, reset_timeout)) for agent in agents
+        ]
+        self.hedge_percentile = hedge_percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.stats = HedgeStats()
+        self._winners: LRUCache[ID, AIAgent] = LRUCache(1000)
+
+    @property
+    def model(self) -> str:
+        return ','.join(provider.name for provider in self.providers)
+
+    @property
+    def temperature(self) -> float:
+        return self.providers[0].agent.temperature
+
+    @property
+    def tools(self) -> list[Callable]:
+        return self.providers[0].agent.tools
+
+    def update_settings(self, temperature: float | None = None, tools: list | None = None):
+        for provider in self.providers:
+            provider.agent.update_settings(temperature=temperature, tools=tools)
+
+    def used_tools(self, chat_id: ID) -> list[str]:
+        winner = self._winners.peek(chat_id)
+        return [] if winner is None else winner.used_tools(chat_id)
+
+    def hedge_delay(self, provider: Provider) -> float:
+        if provider.latency.count < self.min_samples:
+            return self.default_delay
+        return provider.latency.percentile(self.hedge_percentile)
+
+    async def chat(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AIAnswer:
+        content = ''.join([chunk async for chunk in self.stream(chat, temperature, tools)])
+        return AIAnswer(is_successful=True, chat_id=chat.id, content=content)
+
+    async def stream(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Providers race for the first chunk only: once text is shown to the user the
+        answer can't switch providers, so a failure after it is raised
+        """
+        self.stats.requests += 1
+        # Answers race for the first text chunk, by then both providers may have run tools
+        can_hedge = all(is_read_only(tool) for tool in (self.tools if tools is None else tools))
+        # With every breaker open the providers are still tried, failing fast is no better
+        waiting = [p for p in self.providers if p.breaker.allow()] or list(self.providers)
+        asked: list[Provider] = []
+        racing: dict[asyncio.Task[str | None], tuple[Provider, AsyncIterator[str], float]] = {}
+        error: Exception | None = None
+
+        def ask_next():
+            provider = waiting.pop(0)
+            chunks = provider.agent.stream(chat, temperature, tools)
+            racing[asyncio.create_task(_first_chunk(chunks))] = (
+                provider, chunks, time.perf_counter(),
+            )
+            asked.append(provider)
+
+        ask_next()
+        winner, hedged = None, False
+        try:
+            while winner is None:
+                timeout = self.hedge_delay(asked[-1]) if waiting and can_hedge else None
+                done, _ = await asyncio.wait(
+                    racing, timeout=timeout, return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    logger.debug(f'Hedging request: slow={asked[-1].name}, next={waiting[0].name}')
+                    self.stats.hedges += 1
+                    hedged = True
+                    ask_next()
+                    continue
+                for task in done:
+                    provider, chunks, started_at = racing.pop(task)
+                    try:
+                        first = task.result()
+                    except Exception as e:
+                        logger.warning(f'Provider failed: provider={provider.name}, error={e!r}')
+                        provider.breaker.record_failure()
+                        error = e
+                        await chunks.aclose()  # type: ignore
+                        continue
+                    provider.latency.observe(time.perf_counter() - started_at)
+                    winner = (provider, chunks, first)
+                    break
+                if winner is None and not racing:
+                    if not waiting:
+                        raise error or RuntimeError('No provider answered')
+                    self.stats.failovers += 1
+                    ask_next()
+        finally:
+            # The losers, or everyone on error: cancelling the task cancels the request
+            for task in racing:
+                task.cancel()
+            if racing:
+                await asyncio.wait(racing)
+            for _, chunks, _ in racing.values():
+                await chunks.aclose()  # type: ignore
+
+        provider, chunks, first = winner
+        if hedged and provider is not asked[0]:
+            self.stats.hedge_wins += 1
+        self._winners.put(chat.id, provider.agent)
+        try:
+            if first is not None:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception:
+            provider.breaker.record_failure()
+            raise
+        finally:
+            await chunks.aclose()  # type: ignore
+        provider.breaker.record_success()
@@ -1,58 +1,280 @@
 from abc import abstractmethod
-from typing import Any
+from contextlib import aclosing
+from typing import Any, AsyncGenerator, AsyncIterator, cast
 
+import httpx
 from langchain.tools import BaseTool
 
-from langchain_core.messages import BaseMessage
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessage, RemoveMessage, ToolMessage
 from langchain_core.runnables.config import RunnableConfig
 from langchain_openai.chat_models import ChatOpenAI
-from langgraph.checkpoint.base import BaseCheckpointSaver
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointMetadata
 from langgraph.graph.graph import CompiledGraph
+from langgraph.graph.message import REMOVE_ALL_MESSAGES
+from loguru import logger
 
+from system_assistant.core.cache import LRUCache
 from system_assistant.core.config import Config
 from system_assistant.core.types import AIAnswer
 from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import ID, Message
+from system_assistant.infrastructure.services.ai.checkpoint import BoundedMemorySaver
+from system_assistant.infrastructure.services.ai.tools.executor import ToolExecutor
 from system_assistant.infrastructure.services.ai.utils import to_langchain_message
 
 
+type AgentKey = tuple[str, float, frozenset[str]]
+"""Model, temperature and names of the tools"""
+
+
+_SUMMARY_ID = 'summary'
+"""Id of the summary message a fitted chat is sent with"""
+
+
+def _message_id(seq: int) -> str:
+    """Id of a chat message in the agent thread"""
+    return f'message-{seq}'
+
+
+def _metadata_seq(metadata: CheckpointMetadata, key: str) -> int | None:
+    """A `seq` saved with the checkpoint, see `stream`"""
+    value = metadata.get(key)
+    return value if isinstance(value, int) else None
+
+
+def _window_seq(chat: Chat) -> int | None:
+    """`seq` of the oldest history message of the chat, the start of its context window"""
+    return next((m.seq for m in chat.messages[1:] if m.seq is not None), None)
+
+
+def _trim(
+    thread: list[BaseMessage], start: int | None, new_start: int | None,
+) -> list[RemoveMessage] | None:
+    """
+    Removals that cut the agent thread holding the context window from `start` on
+    to the window from `new_start` on, `None` if the thread doesn't hold `new_start`
+    """
+    if new_start == start:
+        return []
+    if new_start is None or (start is not None and new_start < start):
+        return None
+    ids = [message.id for message in thread]
+    # The window starts with a message sent to the agent or with the answer to the one before
+    if _message_id(new_start) in ids:
+        cut = ids.index(_message_id(new_start))
+    elif _message_id(new_start - 1) in ids:
+        cut = ids.index(_message_id(new_start - 1)) + 1
+    else:
+        return None
+    # The system prompt and the summary stay, they come before the history
+    return [
+        RemoveMessage(id=message_id)
+        for message_id in ids[:cut]
+        if message_id is not None and message_id not in (_message_id(0), _SUMMARY_ID)
+    ]
+
+
 class BaseReactOpenAIAgent:
+    model: str
+
     def __init__(
         self,
         config: Config,
         tools: list[BaseTool],
-        memory_saver: BaseCheckpointSaver = MemorySaver(),
+        memory_saver: BaseCheckpointSaver | None = None,
         temperature: float = 1.0,
         extra_input: dict[str, Any] | None = None,
+        thread_namespace: str = '',
+        http_client: httpx.AsyncClient | None = None,
+        tool_executor: ToolExecutor | None = None,
     ):
-        self._memory_saver = memory_saver
+        """
+        `thread_namespace` separates threads of agents that share `memory_saver`.
+        With `http_client` every built agent shares its connection pool,
+        with `tool_executor` agents share the threads running their tools
+        """
+        self._memory_saver = memory_saver or BoundedMemorySaver(
+            max_threads=config.agent_max_threads, max_checkpoints=config.agent_max_checkpoints,
+        )
         self._config = config
+        self._thread_namespace = thread_namespace
+        self._http_client = http_client
+        self._tool_executor = tool_executor or ToolExecutor(
+            max_workers=config.tool_max_workers, timeout=config.tool_timeout,
+        )
         self.tools = tools
         self.temperature = temperature
+        # Converted messages of persisted chat messages, by chat and `seq`
+        self._converted: LRUCache[ID, dict[int, BaseMessage]] = LRUCache(
+            config.agent_max_threads,
+        )
+        self._used_tools: LRUCache[ID, list[str]] = LRUCache(config.agent_max_threads)
+        # Built clients and compiled graphs by settings, switching back to settings used
+        # before neither recompiles the graph nor drops the client's connection pool
+        self._agents: LRUCache[AgentKey, ChatOpenAI | CompiledGraph] = LRUCache(
+            max(config.agent_cache_max_entries, 1),
+        )
 
-        self._agent = self.build_agent()
+        self._agent = self._get_agent(temperature, tools)
         self._extra_input: dict[str, Any] = extra_input or {}
 
     @abstractmethod
-    def build_agent(self) -> ChatOpenAI | CompiledGraph:
+    def build_agent(self, temperature: float, tools: list[BaseTool]) -> ChatOpenAI | CompiledGraph:
         raise NotImplementedError
 
-    async def chat(self, chat: Chat) -> AIAnswer:
-        converted_messsages = [to_langchain_message(msg) for msg in chat.messages]
-        ai_answer = AIAnswer(is_successful=True, chat_id=chat.id, content='')
-        async for messages in self._agent.astream(
-            input={'messages': converted_messsages, **self._extra_input},  # type: ignore
-            config=RunnableConfig(configurable={'thread_id': chat.id}),
-            stream_mode='values',
-        ):
-            last_message: BaseMessage = messages['messages'][-1]  # type: ignore
-            if last_message.type in ['ai', 'system', 'assistant']:
-                ai_answer['content'] = last_message.content  # type: ignore
-        return ai_answer
+    def _get_agent(self, temperature: float, tools: list[BaseTool]) -> ChatOpenAI | CompiledGraph:
+        key = (self.model, temperature, frozenset(tool.name for tool in tools))
+        agent = self._agents.get(key)
+        if agent is None:
+            logger.debug(f'Building agent: model={self.model}, temperature={temperature}')
+            agent = self.build_agent(temperature, tools)
+            self._agents.put(key, agent)
+        return agent
+
+    async def chat(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AIAnswer:
+        content = ''.join([chunk async for chunk in self.stream(chat, temperature, tools)])
+        return AIAnswer(is_successful=True, chat_id=chat.id, content=content)
+
+    async def stream(
+        self,
+        chat: Chat,
+        temperature: float | None = None,
+        tools: list | None = None,
+    ) -> AsyncIterator[str]:
+        """
+        Tokens of every AI message as the provider sends them. Text the model writes
+        before calling tools is part of the answer, separated by an empty line.
+        `temperature` and `tools` override the settings for this answer only
+        """
+        agent = self._agent
+        if temperature is not None or tools is not None:
+            agent = self._get_agent(
+                self.temperature if temperature is None else temperature,
+                self.tools if tools is None else tools,
+            )
+        thread_id = f'{self._thread_namespace}:{chat.id}' if self._thread_namespace else chat.id
+        config = RunnableConfig(configurable={'thread_id': thread_id})
+        used_tools: list[str] = []
+        self._used_tools.put(chat.id, used_tools)
+        # Both `astream` are async generators, typed as iterators: `aclosing` needs `aclose`
+        stream: AsyncGenerator[Any, None]
+        if isinstance(agent, BaseChatModel):
+            stream = cast(
+                AsyncGenerator[Any, None],
+                agent.astream(self._convert(chat, chat.messages), config=config),
+            )
+        else:
+            messages, removals = await self._new_messages(agent, chat, config)
+            # Saved with every checkpoint: `seq` the answer will get once the chat is saved,
+            # and the context window the thread holds
+            config['metadata'] = {
+                'chat_seq': chat.next_seq() + len(chat.unsaved_messages()),
+                'window_seq': _window_seq(chat),
+                'summary_seq': chat.summary_seq,
+            }
+            converted_messsages = [*removals, *self._convert(chat, messages)]
+            stream = cast(AsyncGenerator[Any, None], agent.astream(
+                input={'messages': converted_messsages, **self._extra_input},  # type: ignore
+                config=config,
+                stream_mode='messages',
+            ))
+        message_id, has_text = None, False
+        # Closed right away when the answer is abandoned, e.g. a cancelled hedge
+        async with aclosing(stream):
+            async for chunk in stream:
+                if isinstance(chunk, tuple):  # graph messages come with their metadata
+                    chunk = chunk[0]
+                if isinstance(chunk, ToolMessage) and chunk.name:
+                    used_tools.append(chunk.name)
+                if not isinstance(chunk, AIMessageChunk) or not (text := chunk.text()):
+                    continue
+                if chunk.id != message_id and has_text:
+                    yield '\n\n'
+                message_id, has_text = chunk.id, True
+                yield text
+
+    async def _new_messages(
+        self,
+        agent: CompiledGraph,
+        chat: Chat,
+        config: RunnableConfig,
+    ) -> tuple[list[Message], list[RemoveMessage]]:
+        """
+        Messages the agent thread doesn't hold yet, `add_messages` would append the rest again,
+        and the removals that go before them.
+        Answers that didn't go through the agent (e.g. cached ones) were saved after the
+        thread's last `chat_seq`, so they are sent along with the unsaved messages.
+        Messages that left the context window are removed from the thread. The thread is
+        replaced with the whole chat when it can't be extended: its last run didn't finish
+        (e.g. it was cancelled) and may end with unanswered tool calls, the chat got a new
+        summary, or its window moved past what the thread holds.
+        The thread never holds more than the window the model is given
+        """
+        reset = [RemoveMessage(id=REMOVE_ALL_MESSAGES)]
+        state = await agent.aget_state(config)
+        if state.metadata is None:
+            return chat.messages, []
+        if state.next:
+            logger.debug(f'Replacing interrupted agent thread: chat_id={chat.id}')
+            return chat.messages, reset
+        if state.metadata.get('summary_seq') != chat.summary_seq:
+            logger.debug(f'Replacing agent thread, the chat got a new summary: chat_id={chat.id}')
+            return chat.messages, reset
+        removals = _trim(
+            state.values.get('messages', []),
+            _metadata_seq(state.metadata, 'window_seq'),
+            _window_seq(chat),
+        )
+        if removals is None:
+            logger.debug(f'Replacing agent thread, its context window moved: chat_id={chat.id}')
+            return chat.messages, reset
+        thread_seq = _metadata_seq(state.metadata, 'chat_seq')
+        if thread_seq is None:
+            thread_seq = chat.next_seq() - 1
+        missed = [m for m in chat.messages if m.seq is not None and m.seq > thread_seq]
+        return [*missed, *chat.unsaved_messages()] or chat.messages[-1:], removals
+
+    def used_tools(self, chat_id: ID) -> list[str]:
+        """Names of the tools called while answering in the chat last time"""
+        return list(self._used_tools.peek(chat_id) or [])
+
+    def _convert(self, chat: Chat, messages: list[Message]) -> list[BaseMessage]:
+        """
+        Persisted messages are converted once; the cache keeps only the ones sent last time.
+        Messages are identified by `seq` in the agent thread, unsaved ones by the `seq` they
+        are saved with, so the thread can be cut to a context window
+        """
+        cached = self._converted.get(chat.id) or {}
+        converted: dict[int, BaseMessage] = {}
+        unsaved = {
+            id(message): seq
+            for seq, message in enumerate(chat.unsaved_messages(), start=chat.next_seq())
+        }
+        result = []
+        for message in messages:
+            if message.seq is None:
+                # Neither saved nor unsaved: the summary a chat is fitted with
+                seq = unsaved.get(id(message))
+                message_id = _SUMMARY_ID if seq is None else _message_id(seq)
+                result.append(to_langchain_message(message, message_id))
+                continue
+            langchain_message = cached.get(message.seq) or to_langchain_message(
+                message, _message_id(message.seq),
+            )
+            converted[message.seq] = langchain_message
+            result.append(langchain_message)
+        self._converted.put(chat.id, converted)
+        return result
 
     def update_settings(self, temperature: float | None = None, tools: list | None = None):
         if tools is not None:
             self.tools = tools
         if temperature is not None:
             self.temperature = temperature
-        self._agent = self.build_agent()
+        self._agent = self._get_agent(self.temperature, self.tools)
@@ -0,0 +1,34 @@
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from langchain_core.tools import BaseTool
+
+
+tool_output: ContextVar[Callable[[str], None] | None] = ContextVar('tool_output', default=None)
+"""Receives the output lines of the tool call running in the context, see `ToolExecutor`"""
+
+
+def read_only[T: BaseTool](tool: T) -> T:
+    """Mark the tool as free of side effects, so results of turns that used it can be reused"""
+    tool.metadata = {**(tool.metadata or {}), 'read_only': True}
+    return tool
+
+
+def is_read_only(tool: Any) -> bool:
+    return bool((getattr(tool, 'metadata', None) or {}).get('read_only', False))
+
+
+def with_timeout[T: BaseTool](tool: T, seconds: float) -> T:
+    """Let the tool run longer (or shorter) than the executor's default timeout"""
+    tool.metadata = {**(tool.metadata or {}), 'timeout': seconds}
+    return tool
+
+
+def get_timeout(tool: Any) -> float | None:
+    return (getattr(tool, 'metadata', None) or {}).get('timeout')
+
+
+def report_output(line: str):
+    """Show a line of the running tool's output (e.g. a build log) before the tool returns"""
+    if (handler := tool_output.get()) is not None:
+        handler(line)
@@ -1,14 +1,21 @@
+import asyncio
 import subprocess
 from typing import Any
 
 import docker  # type: ignore[import-untyped]
 import docker.errors  # type: ignore[import-untyped]
-from docker.models.containers import Container  # type: ignore[import-untyped]
 from langchain.tools import tool
+from langchain_core.tools import StructuredTool
 from loguru import logger
 
+from . import read_only, report_output, with_timeout
+from .docker_state import DockerState, container_from_attrs, image_from_attrs
+from .docker_stream import BuildStream, run_streaming
+
 
 client = docker.from_env()
+state = DockerState(client)
+"""Containers and images as the tools see them, started on the first query"""
 
 
 def list_docker_containers() -> list[dict[str, Any]] | None:
@@ -16,12 +23,24 @@ def list_docker_containers() -> list[dict[str, Any]] | None:
     List all running docker containers
     """
 
-    containers: list[Container] = client.containers.list()
-    result = [{'name': c.name, 'id': c.id} for c in containers]
+    result = [{'name': c['name'], 'id': c['id']} for c in state.containers()]
     logger.debug(f'List docker containers: {result}')
     return result or None
 
 
+def inspect_docker_container(container_id: str) -> dict[str, Any] | None:
+    """
+    Get the image, state and health of a docker container
+
+    Args:
+        container_id: ID or name of the container (e.g. 793fbb41814b)
+    """
+
+    result = state.container(container_id)
+    logger.debug(f'Inspect docker container: {result}')
+    return result
+
+
 def build_docker_image(
     tag: str,
     path: str,
@@ -40,6 +59,26 @@ def build_docker_image(
             We have kept the old default of False for compatibility.
     """
     image, _ = client.images.build(path=path, tag=tag, rm=rm, dockerfile=dockerfile)
+    state.record_image(image_from_attrs(image.attrs))
+    result = {
+        'image': {'id': image.id, 'tag': image.tags},
+    }
+    logger.debug(f'Built docker image: {result}')
+    return result
+
+
+async def abuild_docker_image(
+    tag: str,
+    path: str,
+    dockerfile: str = 'Dockerfile',
+    rm: bool = False,
+) -> dict[str, Any]:
+    """`build_docker_image` streaming the build log, cancelling the build when cancelled"""
+    build = BuildStream(client.api.api_version)
+    async for line in build.lines(path=path, tag=tag, rm=rm, dockerfile=dockerfile):
+        report_output(line)
+    image = await asyncio.to_thread(client.images.get, build.image_id)
+    state.record_image(image_from_attrs(image.attrs))
     result = {
         'image': {'id': image.id, 'tag': image.tags},
     }
@@ -67,6 +106,7 @@ def run_docker_container(
         detach=True,
         name=name,
     )
+    state.record_container(container_from_attrs(container.attrs))
     result = {
         'container': {
             'name': container.name,
@@ -114,6 +154,7 @@ def run_docker_compose(path: str, services: list[str] | None = None, build: bool
     try:
         info = subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
         logger.debug(f'Run docker compose result: {info.stdout}')
+        state.resync()
     except subprocess.CalledProcessError as e:
         logger.error(f'Error occured while running docker containers: {e}')
         result['success'] = False
@@ -121,6 +162,17 @@ def run_docker_compose(path: str, services: list[str] | None = None, build: bool
     return result
 
 
+async def arun_docker_compose(
+    path: str, services: list[str] | None = None, build: bool = False,
+) -> dict[str, Any]:
+    """`run_docker_compose` streaming the compose output, stopping compose when cancelled"""
+    args = ['docker', 'compose', '-f', path, 'up', *(services or [])]
+    if build:
+        args.append('--build')
+    args.append('-d')
+    return await _compose(args, 'Containers now running!')
+
+
 def stop_docker_compose(path: str):
     """
     Stop containers defined in docker compose file located at the end of `path`.
@@ -134,6 +186,7 @@ def stop_docker_compose(path: str):
     try:
         info = subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
         logger.debug(f'Stop docker compose result: {info.stdout}')
+        state.resync()
     except subprocess.CalledProcessError as e:
         logger.error(f'Error occured while stopping docker containers: {e}')
         result['msg'] = str(e)
@@ -141,13 +194,34 @@ def stop_docker_compose(path: str):
     return result
 
 
+async def astop_docker_compose(path: str) -> dict[str, Any]:
+    """`stop_docker_compose` streaming the compose output, stopping compose when cancelled"""
+    return await _compose(['docker', 'compose', '-f', path, 'down'], 'Containers stopped!')
+
+
+async def _compose(args: list[str], msg: str) -> dict[str, Any]:
+    logger.debug(f'Docker compose command: {args}')
+    info = await run_streaming(*args, on_line=report_output)
+    if info.returncode != 0:
+        error = '\n'.join(info.output)
+        logger.error(f'Docker compose failed: returncode={info.returncode}, output={error}')
+        return {'success': False, 'msg': error}
+    state.resync()
+    return {'success': True, 'msg': msg}
+
+
+def _async_tool(func, coroutine) -> StructuredTool:
+    """Tool described by `func` that the agent runs as `coroutine`"""
+    return StructuredTool.from_function(func, coroutine=coroutine, parse_docstring=True)
+
+
+# The agent runs builds and compose on the loop, the synchronous versions stay for direct calls
 DOCKER_TOOLS = [
-    tool(f, parse_docstring=True) for f in (
-        list_docker_containers,
-        build_docker_image,
-        run_docker_container,
-        stop_docker_container,
-        run_docker_compose,
-        stop_docker_compose,
-    )
+    read_only(tool(list_docker_containers, parse_docstring=True)),
+    read_only(tool(inspect_docker_container, parse_docstring=True)),
+    with_timeout(_async_tool(build_docker_image, abuild_docker_image), 900),
+    tool(run_docker_container, parse_docstring=True),
+    tool(stop_docker_container, parse_docstring=True),
+    with_timeout(_async_tool(run_docker_compose, arun_docker_compose), 900),
+    _async_tool(stop_docker_compose, astop_docker_compose),
 ]
@@ -0,0 +1,196 @@
+import threading
+from typing import Any
+
+import docker  # type: ignore[import-untyped]
+import docker.errors  # type: ignore[import-untyped]
+from loguru import logger
+
+
+type ContainerState = dict[str, Any]
+type ImageState = dict[str, Any]
+
+
+def _health(status: str) -> str | None:
+    # `docker ps` status, e.g. "Up 5 minutes (healthy)"
+    if status.endswith(')') and '(' in status:
+        return status[status.rindex('(') + 1:-1].removeprefix('health: ')
+    return None
+
+
+def container_from_summary(summary: dict[str, Any]) -> ContainerState:
+    """State of a container as listed by `APIClient.containers`"""
+    return {
+        'id': summary['Id'],
+        'name': (summary.get('Names') or ['/'])[0].lstrip('/'),
+        'image': summary.get('Image'),
+        'state': summary.get('State'),
+        'health': _health(summary.get('Status') or ''),
+    }
+
+
+def container_from_attrs(attrs: dict[str, Any]) -> ContainerState:
+    """State of a container as inspected, e.g. `Container.attrs`"""
+    state = attrs.get('State') or {}
+    return {
+        'id': attrs['Id'],
+        'name': (attrs.get('Name') or '').lstrip('/'),
+        'image': (attrs.get('Config') or {}).get('Image'),
+        'state': state.get('Status'),
+        'health': (state.get('Health') or {}).get('Status'),
+    }
+
+
+def image_from_attrs(attrs: dict[str, Any]) -> ImageState:
+    """State of an image as listed or inspected"""
+    return {'id': attrs['Id'], 'tags': list(attrs.get('RepoTags') or [])}
+
+
+class DockerState:
+    """
+    Containers and images of the daemon kept in memory. Seeded once, then kept current
+    by following the daemon's event stream on a background thread; the tools that change
+    something record the result right away. While the stream is down (before the first
+    seed, or after the daemon went away until it reconnects and reseeds) every query goes
+    to the daemon directly
+    """
+
+    def __init__(self, client: docker.DockerClient, reconnect_delay: float = 5.0):
+        self.reconnect_delay = reconnect_delay
+        self._api = client.api
+        self._containers: dict[str, ContainerState] = {}
+        self._images: dict[str, ImageState] = {}
+        self._lock = threading.Lock()
+        self._live = False
+        self._stopped = threading.Event()
+        self._events: Any = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def live(self) -> bool:
+        return self._live
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._follow, name='docker-events', daemon=True,
+            )
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        self._live = False
+        if self._events is not None:
+            self._events.close()
+
+    def containers(self, all: bool = False) -> list[ContainerState]:
+        self.start()
+        if not self._live:
+            return [container_from_summary(c) for c in self._api.containers(all=all)]
+        with self._lock:
+            return [
+                dict(c) for c in self._containers.values() if all or c['state'] == 'running'
+            ]
+
+    def container(self, id_or_name: str) -> ContainerState | None:
+        self.start()
+        if self._live:
+            with self._lock:
+                for c in self._containers.values():
+                    if id_or_name in (c['name'], c['id']) or c['id'].startswith(id_or_name):
+                        return dict(c)
+                return None
+        try:
+            return container_from_attrs(self._api.inspect_container(id_or_name))
+        except docker.errors.NotFound:
+            return None
+
+    def images(self) -> list[ImageState]:
+        self.start()
+        if not self._live:
+            return [image_from_attrs(i) for i in self._api.images()]
+        with self._lock:
+            return [{**i, 'tags': list(i['tags'])} for i in self._images.values()]
+
+    def record_container(self, state: ContainerState):
+        with self._lock:
+            self._containers[state['id']] = state
+
+    def record_image(self, state: ImageState):
+        with self._lock:
+            self._set_image(state)
+
+    def resync(self):
+        """Reload everything, e.g. after `docker compose` changed an unknown set of containers"""
+        if self._live:
+            self._seed()
+
+    def _seed(self):
+        containers = [container_from_summary(c) for c in self._api.containers(all=True)]
+        images = [image_from_attrs(i) for i in self._api.images()]
+        with self._lock:
+            self._containers = {c['id']: c for c in containers}
+            self._images = {i['id']: i for i in images}
+
+    def _follow(self):
+        while not self._stopped.is_set():
+            try:
+                # Subscribed before seeding, so nothing that happens in between is missed
+                self._events = self._api.events(decode=True)
+                self._seed()
+                self._live = not self._stopped.is_set()
+                logger.debug('Following docker events')
+                for event in self._events:
+                    self._apply(event)
+            except Exception as e:
+                logger.debug(f'Docker event stream failed: error={e!r}')
+            finally:
+                self._live = False
+            if self._stopped.wait(self.reconnect_delay):
+                return
+            logger.debug('Reconnecting to docker event stream')
+
+    def _apply(self, event: dict[str, Any]):
+        actor = (event.get('Actor') or {}).get('ID') or event.get('id')
+        if not actor:
+            return
+        match event.get('Type'):
+            case 'container':
+                self._refresh_container(actor, event.get('Action') or '')
+            case 'image':
+                self._refresh_image(actor)
+
+    def _refresh_container(self, id: str, action: str):
+        if action == 'destroy':
+            with self._lock:
+                self._containers.pop(id, None)
+            return
+        if action.startswith(('exec_', 'attach', 'resize', 'top', 'export', 'copy')):
+            return
+        summaries = self._api.containers(all=True, filters={'id': id})
+        with self._lock:
+            if summaries:
+                self._containers[id] = container_from_summary(summaries[0])
+            else:
+                self._containers.pop(id, None)
+
+    def _refresh_image(self, ref: str):
+        try:
+            attrs = self._api.inspect_image(ref)
+        except docker.errors.NotFound:
+            with self._lock:
+                self._images.pop(ref, None)
+                # Deleted by tag: drop the tag from the image that had it
+                for image in self._images.values():
+                    image['tags'] = [t for t in image['tags'] if t != ref]
+            return
+        with self._lock:
+            self._set_image(image_from_attrs(attrs))
+
+    def _set_image(self, state: ImageState):
+        # A tag moves to the new image
+        for image in self._images.values():
+            if image['id'] != state['id']:
+                image['tags'] = [t for t in image['tags'] if t not in state['tags']]
+        self._images[state['id']] = state
@@ -0,0 +1,152 @@
+import asyncio
+from collections import deque
+from contextlib import aclosing, suppress
+from dataclasses import dataclass, field
+import threading
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Iterable
+
+import docker  # type: ignore[import-untyped]
+import docker.errors  # type: ignore[import-untyped]
+import docker.utils  # type: ignore[import-untyped]
+from loguru import logger
+import requests
+
+
+async def iterate_in_thread[T](
+    items: Callable[[], Iterable[T]],
+    stop: Callable[[], None],
+) -> AsyncGenerator[T, None]:
+    """
+    Items of a blocking iterator as a thread produces them. When the consumer stops early
+    (e.g. it was cancelled) `stop` is called to unblock the thread
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[tuple[str, Any]] = asyncio.Queue()
+
+    def put(kind: str, value: Any):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+        except RuntimeError:  # the loop is closed, nobody is waiting anymore
+            pass
+
+    def pump():
+        try:
+            for item in items():
+                put('item', item)
+        except BaseException as e:
+            put('error', e)
+        else:
+            put('done', None)
+
+    thread = threading.Thread(target=pump, name='tool-stream', daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == 'done':
+                return
+            if kind == 'error':
+                raise value
+            yield value
+    finally:
+        if thread.is_alive():
+            stop()
+
+
+@dataclass(eq=False, slots=True)
+class BuildStream:
+    """
+    Image build through the low-level streaming API, on a connection of its own: closing
+    it is how a build is cancelled, the daemon stops building when the client goes away
+    """
+    api_version: str
+    image_id: str | None = None
+    log: list[dict[str, Any]] = field(default_factory=list)
+    _responses: list[requests.Response] = field(default_factory=list)
+    _api: docker.APIClient | None = None
+    _closed: bool = False
+
+    async def lines(self, **build_kwargs) -> AsyncIterator[str]:
+        """Log lines of the build; raises `docker.errors.BuildError` when it fails"""
+        self._api = docker.APIClient(version=self.api_version, **docker.utils.kwargs_from_env())
+        self._api.hooks['response'].append(self._opened)
+        build = self._api.build
+        try:
+            async with aclosing(
+                iterate_in_thread(lambda: build(decode=True, **build_kwargs), self.close),
+            ) as chunks:
+                async for chunk in chunks:
+                    self.log.append(chunk)
+                    if 'error' in chunk:
+                        raise docker.errors.BuildError(chunk['error'], self.log)
+                    if (aux := chunk.get('aux')) and 'ID' in aux:
+                        self.image_id = aux['ID']
+                    for line in (chunk.get('stream') or chunk.get('status') or '').splitlines():
+                        if line.startswith('Successfully built '):  # before the aux messages
+                            self.image_id = self.image_id or line.split()[-1]
+                        if line.strip():
+                            yield line
+        finally:
+            self.close()
+        if self.image_id is None:
+            raise docker.errors.BuildError('Unknown build result', self.log)
+
+    def _opened(self, response: requests.Response, *args, **kwargs):
+        self._responses.append(response)
+        if self._closed:  # cancelled while the request was being sent
+            self.close()
+
+    def close(self):
+        self._closed = True
+        for response in self._responses:
+            # Unblocks the thread reading the response
+            with suppress(OSError):
+                response.raw.shutdown()
+        self._responses.clear()
+        if self._api is not None:
+            self._api.close()
+            self._api = None
+
+
+@dataclass(eq=False, slots=True)
+class CommandResult:
+    returncode: int
+    output: list[str]
+    """The last lines of the output, see `run_streaming`"""
+
+
+async def run_streaming(
+    *args: str,
+    on_line: Callable[[str], None],
+    kill_timeout: float = 10.0,
+    tail: int = 20,
+) -> CommandResult:
+    """
+    Run the command without a shell, passing each line of its combined output to
+    `on_line` as it is printed; only the last `tail` lines are kept for the result.
+    When cancelled the process is terminated, then killed if it doesn't exit within
+    `kill_timeout` seconds
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+    assert process.stdout is not None
+    output: deque[str] = deque(maxlen=tail)
+    try:
+        async for raw in process.stdout:
+            line = raw.decode(errors='replace').rstrip()
+            output.append(line)
+            on_line(line)
+        return CommandResult(await process.wait(), list(output))
+    finally:
+        if process.returncode is None:
+            logger.debug(f'Stopping command: args={args}')
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), kill_timeout)
+            except TimeoutError:
+                process.kill()
+                await process.wait()
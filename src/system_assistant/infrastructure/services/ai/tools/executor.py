@@ -0,0 +1,212 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import dataclass
+from functools import partial
+import time
+from typing import Any, Awaitable, Callable, Literal, Sequence
+
+from langchain_core.messages import AnyMessage, ToolCall, ToolMessage
+from langchain_core.runnables.config import RunnableConfig
+from langchain_core.tools import BaseTool, StructuredTool
+from langgraph.prebuilt import ToolNode
+from langgraph.store.base import BaseStore
+from loguru import logger
+
+from . import get_timeout, is_read_only, tool_output
+
+
+type ToolStatus = Literal['started', 'output', 'finished', 'failed', 'timed out']
+
+
+@dataclass(eq=False, slots=True)
+class ToolProgress:
+    tool: str
+    call_id: str
+    status: ToolStatus
+    elapsed: float = 0.0
+    line: str = ''
+    """Output line reported by the tool with `report_output`"""
+
+
+@dataclass(eq=False, slots=True)
+class ToolStats:
+    """Latency of one tool's calls, timed out calls included with the time waited for them"""
+    calls: int = 0
+    failures: int = 0
+    timeouts: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+    def observe(self, status: ToolStatus, elapsed: float):
+        self.calls += 1
+        self.failures += status == 'failed'
+        self.timeouts += status == 'timed out'
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+
+
+def log_progress(progress: ToolProgress):
+    if progress.status == 'started':
+        logger.info(f'Running tool: tool={progress.tool}')
+    elif progress.status == 'output':
+        logger.info(f'{progress.tool}: {progress.line}')
+    else:
+        logger.info(
+            f'Tool {progress.status}: tool={progress.tool}, elapsed={progress.elapsed:.2f}s',
+        )
+
+
+class ToolExecutor:
+    """
+    Runs the synchronous tools off the event loop in a bounded thread pool shared by
+    every agent. Each call has a timeout: the tool's own (see `with_timeout`) or `timeout`.
+    A thread can't be interrupted, so a timed out or cancelled call only stops being waited
+    for and finishes in its thread; the model gets an error for it right away. Native async
+    tools run on the loop and are cancelled instead
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        timeout: float = 120.0,
+        on_progress: Callable[[ToolProgress], None] = log_progress,
+    ):
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self.stats: dict[str, ToolStats] = {}
+        """Per tool name"""
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tool')
+
+    def node(self, tools: Sequence[BaseTool]) -> 'ConcurrentToolNode':
+        return ConcurrentToolNode(tools, executor=self)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for name, stats in self.stats.items():
+            logger.debug(
+                f'Tool latency: tool={name}, calls={stats.calls}, '
+                f'mean={stats.mean_seconds:.3f}s, max={stats.max_seconds:.3f}s, '
+                f'failures={stats.failures}, timeouts={stats.timeouts}',
+            )
+
+    async def run(self, tool: BaseTool, call_id: str, run: Callable[[], Any]) -> Any:
+        """Run a synchronous tool call in the pool"""
+        return await self._track(
+            tool,
+            call_id,
+            lambda: asyncio.get_running_loop().run_in_executor(
+                self._pool, partial(copy_context().run, run),
+            ),
+        )
+
+    async def run_async(self, tool: BaseTool, call_id: str, call: Awaitable[Any]) -> Any:
+        """Await a native async tool call on the loop; on timeout it is cancelled"""
+        return await self._track(tool, call_id, lambda: call)
+
+    async def _track(
+        self, tool: BaseTool, call_id: str, start: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        timeout = get_timeout(tool) or self.timeout
+        started_at = time.perf_counter()
+        self.on_progress(ToolProgress(tool.name, call_id, 'started'))
+        status: ToolStatus = 'failed'
+        # Copied into the call's thread or task, so `report_output` reaches this call
+        token = tool_output.set(
+            lambda line: self.on_progress(
+                ToolProgress(
+                    tool.name, call_id, 'output', time.perf_counter() - started_at, line,
+                ),
+            ),
+        )
+        try:
+            result = await asyncio.wait_for(start(), timeout)
+            status = 'finished'
+            return result
+        except TimeoutError:
+            status = 'timed out'
+            raise TimeoutError(f'Tool {tool.name} did not finish in {timeout:.0f} seconds')
+        finally:
+            tool_output.reset(token)
+            elapsed = time.perf_counter() - started_at
+            self.stats.setdefault(tool.name, ToolStats()).observe(status, elapsed)
+            self.on_progress(ToolProgress(tool.name, call_id, status, elapsed))
+
+
+def _is_async(tool: BaseTool) -> bool:
+    if isinstance(tool, StructuredTool):
+        return tool.coroutine is not None
+    return type(tool)._arun is not BaseTool._arun
+
+
+class ConcurrentToolNode(ToolNode):
+    """
+    `ToolNode` that runs the tool calls of one model step through `ToolExecutor`.
+    Consecutive read-only calls run concurrently; a call that changes something runs
+    alone, after the calls before it and before the calls after it, as the model wrote them
+    """
+
+    def __init__(self, tools: Sequence[BaseTool], executor: ToolExecutor):
+        super().__init__(tools)
+        self._executor = executor
+
+    async def _afunc(
+        self,
+        input: list[AnyMessage] | dict[str, Any] | Any,
+        config: RunnableConfig,
+        *,
+        store: BaseStore | None,
+    ) -> Any:
+        tool_calls, input_type = self._parse_input(input, store)
+        outputs: list[ToolMessage] = []
+        batch: list[ToolCall] = []
+        for call in tool_calls:
+            if self._is_read_only(call):
+                batch.append(call)
+                continue
+            outputs += await self._run_batch(batch, input_type, config)
+            outputs.append(await self._arun_one(call, input_type, config))
+            batch = []
+        outputs += await self._run_batch(batch, input_type, config)
+        return self._combine_tool_outputs(outputs, input_type)
+
+    async def _run_batch(
+        self,
+        calls: list[ToolCall],
+        input_type: Literal['list', 'dict', 'tool_calls'],
+        config: RunnableConfig,
+    ) -> list[ToolMessage]:
+        return list(await asyncio.gather(
+            *(self._arun_one(call, input_type, config) for call in calls),
+        ))
+
+    def _is_read_only(self, call: ToolCall) -> bool:
+        tool = self.tools_by_name.get(call['name'])
+        return tool is not None and is_read_only(tool)
+
+    async def _arun_one(
+        self,
+        call: ToolCall,
+        input_type: Literal['list', 'dict', 'tool_calls'],
+        config: RunnableConfig,
+    ) -> ToolMessage:
+        tool = self.tools_by_name.get(call['name'])
+        if tool is None:
+            return await super()._arun_one(call, input_type, config)
+        try:
+            # `_run_one` handles the tool's own errors the way `ToolNode` always does
+            if _is_async(tool):
+                return await self._executor.run_async(
+                    tool, call['id'] or '', super()._arun_one(call, input_type, config),
+                )
+            return await self._executor.run(
+                tool, call['id'] or '', partial(self._run_one, call, input_type, config),
+            )
+        except TimeoutError as e:
+            return ToolMessage(
+                content=f'Error: {e}', name=call['name'], tool_call_id=call['id'], status='error',
+            )
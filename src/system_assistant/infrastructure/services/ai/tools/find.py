@@ -0,0 +1,431 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from fnmatch import translate
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import threading
+import time
+from typing import Any
+
+from langchain.tools import tool
+from langchain_core.tools import BaseTool
+from loguru import logger
+
+from system_assistant.core.config import Config
+
+from . import read_only
+
+
+type Entry = tuple[str, bool]
+"""Name of a directory entry and whether it is a directory"""
+
+IGNORED_NAMES = (
+    '.git', '.hg', '.svn', 'node_modules', '__pycache__', '.venv', 'venv', '.tox', '.nox',
+    '.mypy_cache', '.pytest_cache', '.ruff_cache', '.cache',
+)
+IGNORE_FILES = ('.gitignore', '.ignore')
+CONTENT_CHUNK = 1024 * 1024
+DIRECTORY_BATCH = 64
+# Directory timestamps this close to the scan may hide a change made in the same tick
+RACY_NS = 2_000_000_000
+
+
+def _compile(patterns: list[str], ignore_case: bool = False) -> re.Pattern[str] | None:
+    if not patterns:
+        return None
+    return re.compile('|'.join(translate(p) for p in patterns), re.I if ignore_case else 0)
+
+
+class IgnoreRules:
+    """
+    `.gitignore`-style patterns of the search root's ignore files on top of `IGNORED_NAMES`.
+    Negated patterns are not supported and are skipped
+    """
+
+    def __init__(self, patterns: list[str]):
+        names: dict[bool, list[str]] = {True: [], False: []}
+        paths: dict[bool, list[str]] = {True: [], False: []}
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith(('#', '!')):
+                continue
+            dirs_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            if '/' in pattern:
+                paths[dirs_only].append(pattern.lstrip('/'))
+            else:
+                names[dirs_only].append(pattern)
+        self.has_path_patterns = bool(paths[True] or paths[False])
+        # Checked for every entry of the tree: one regex per kind of entry
+        self._names = {
+            True: _compile([*names[False], *names[True], *IGNORED_NAMES]),
+            False: _compile(names[False]),
+        }
+        self._paths = {True: _compile([*paths[False], *paths[True]]), False: _compile(paths[False])}
+
+    @classmethod
+    def from_root(cls, root: str) -> 'IgnoreRules':
+        patterns: list[str] = []
+        for name in IGNORE_FILES:
+            try:
+                patterns += Path(root, name).read_text(errors='replace').splitlines()
+            except OSError:
+                continue
+        return cls(patterns)
+
+    def ignored(self, relative: str, name: str, is_dir: bool) -> bool:
+        names, paths = self._names[is_dir], self._paths[is_dir]
+        return bool(
+            (names is not None and names.match(name))
+            or (paths is not None and paths.match(relative))
+        )
+
+
+def scan(directory: str) -> list[Entry]:
+    with os.scandir(directory) as entries:
+        return [(e.name, e.is_dir(follow_symlinks=False)) for e in entries]
+
+
+class PathIndex:
+    """
+    Entries of the directories under `root` as of their last scan. A directory is scanned
+    again only when its modification time changed, otherwise one `stat` replaces the
+    `scandir`. With `path` the index is kept in a file, so the next session starts warm
+    """
+
+    def __init__(self, root: Path, path: Path | None = None, max_directories: int = 200_000):
+        self.root = os.path.abspath(root)
+        self.path = path
+        self.max_directories = max_directories
+        self.hits = 0
+        self.misses = 0
+        self._directories: dict[str, tuple[int, int, list[Entry]]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path is not None:
+            self._load(path)
+
+    def covers(self, directory: str) -> bool:
+        return directory == self.root or directory.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    def entries(self, directory: str) -> list[Entry]:
+        mtime_ns = os.stat(directory).st_mtime_ns
+        cached = self._directories.get(directory)
+        if cached is not None and cached[0] == mtime_ns and mtime_ns + RACY_NS < cached[1]:
+            self.hits += 1
+            return cached[2]
+        self.misses += 1
+        scanned_ns = time.time_ns()
+        entries = scan(directory)
+        with self._lock:
+            if cached is not None:
+                self._forget_removed(directory, cached[2], entries)
+            if cached is not None or len(self._directories) < self.max_directories:
+                self._directories[directory] = (mtime_ns, scanned_ns, entries)
+                self._dirty = True
+        return entries
+
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+        with self._lock:
+            text = json.dumps({'root': self.root, 'directories': self._directories})
+            directories = len(self._directories)
+            self._dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_suffix('.tmp')
+        temporary.write_text(text)
+        os.replace(temporary, self.path)
+        logger.debug(f'Saved path index: path={self.path}, directories={directories}')
+
+    def _load(self, path: Path):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return
+        if data.get('root') != self.root:
+            return
+        self._directories = {
+            directory: (mtime_ns, scanned_ns, [(name, is_dir) for name, is_dir in entries])
+            for directory, (mtime_ns, scanned_ns, entries) in data['directories'].items()
+        }
+
+    def _forget_removed(self, directory: str, before: list[Entry], after: list[Entry]):
+        removed = {name for name, is_dir in before if is_dir} - {n for n, d in after if d}
+        for name in removed:
+            prefix = os.path.join(directory, name)
+            removed_keys = [
+                key for key in self._directories
+                if key == prefix or key.startswith(prefix + os.sep)
+            ]
+            for key in removed_keys:
+                del self._directories[key]
+
+
+@dataclass(eq=False, slots=True)
+class FindResult:
+    matches: list[dict[str, Any]] = field(default_factory=list)
+    truncated: bool = False
+    directories_scanned: int = 0
+    unreadable: int = 0
+
+
+@dataclass(eq=False, slots=True)
+class _Query:
+    root: str
+    name: re.Pattern[str]
+    min_size: int | None
+    max_size: int | None
+    modified_after: float | None
+    modified_before: float | None
+    contains: bytes | None
+    include_hidden: bool
+    ignore: IgnoreRules | None
+    max_content_bytes: int
+
+
+class FileFinder:
+    """
+    Breadth-first search of a tree, a level at a time: the directories of a level are
+    listed, and the candidate files checked, in parallel. Shallow matches come first,
+    so the ones kept when the result cap is hit are the closest to the root
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        index: PathIndex | None = None,
+        max_content_bytes: int = 20 * 2**20,
+    ):
+        self.index = index
+        self.max_content_bytes = max_content_bytes
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='find')
+
+    def find(
+        self,
+        root: str,
+        name: str = '*',
+        min_size: int | None = None,
+        max_size: int | None = None,
+        modified_after: float | None = None,
+        modified_before: float | None = None,
+        contains: str | None = None,
+        max_depth: int = 10,
+        max_results: int = 100,
+        include_hidden: bool = False,
+        include_ignored: bool = False,
+    ) -> FindResult:
+        root = os.path.abspath(root)
+        query = _Query(
+            root=root,
+            name=re.compile(translate(name), re.I),
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=modified_after,
+            modified_before=modified_before,
+            contains=contains.encode() if contains else None,
+            include_hidden=include_hidden,
+            ignore=None if include_ignored else IgnoreRules.from_root(root),
+            max_content_bytes=self.max_content_bytes,
+        )
+        result = FindResult()
+        level = [root]
+        for depth in range(max_depth + 1):
+            if not level:
+                break
+            result.directories_scanned += len(level)
+            # A task per batch of directories: per-directory tasks cost more than the work
+            batches = [level[i:i + DIRECTORY_BATCH] for i in range(0, len(level), DIRECTORY_BATCH)]
+            next_level: list[str] = []
+            for subdirectories, matches, unreadable in self._pool.map(
+                lambda batch: self._search(query, batch), batches,
+            ):
+                next_level += subdirectories
+                result.unreadable += unreadable
+                room = max_results - len(result.matches)
+                result.matches += matches[:room]
+                result.truncated |= len(matches) > room
+            if result.truncated:
+                break
+            level = next_level if depth < max_depth else []
+            result.truncated |= bool(next_level) and depth == max_depth
+        if self.index is not None:
+            self.index.save()
+        return result
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _list(self, directory: str) -> list[Entry] | None:
+        try:
+            if self.index is not None and self.index.covers(directory):
+                return self.index.entries(directory)
+            return scan(directory)
+        except OSError:
+            return None
+
+    def _search(
+        self, query: _Query, directories: list[str],
+    ) -> tuple[list[str], list[dict[str, Any]], int]:
+        """Subdirectories, matching files and unreadable count of the directories"""
+        subdirectories: list[str] = []
+        matches: list[dict[str, Any]] = []
+        unreadable = 0
+        ignore = query.ignore
+        relative = ignore is not None and ignore.has_path_patterns
+        for directory in directories:
+            entries = self._list(directory)
+            if entries is None:
+                unreadable += 1
+                continue
+            for name, is_dir in entries:
+                if not query.include_hidden and name.startswith('.'):
+                    continue
+                path = os.path.join(directory, name)
+                if ignore is not None and ignore.ignored(
+                    os.path.relpath(path, query.root) if relative else '', name, is_dir,
+                ):
+                    continue
+                if is_dir:
+                    subdirectories.append(path)
+                elif query.name.match(name) and (match := _check(query, path)) is not None:
+                    matches.append(match)
+        return subdirectories, matches, unreadable
+
+
+def _check(query: _Query, path: str) -> dict[str, Any] | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if query.min_size is not None and stat.st_size < query.min_size:
+        return None
+    if query.max_size is not None and stat.st_size > query.max_size:
+        return None
+    if query.modified_after is not None and stat.st_mtime < query.modified_after:
+        return None
+    if query.modified_before is not None and stat.st_mtime > query.modified_before:
+        return None
+    if query.contains is not None and not _contains(
+        path, query.contains, query.max_content_bytes,
+    ):
+        return None
+    return {
+        'path': path,
+        'size': stat.st_size,
+        'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds'),
+    }
+
+
+def _contains(path: str, needle: bytes, max_bytes: int) -> bool:
+    """Whether a text file has `needle`; binary files and files over `max_bytes` don't"""
+    try:
+        if os.path.getsize(path) > max_bytes:
+            return False
+        with open(path, 'rb') as file:
+            tail = b''
+            while chunk := file.read(CONTENT_CHUNK):
+                if not tail and b'\0' in chunk[:8192]:
+                    return False
+                if needle in tail + chunk:
+                    return True
+                tail = chunk[-(len(needle) - 1):] if len(needle) > 1 else b''
+    except OSError:
+        return False
+    return False
+
+
+def _timestamp(value: str | None) -> float | None:
+    return None if value is None else datetime.fromisoformat(value).timestamp()
+
+
+def find_index_path(config: Config, cwd: Path) -> Path | None:
+    """File keeping the path index of `cwd`, none when `FIND_INDEX_DIR` isn't set"""
+    if not config.find_index_dir:
+        return None
+    digest = hashlib.sha256(str(Path(cwd).resolve()).encode()).hexdigest()[:16]
+    return Path(config.find_index_dir) / f'{digest}.json'
+
+
+def build_find_files_tool(
+    cwd: Path | None = None,
+    index_path: Path | None = None,
+    max_workers: int = 8,
+) -> BaseTool:
+    """
+    `find_files` tool. With `cwd` it is the default folder to search, and its tree is
+    indexed, in a file when `index_path` is given
+    """
+    finder = FileFinder(max_workers, index=PathIndex(cwd, index_path) if cwd else None)
+    default_root = str(cwd) if cwd else ''
+
+    def find_files(
+        folder_path: str = '',
+        name: str = '*',
+        min_size: int | None = None,
+        max_size: int | None = None,
+        modified_after: str | None = None,
+        modified_before: str | None = None,
+        contains: str | None = None,
+        max_depth: int = 10,
+        max_results: int = 100,
+        include_hidden: bool = False,
+    ) -> dict[str, Any]:
+        """
+        Find files in a folder and all its subfolders in one call, instead of listing
+        folders one by one. Version control, virtualenv, cache folders and the patterns of
+        .gitignore are skipped.
+
+        Args:
+            folder_path (optional): absolute path of the folder to search
+                (e.g. /home/user/project). Default is the current working directory.
+            name (optional): case-insensitive glob the file name must match
+                (e.g. "*.py", "Dockerfile*"). Default is any name.
+            min_size (optional): minimal file size in bytes.
+            max_size (optional): maximal file size in bytes.
+            modified_after (optional): ISO date or datetime the file was modified after
+                (e.g. 2024-05-01).
+            modified_before (optional): ISO date or datetime the file was modified before.
+            contains (optional): text the file must contain, binary files never match.
+                Slow on large folders.
+            max_depth (optional): how many folders deep to search, default is 10.
+            max_results (optional): maximal number of files to return, default is 100.
+            include_hidden (optional): also search files and folders starting with a dot.
+
+        Returns:
+            dict: matches (path, size in bytes and modification time of each file) and
+                whether the search stopped early because of `max_depth` or `max_results`.
+        """
+        root = folder_path or default_root
+        if not root:
+            raise ValueError('folder_path is required')
+        started_at = time.perf_counter()
+        result = finder.find(
+            root,
+            name=name,
+            min_size=min_size,
+            max_size=max_size,
+            modified_after=_timestamp(modified_after),
+            modified_before=_timestamp(modified_before),
+            contains=contains,
+            max_depth=max_depth,
+            max_results=max_results,
+            include_hidden=include_hidden,
+        )
+        logger.debug(
+            f'Found files: root={root}, name={name}, matches={len(result.matches)}, '
+            f'directories={result.directories_scanned}, '
+            f'elapsed={time.perf_counter() - started_at:.3f}s',
+        )
+        return {
+            'matches': result.matches,
+            'truncated': result.truncated,
+            'directories_scanned': result.directories_scanned,
+            'unreadable_directories': result.unreadable,
+        }
+
+    return read_only(tool(find_files, parse_docstring=True))
@@ -0,0 +1,257 @@
+import ctypes
+import ctypes.util
+from dataclasses import dataclass
+import os
+import struct
+import threading
+from typing import Callable, Literal
+
+from loguru import logger
+
+from system_assistant.core.cache import CacheStats, LRUCache
+
+
+type EntryKind = Literal['list_dir', 'exists']
+type EntryKey = tuple[EntryKind, str]
+type DirToken = tuple[int, int, int] | None
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (
+    IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    """
+    Minimal inotify binding over libc. The descriptor is non-blocking: pending events are
+    read when the cache is used, so no thread waits on it
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._rm_watch(self.fd, wd)
+
+    def read(self) -> list[tuple[int, int]]:
+        """(watch descriptor, mask) of the pending events"""
+        events: list[tuple[int, int]] = []
+        while True:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = EVENT.unpack_from(buffer, offset)
+                events.append((wd, mask))
+                offset += EVENT.size + length
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _open_inotify() -> Inotify | None:
+    try:
+        return Inotify()
+    except (OSError, AttributeError) as e:
+        logger.debug(f'inotify is unavailable, checking modification times: error={e!r}')
+        return None
+
+
+@dataclass(eq=False, slots=True)
+class _Entry:
+    value: tuple[str, ...] | bool
+    directory: str
+    watched: bool
+    token: DirToken
+    """Stat of `directory` to compare with when it isn't watched"""
+
+
+class FileSystemCache:
+    """
+    Results of the read-only file system tools, kept until the directory they depend on
+    changes. A directory is watched with inotify while entries depend on it; without
+    inotify (or when the watch limit is reached) its inode, mtime and ctime are compared
+    on every read instead, which can miss a change made within the file system's
+    timestamp granularity. The mutating tools invalidate what they touch right away
+    """
+
+    def __init__(self, max_entries: int = 1024, use_inotify: bool = True):
+        self._entries = LRUCache[EntryKey, _Entry](max_entries, on_evict=self._forget)
+        self._by_directory: dict[str, set[EntryKey]] = {}
+        self._watches: dict[str, int] = {}
+        self._watched: dict[int, str] = {}
+        self._inotify = _open_inotify() if use_inotify else None
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._entries.stats
+
+    @property
+    def max_entries(self) -> int:
+        return self._entries.max_entries
+
+    @max_entries.setter
+    def max_entries(self, value: int):
+        self._entries.max_entries = value
+
+    @property
+    def watches(self) -> int:
+        return len(self._watches)
+
+    def list_dir(self, path: str) -> list[str]:
+        path = os.path.abspath(path)
+        value = self._get(('list_dir', path), path, lambda: tuple(os.listdir(path)))
+        return list(value)
+
+    def exists(self, path: str) -> bool:
+        path = os.path.abspath(path)
+        return self._get(('exists', path), os.path.dirname(path), lambda: os.path.exists(path))
+
+    def invalidate(self, path: str, recursive: bool = False):
+        """
+        Drop the results depending on `path` and on the directories above it (a folder
+        created with its parents changes all of them), or below it with `recursive`
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            directories = {path}
+            parent = os.path.dirname(path)
+            while parent not in directories:
+                directories.add(parent)
+                parent = os.path.dirname(parent)
+            if recursive:
+                prefix = path.rstrip(os.sep) + os.sep
+                directories.update(d for d in self._by_directory if d.startswith(prefix))
+            for directory in directories:
+                self._drop_directory(directory)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._forget(key, self._entries.pop(key))  # type: ignore[arg-type]
+
+    def close(self):
+        self.clear()
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+
+    def _get[T: tuple[str, ...] | bool](
+        self, key: EntryKey, directory: str, load: Callable[[], T],
+    ) -> T:
+        with self._lock:
+            self._apply_events()
+            entry = self._entries.get(key)
+            if entry is not None and (entry.watched or entry.token == _stat(directory)):
+                return entry.value  # type: ignore[return-value]
+            if entry is not None:
+                self._forget(key, self._entries.pop(key))  # type: ignore[arg-type]
+            # Watch before loading, so a change made in between still invalidates the entry
+            watched = self._watch(directory)
+            token = None if watched else _stat(directory)
+        try:
+            value = load()
+        except BaseException:
+            with self._lock:
+                self._release(directory)
+            raise
+        with self._lock:
+            if watched and directory not in self._watches:
+                # The watch went away meanwhile (e.g. the directory was deleted)
+                return value
+            self._entries.put(key, _Entry(value, directory, watched, token))
+            self._by_directory.setdefault(directory, set()).add(key)
+        return value
+
+    def _watch(self, directory: str) -> bool:
+        if self._inotify is None:
+            return False
+        if directory in self._watches:
+            return True
+        try:
+            wd = self._inotify.add_watch(directory)
+        except OSError:
+            # Missing directory, no permission or the watch limit: fall back to stat
+            return False
+        self._watches[directory] = wd
+        self._watched[wd] = directory
+        return True
+
+    def _apply_events(self):
+        if self._inotify is None:
+            return
+        for wd, mask in self._inotify.read():
+            if mask & IN_Q_OVERFLOW:
+                logger.debug('inotify queue overflowed, dropping cached file system results')
+                for directory in list(self._by_directory):
+                    self._drop_directory(directory)
+                continue
+            directory = self._watched.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                # The kernel removed the watch, e.g. the directory is gone
+                self._watches.pop(directory, None)
+                self._watched.pop(wd, None)
+            self._drop_directory(directory)
+
+    def _drop_directory(self, directory: str):
+        for key in list(self._by_directory.get(directory, ())):
+            entry = self._entries.pop(key)
+            if entry is not None:
+                self._forget(key, entry)
+
+    def _forget(self, key: EntryKey, entry: _Entry):
+        keys = self._by_directory.get(entry.directory)
+        if keys is not None:
+            keys.discard(key)
+        self._release(entry.directory)
+
+    def _release(self, directory: str):
+        """Stop watching the directory once no entry depends on it"""
+        if self._by_directory.get(directory):
+            return
+        self._by_directory.pop(directory, None)
+        wd = self._watches.pop(directory, None)
+        if wd is not None and self._inotify is not None:
+            self._watched.pop(wd, None)
+            self._inotify.rm_watch(wd)
+
+
+def _stat(directory: str) -> DirToken:
+    try:
+        stat = os.stat(directory)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_ctime_ns
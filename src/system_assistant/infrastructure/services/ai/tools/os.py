@@ -1,30 +1,49 @@
-import os
+from dataclasses import asdict
 from pathlib import Path
+from typing import Any
 
 from langchain.tools import tool
 
+from . import read_only
+from .fs_cache import FileSystemCache
+from .permissions import chmod_paths, chmod_tree
 
-def create_file(file_path: str, permission_level: int = 438) -> str:
+
+fs_cache = FileSystemCache()
+"""Results of `list_dir` and `is_valid_path`, shared by every agent"""
+
+
+def _mode(permission_level: int) -> int:
+    """Mode from octal digits written as a decimal number, e.g. 755 is 0o755"""
+    digits = str(permission_level)
+    if not digits.isdigit() or set(digits) & {'8', '9'} or len(digits) > 4:
+        raise ValueError(f'Invalid permission level: {permission_level}, expected e.g. 755')
+    return int(digits, 8)
+
+
+def create_file(file_path: str, permission_level: int = 666) -> str:
     """
     Create a file by path.
 
     Args:
         file_path: absolute path of the new file (e.g. /home/user/new_file.txt).
-        permission_level (optional): UNIX permissions level represented as number, default is 438.
+        permission_level (optional): UNIX permission level as octal digits written as a number
+            (e.g. 644), default is 666. The umask applies
 
     Returns:
         file_path: if file was created
     """
 
     path_obj = Path(file_path)
-    path_obj.touch(permission_level)
+    path_obj.touch(_mode(permission_level))
+    fs_cache.invalidate(file_path)
     return file_path
 
 
 def create_folder(
     folder_path: str,
     parents: bool = False,
-    permission_level: int = 511,
+    permission_level: int = 777,
 ):
     """
     Create folder by path
@@ -32,25 +51,45 @@ def create_folder(
     Args:
         folder_path: absolute path to the new folder (e.g. /home/user/my_new_folder).
         parents (optional): if true create folders that don't exist on the path to the new folder.
-        permission_level (optional): UNIX permissions level represented as number, default is 438.
+        permission_level (optional): UNIX permission level as octal digits written as a number
+            (e.g. 755), default is 777. The umask applies
     """
 
     path_obj = Path(folder_path)
-    path_obj.mkdir(permission_level, parents)
+    path_obj.mkdir(_mode(permission_level), parents)
+    fs_cache.invalidate(folder_path)
 
 
-def change_permissions(path: str, permission_level: int, recursive: bool = False):
+def change_permissions(
+    path: str,
+    permission_level: int,
+    recursive: bool = False,
+    dry_run: bool = False,
+) -> dict[str, Any]:
     """
     Change permission of the file or folder
 
     Args:
         path: absolute path to the file or folder (e.g. /home/user/my_folder/my_file.pdf).
-        permission_level: UNIX permission level represented as number (e.g. 777)
-        recursive (optional): if path target is folder - changes permissions recursively
+        permission_level: UNIX permission level as octal digits written as a number (e.g. 755).
+            The umask doesn't apply
+        recursive (optional): if path target is folder - changes permissions of the folder and
+            everything in it in one call. Symbolic links are skipped
+        dry_run (optional): only count the files and folders that would change
+
+    Returns:
+        dict: how many files and folders changed (or would change), were already set,
+            failed, and the first failed paths with their errors
     """
 
-    path_obj = Path(path)
-    path_obj.chmod(permission_level)
+    mode = _mode(permission_level)
+    if recursive:
+        summary = chmod_tree(path, mode, dry_run=dry_run)
+    else:
+        summary = chmod_paths([path], mode, dry_run=dry_run)
+    if not dry_run:
+        fs_cache.invalidate(path, recursive=recursive)
+    return asdict(summary)
 
 
 def delete_file(path: str):
@@ -62,6 +101,7 @@ def delete_file(path: str):
     """
     path_obj = Path(path)
     path_obj.unlink(missing_ok=True)
+    fs_cache.invalidate(path)
 
 
 def delete_folder(path: str):
@@ -73,6 +113,7 @@ def delete_folder(path: str):
     """
     path_obj = Path(path)
     path_obj.rmdir()
+    fs_cache.invalidate(path, recursive=True)
 
 
 def is_valid_path(path: str) -> bool:
@@ -83,7 +124,7 @@ def is_valid_path(path: str) -> bool:
         path: absolute path that need to be checked (e.g. "/home/my_folder", "/usr/bin/my_bin")
 
     """
-    return True if Path(path).exists() else False
+    return fs_cache.exists(path)
 
 
 def list_dir(path: str) -> list[str]:
@@ -97,17 +138,15 @@ def list_dir(path: str) -> list[str]:
         list: list of files and directories (e.g. ['file1.txt', 'file2.txt', 'folder1', 'folder2']).
     """
 
-    return os.listdir(path)
+    return fs_cache.list_dir(path)
 
 
 OS_TOOLS = [
-    tool(f, parse_docstring=True) for f in (
-        create_file,
-        create_folder,
-        change_permissions,
-        list_dir,
-        is_valid_path,
-        delete_folder,
-        delete_file,
-    )
+    tool(create_file, parse_docstring=True),
+    tool(create_folder, parse_docstring=True),
+    tool(change_permissions, parse_docstring=True),
+    read_only(tool(list_dir, parse_docstring=True)),
+    read_only(tool(is_valid_path, parse_docstring=True)),
+    tool(delete_folder, parse_docstring=True),
+    tool(delete_file, parse_docstring=True),
 ]
@@ -0,0 +1,108 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+import os
+import stat
+
+
+BATCH_SIZE = 512
+MAX_FAILURES_REPORTED = 20
+
+
+@dataclass(eq=False, slots=True)
+class ChmodSummary:
+    changed: int = 0
+    """Entries whose mode was changed, or would be with `dry_run`"""
+    unchanged: int = 0
+    failed: int = 0
+    skipped_symlinks: int = 0
+    failures: list[tuple[str, str]] = field(default_factory=list)
+    """First `MAX_FAILURES_REPORTED` failed paths with their errors"""
+
+    def add(self, other: 'ChmodSummary'):
+        self.changed += other.changed
+        self.unchanged += other.unchanged
+        self.failed += other.failed
+        self.skipped_symlinks += other.skipped_symlinks
+        self.failures += other.failures[:MAX_FAILURES_REPORTED - len(self.failures)]
+
+    def fail(self, path: str, error: OSError):
+        self.failed += 1
+        if len(self.failures) < MAX_FAILURES_REPORTED:
+            self.failures.append((path, error.strerror or str(error)))
+
+
+def chmod_paths(paths: list[str], mode: int, dry_run: bool = False) -> ChmodSummary:
+    summary = ChmodSummary()
+    for path in paths:
+        try:
+            # The mode is checked first: an unchanged entry costs a stat, not a metadata write
+            if stat.S_IMODE(os.stat(path).st_mode) == mode:
+                summary.unchanged += 1
+                continue
+            if not dry_run:
+                os.chmod(path, mode)
+            summary.changed += 1
+        except OSError as e:
+            summary.fail(path, e)
+    return summary
+
+
+def chmod_tree(path: str, mode: int, dry_run: bool = False, max_workers: int = 8) -> ChmodSummary:
+    """
+    Change the mode of `path` and everything under it. One thread walks the tree with
+    `os.scandir` while the pool changes the files a batch at a time; at most a couple of
+    batches per worker are queued, so files take no memory beyond that. Directories
+    change last, deepest first, so a mode without search permission can't lock the walk
+    or the pool out of what is left: every directory path is kept until then, memory
+    grows with the number of directories. Symbolic links are skipped, `chmod` would
+    follow them
+    """
+    summary = ChmodSummary()
+    if os.path.islink(path):
+        summary.skipped_symlinks += 1
+        return summary
+    if not os.path.isdir(path):
+        return chmod_paths([path], mode, dry_run)
+
+    directories: list[list[str]] = []  # per depth
+    pending: deque[Future[ChmodSummary]] = deque()
+    batch: list[str] = []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chmod') as pool:
+
+        def submit(paths: list[str]):
+            pending.append(pool.submit(chmod_paths, paths, mode, dry_run))
+            while len(pending) > 2 * max_workers:
+                summary.add(pending.popleft().result())
+
+        level = [path]
+        while level:
+            directories.append(level)
+            next_level: list[str] = []
+            for directory in level:
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_symlink():
+                                summary.skipped_symlinks += 1
+                            elif entry.is_dir(follow_symlinks=False):
+                                next_level.append(entry.path)
+                            else:
+                                batch.append(entry.path)
+                                if len(batch) == BATCH_SIZE:
+                                    submit(batch)
+                                    batch = []
+                except OSError as e:
+                    summary.fail(directory, e)
+            level = next_level
+        if batch:
+            submit(batch)
+        while pending:
+            summary.add(pending.popleft().result())
+
+        for level in reversed(directories):
+            for start in range(0, len(level), BATCH_SIZE):
+                submit(level[start:start + BATCH_SIZE])
+            while pending:
+                summary.add(pending.popleft().result())
+    return summary
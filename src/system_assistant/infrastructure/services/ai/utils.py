@@ -3,9 +3,9 @@ from langchain_core.messages import HumanMessage, SystemMessage, BaseMessage
 from system_assistant.domain.vo import Message
 
 
-def to_langchain_message(message: Message) -> BaseMessage:
+def to_langchain_message(message: Message, id: str | None = None) -> BaseMessage:
     if message.sender == 'user':
-        return HumanMessage(content=message.content)
+        return HumanMessage(content=message.content, id=id)
     elif message.sender == 'assistant':
-        return SystemMessage(content=message.content)
+        return SystemMessage(content=message.content, id=id)
     raise TypeError
@@ -0,0 +1,46 @@
+import asyncio
+from importlib.util import find_spec
+import ssl
+
+import httpx
+from loguru import logger
+
+from system_assistant.core.config import Config
+
+
+def build_http_client(
+    config: Config,
+    verify: ssl.SSLContext | str | bool = True,
+) -> httpx.AsyncClient:
+    """
+    Async HTTP client shared by every provider client: connections to a host are kept
+    alive and reused, so only the first request pays for the TCP and TLS handshakes.
+    HTTP/2 multiplexes concurrent requests over one connection when `h2` is installed
+    """
+    http2 = config.http2 and find_spec('h2') is not None
+    return httpx.AsyncClient(
+        verify=verify,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=config.http_max_connections,
+            max_keepalive_connections=config.http_max_keepalive_connections,
+            keepalive_expiry=config.http_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(config.http_timeout, connect=10.0),
+    )
+
+
+async def prewarm(client: httpx.AsyncClient, urls: list[str]):
+    """
+    Open pooled connections to the hosts before the first real request needs them.
+    Any response will do, the connection is what counts; failures only cost the warm-up
+    """
+
+    async def warm(url: str):
+        try:
+            await client.head(url)
+        except httpx.HTTPError as e:
+            logger.debug(f'Failed to prewarm connection: url={url}, error={e!r}')
+
+    await asyncio.gather(*(warm(url) for url in urls))
+    logger.debug(f'Prewarmed connections: urls={urls}')
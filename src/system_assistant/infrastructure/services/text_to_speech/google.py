@@ -14,24 +14,32 @@ GOOGLE_TEXT_TO_SPEECH_BASE_URL = 'https://texttospeech.googleapis.com'
 
 
 class GoogleTextToSpeechService(BaseTextToSpeechService):
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        http_client: httpx.AsyncClient | None = None,
+        base_url: str = GOOGLE_TEXT_TO_SPEECH_BASE_URL,
+    ):
         self.__api_key = api_key
+        # Kept for the life of the service: a client per request would pay
+        # for a new TCP and TLS handshake with every spoken sentence
+        self._client = http_client or httpx.AsyncClient()
+        self._url = f'{base_url}/v1/text:synthesize'
 
     async def synthesize(self, text: str, output: Output) -> Speech:
-        async with httpx.AsyncClient(
-            base_url=GOOGLE_TEXT_TO_SPEECH_BASE_URL, params={'key': self.__api_key},
-        ) as client:
-            request_body = {
-                'input': {'text': text},
-                'voice': {'languageCode': 'en-US', 'ssmlGender': 'MALE'},
-                'audioConfig': {'audioEncoding': 'MP3'},
-            }
-            response = await client.post('/v1/text:synthesize', json=request_body)
-            data = response.json()
-            if not response.is_success:
-                logger.error(msg := f'Failed to convert text to speech: {data}')
-                raise UnexpectedApplicationException(msg)
-            audio_content = base64.b64decode(data['audioContent'])
+        request_body = {
+            'input': {'text': text},
+            'voice': {'languageCode': 'en-US', 'ssmlGender': 'MALE'},
+            'audioConfig': {'audioEncoding': 'MP3'},
+        }
+        response = await self._client.post(
+            self._url, params={'key': self.__api_key}, json=request_body,
+        )
+        data = response.json()
+        if not response.is_success:
+            logger.error(msg := f'Failed to convert text to speech: {data}')
+            raise UnexpectedApplicationException(msg)
+        audio_content = base64.b64decode(data['audioContent'])
 
         if output == 'bytes':
             return audio_content
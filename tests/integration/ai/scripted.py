@@ -0,0 +1,90 @@
+import asyncio
+import re
+from typing import Any, AsyncIterator
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import tool
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.prebuilt import create_react_agent
+
+from system_assistant.core.config import Config
+from system_assistant.infrastructure.services.ai.openai_agent import BaseReactOpenAIAgent
+from system_assistant.infrastructure.services.ai.tools import read_only
+
+
+TOKEN_DELAY = 0.01
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Streams prepared answers word by word, with a delay before every token"""
+    answers: list[AIMessage]
+    received: list[list[BaseMessage]] = []
+    """Messages of every request, as the model got them"""
+
+    @property
+    def _llm_type(self) -> str:
+        return 'scripted'
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> 'ScriptedChatModel':  # type: ignore
+        return self
+
+    def _generate(self, messages: list[BaseMessage], *args: Any, **kwargs: Any) -> ChatResult:
+        self.received.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=self.answers.pop(0))])
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        self.received.append(messages)
+        answer = self.answers.pop(0)
+        for token in re.split(r'(\s)', str(answer.content)):
+            await asyncio.sleep(TOKEN_DELAY)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, id=answer.id))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+        if answer.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content='',
+                id=answer.id,
+                tool_call_chunks=[
+                    {'name': call['name'], 'args': '{}', 'id': call['id'], 'index': i}
+                    for i, call in enumerate(answer.tool_calls)
+                ],
+            ))
+
+
+@read_only
+@tool
+def list_dir() -> list[str]:
+    """List current directory"""
+    return ['Dockerfile', 'compose.yaml']
+
+
+class ScriptedAgent(BaseReactOpenAIAgent):
+    model = 'scripted'
+
+    def __init__(
+        self,
+        answers: list[AIMessage],
+        tools: list,
+        memory_saver: BaseCheckpointSaver | None = None,
+    ):
+        self._answers = answers
+        super().__init__(Config(), tools=tools, memory_saver=memory_saver)
+
+    def build_agent(self, temperature: float, tools: list):
+        model = ScriptedChatModel(answers=self._answers)
+        self.chat_model = model
+        if tools:
+            return create_react_agent(
+                model, tools=self._tool_executor.node(tools), checkpointer=self._memory_saver,
+            )
+        return model
@@ -0,0 +1,108 @@
+import asyncio
+from dataclasses import dataclass, field
+import json
+
+
+@dataclass(eq=False)
+class StubOpenAIServer:
+    """
+    OpenAI-compatible chat completions endpoint on localhost. Streams `answer` word by word
+    after `delay` seconds, or answers with `status` when it isn't 200
+    """
+    answer: str
+    delay: float = 0.0
+    status: int = 200
+    requests: int = 0
+    answered: int = 0
+    disconnected: int = 0
+    """Requests whose client went away before the answer, e.g. a cancelled hedge"""
+    _server: asyncio.Server | None = field(default=None, repr=False)
+    _writers: set[asyncio.StreamWriter] = field(default_factory=set, repr=False)
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f'http://{host}:{port}/v1'
+
+    async def __aenter__(self) -> 'StubOpenAIServer':
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self
+
+    async def __aexit__(self, *args):
+        assert self._server is not None
+        self._server.close()
+        # Keep-alive connections of the client pool would keep the server open
+        for writer in self._writers:
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while await self._handle_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle_request(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+    ) -> bool:
+        head = await reader.readuntil(b'\r\n\r\n')
+        headers = dict(
+            line.split(': ', 1) for line in head.decode().split('\r\n')[1:] if ': ' in line
+        )
+        length = int({k.lower(): v for k, v in headers.items()}.get('content-length', 0))
+        json.loads(await reader.readexactly(length))
+        self.requests += 1
+
+        try:
+            # Anything read while waiting means the client closed the connection
+            await asyncio.wait_for(reader.read(1), self.delay)
+            self.disconnected += 1
+            return False
+        except asyncio.TimeoutError:
+            pass
+
+        if self.status != 200:
+            body = json.dumps({'error': {'message': 'Stub failure', 'type': 'stub'}}).encode()
+            writer.write(
+                f'HTTP/1.1 {self.status} Error\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+            )
+            await writer.drain()
+            return True
+
+        writer.write(
+            b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+            b'Transfer-Encoding: chunked\r\n\r\n'
+        )
+        words = self.answer.split(' ')
+        for i, word in enumerate(words):
+            self._send_event(writer, self._chunk(word if i == 0 else f' {word}'))
+        self._send_event(writer, self._chunk('', finish_reason='stop'))
+        self._send_event(writer, '[DONE]')
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+        self.answered += 1
+        return True
+
+    def _chunk(self, content: str, finish_reason: str | None = None) -> str:
+        return json.dumps({
+            'id': 'stub',
+            'object': 'chat.completion.chunk',
+            'created': 0,
+            'model': 'stub',
+            'choices': [{
+                'index': 0,
+                'delta': {'role': 'assistant', 'content': content},
+                'finish_reason': finish_reason,
+            }],
+        })
+
+    def _send_event(self, writer: asyncio.StreamWriter, data: str):
+        event = f'data: {data}\n\n'.encode()
+        writer.write(f'{len(event):x}\r\n'.encode() + event + b'\r\n')
@@ -0,0 +1,69 @@
+from langchain_core.messages import AIMessage
+import pytest
+
+from system_assistant.core.config import Config
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.services.ai.deepseek import DeepSeekOpenAIAgent
+from system_assistant.infrastructure.services.ai.gemini import GeminiOpenAIAgent
+
+from .scripted import ScriptedAgent, list_dir
+
+
+class CountingAgent(ScriptedAgent):
+    builds: int = 0
+
+    def build_agent(self, temperature: float, tools: list):
+        self.builds += 1
+        return super().build_agent(temperature, tools)
+
+
+def _chat() -> Chat:
+    return Chat(id='chat', title='title', messages=[
+        Message(sender='assistant', content='You are a system assistant'),
+        Message(sender='user', content='What is in this directory?'),
+    ])
+
+
+@pytest.mark.parametrize('agent_type', [DeepSeekOpenAIAgent, GeminiOpenAIAgent])
+def test_switching_back_to_previous_settings_reuses_built_agent(agent_type):
+    config = Config(_deepseek_api_key='key', _gemini_api_key='key')
+    agent = agent_type(config, tools=[list_dir], temperature=1.0)
+    initial = agent._agent
+
+    agent.update_settings(temperature=0)
+    assert agent._agent is not initial
+    agent.update_settings(temperature=1.0)
+    assert agent._agent is initial
+
+    agent.update_settings(tools=[])
+    agent.update_settings(tools=[list_dir])
+    assert agent._agent is initial
+
+
+def test_least_recently_used_agents_are_evicted():
+    agent = CountingAgent([], tools=[list_dir])
+    agent._agents.max_entries = 2
+
+    for temperature in (0.0, 0.5, 1.0, 0.5, 0.0):
+        agent.update_settings(temperature=temperature)
+
+    # 1.0 (initial), 0.0, 0.5 are built; 1.0 was evicted by then, 0.0 after it came back
+    assert agent.builds == 5
+    assert len(agent._agents) == 2
+
+
+@pytest.mark.asyncio
+async def test_per_request_settings_do_not_change_agent_settings():
+    agent = CountingAgent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i}') for i in range(3)], tools=[list_dir],
+    )
+
+    # Every built model has its own copy of the script: one model answered both overrides
+    answers = [(await agent.chat(_chat(), temperature=0, tools=[]))['content'] for _ in range(2)]
+    await agent.chat(_chat())
+
+    assert answers == ['answer 0', 'answer 1']
+    assert agent.temperature == 1.0
+    assert agent.tools == [list_dir]
+    assert agent.builds == 2
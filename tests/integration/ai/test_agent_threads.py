@@ -0,0 +1,158 @@
+from langchain_core.messages import AIMessage
+from langchain_core.runnables.config import RunnableConfig
+import pytest
+
+from system_assistant.application.gateways.chat import InMemoryChatGateway
+from system_assistant.application.services.ai.base import LLM
+from system_assistant.application.services.ai.context import ContextWindowManager, count_tokens
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.services.ai.checkpoint import BoundedMemorySaver
+
+from .scripted import ScriptedAgent, list_dir
+
+
+def _state_size(saver: BoundedMemorySaver, thread_id: str) -> int:
+    return sum(
+        len(blob[1]) for key, blob in saver.blobs.items() if key[0] == thread_id
+    ) + sum(
+        len(saved[0][1]) for saved in saver.storage[thread_id][''].values()
+    )
+
+
+@pytest.mark.asyncio
+async def test_thread_state_grows_linearly():
+    turns = 40
+    saver = BoundedMemorySaver()
+    agent = ScriptedAgent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i}') for i in range(turns)],
+        tools=[list_dir],
+        memory_saver=saver,
+    )
+    gateway = InMemoryChatGateway()
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+    config = RunnableConfig(configurable={'thread_id': chat.id})
+
+    sizes = {}
+    for i in range(1, turns + 1):
+        chat.add_message(Message(sender='user', content=f'question {i}'))
+        answer = await agent.chat(chat)
+        chat.add_message(Message(sender='assistant', content=answer['content']))
+        await gateway.save(chat)
+
+        state = await agent._agent.aget_state(config)  # type: ignore
+        # Only the new question is sent: prompt + question and answer per turn
+        assert len(state.values['messages']) == 1 + 2 * i
+        sizes[i] = _state_size(saver, chat.id)
+
+    print(f'Checkpointed state size by turn: {sizes[10]=}, {sizes[20]=}, {sizes[40]=}')
+    assert len(saver.storage[chat.id]['']) == saver.max_checkpoints
+    # Quadratic growth would be ~4x
+    assert sizes[40] / sizes[20] < 2.5
+
+
+class SummarizingLLM(LLM):
+    async def make_request(self, text: str) -> str:
+        return 'summary'
+
+
+@pytest.mark.asyncio
+async def test_model_gets_only_the_fitted_context():
+    turns = 30
+    agent = ScriptedAgent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i}') for i in range(turns)],
+        tools=[list_dir],
+    )
+    manager = ContextWindowManager(SummarizingLLM(), max_tokens=1000)
+    gateway = InMemoryChatGateway()
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+
+    for i in range(turns):
+        chat.add_message(Message(sender='user', content=f'question {i} ' + 'word ' * 100))
+        context = await manager.fit(chat)
+        expected = [m.content for m in context.messages]
+        answer = await agent.chat(context)
+        received = agent.chat_model.received[-1]
+        assert [m.content for m in received] == expected
+
+        chat.add_message(Message(sender='assistant', content=answer['content']))
+        await gateway.save(chat)
+        if await manager.summarize(chat):
+            await gateway.save(chat)
+    # The thread was cut to the window, the last request carries the summary
+    assert received[1].content.endswith('summary')
+    assert sum(count_tokens(Message(sender='user', content=m.text())) for m in received) <= 1000
+
+
+@pytest.mark.asyncio
+async def test_thread_is_trimmed_as_history_window_slides():
+    turns = 10
+    agent = ScriptedAgent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i}') for i in range(turns)],
+        tools=[list_dir],
+    )
+    gateway = InMemoryChatGateway()
+    config = RunnableConfig(configurable={'thread_id': 'chat'})
+
+    for i in range(turns):
+        chat = await gateway.get_window('chat', limit=4) or Chat(
+            id='chat', title='title', messages=[Message(sender='assistant', content='prompt')],
+        )
+        chat.add_message(Message(sender='user', content=f'question {i}'))
+        expected = [m.content for m in chat.messages]
+        answer = await agent.chat(chat)
+        assert [m.content for m in agent.chat_model.received[-1]] == expected
+        chat.add_message(Message(sender='assistant', content=answer['content']))
+        await gateway.save(chat)
+
+    state = await agent._agent.aget_state(config)  # type: ignore
+    assert [m.content for m in state.values['messages']] == [m.content for m in chat.messages]
+    # Trimmed, not replaced: the answers are still the model's own messages
+    assert [type(m) for m in state.values['messages'][2::2]] == [AIMessage] * 3
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_threads_are_evicted():
+    saver = BoundedMemorySaver(max_threads=2)
+    agent = ScriptedAgent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i}') for i in range(4)],
+        tools=[list_dir],
+        memory_saver=saver,
+    )
+    chats = [
+        Chat(id=f'chat-{i}', title='title', messages=[Message(sender='user', content='hi')])
+        for i in range(3)
+    ]
+    await agent.chat(chats[0])
+    await agent.chat(chats[1])
+    await agent.chat(chats[0])
+    await agent.chat(chats[2])
+
+    assert set(saver.storage) == {'chat-0', 'chat-2'}
+    assert {key[0] for key in saver.blobs} == {'chat-0', 'chat-2'}
+    assert {key[0] for key in saver.writes} <= {'chat-0', 'chat-2'}
+
+
+@pytest.mark.asyncio
+async def test_interrupted_thread_is_replaced():
+    agent = ScriptedAgent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i} ' * 5) for i in range(2)],
+        tools=[list_dir],
+    )
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+    chat.add_message(Message(sender='user', content='question'))
+    config = RunnableConfig(configurable={'thread_id': chat.id})
+
+    # E.g. the request lost a hedged race and was cancelled mid-answer
+    chunks = agent.stream(chat)
+    await anext(chunks)
+    await chunks.aclose()
+    assert (await agent._agent.aget_state(config)).next  # type: ignore
+
+    answer = await agent.chat(chat)
+
+    state = await agent._agent.aget_state(config)  # type: ignore
+    assert [m.content for m in state.values['messages']] == [
+        'prompt', 'question', answer['content'],
+    ]
+    assert not state.next
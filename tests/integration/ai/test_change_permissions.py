@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+import stat
+import time
+
+import pytest
+
+from system_assistant.infrastructure.services.ai.tools.os import (
+    change_permissions,
+    create_file,
+    create_folder,
+)
+from system_assistant.infrastructure.services.ai.tools.permissions import chmod_tree
+
+
+def _mode(path: Path) -> int:
+    return stat.S_IMODE(path.lstat().st_mode)
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    root = tmp_path / 'project'
+    for i in range(3):
+        folder = root / f'folder-{i}' / 'nested'
+        folder.mkdir(parents=True)
+        for j in range(5):
+            (folder / f'file-{j}.txt').touch(0o644)
+    (root / 'top.txt').touch(0o644)
+    (tmp_path / 'outside.txt').touch(0o644)
+    (root / 'link').symlink_to(tmp_path / 'outside.txt')
+    os.chmod(root, 0o755)
+    return root
+
+
+def test_recursive_change_with_dry_run(tree: Path):
+    entries = 1 + 3 * (2 + 5) + 1
+
+    dry = change_permissions(str(tree), 700, recursive=True, dry_run=True)
+    assert dry['changed'] == entries
+    assert _mode(tree / 'top.txt') == 0o644
+
+    summary = change_permissions(str(tree), 700, recursive=True)
+    assert summary == {
+        'changed': entries, 'unchanged': 0, 'failed': 0, 'skipped_symlinks': 1, 'failures': [],
+    }
+    assert {_mode(p) for p in tree.rglob('*') if not p.is_symlink()} == {0o700}
+    # The link's target is outside the tree and stays as it was
+    assert _mode(tree.parent / 'outside.txt') == 0o644
+
+    assert change_permissions(str(tree), 700, recursive=True)['unchanged'] == entries
+
+
+def test_single_entry_and_failures(tree: Path):
+    assert change_permissions(str(tree / 'top.txt'), 600)['changed'] == 1
+    assert _mode(tree / 'top.txt') == 0o600
+
+    missing = change_permissions(str(tree / 'missing'), 600)
+    assert missing['failed'] == 1
+    assert missing['failures'][0][0] == str(tree / 'missing')
+
+    with pytest.raises(ValueError):
+        change_permissions(str(tree), 789)
+
+
+def test_directories_change_after_their_contents(tree: Path):
+    # Without search permission on the folders nothing under them could be changed later
+    summary = chmod_tree(str(tree), 0o600)
+
+    assert summary.failed == 0
+    assert _mode(tree / 'folder-0' / 'nested') == 0o600
+    os.chmod(tree, 0o700)
+    os.chmod(tree / 'folder-0', 0o700)
+    os.chmod(tree / 'folder-0' / 'nested', 0o700)
+    assert _mode(tree / 'folder-0' / 'nested' / 'file-0.txt') == 0o600
+
+
+def test_large_tree(tmp_path: Path):
+    for i in range(100):
+        folder = tmp_path / f'{i}'
+        folder.mkdir()
+        for j in range(200):
+            (folder / f'{j}').touch(0o644)
+
+    started_at = time.perf_counter()
+    summary = chmod_tree(str(tmp_path), 0o640)
+    elapsed = time.perf_counter() - started_at
+
+    assert (summary.changed, summary.failed) == (100 + 100 * 200 + 1, 0)
+    print(f'chmod of {summary.changed} entries: {elapsed * 1000:.0f}ms')
+
+
+def test_create_tools_take_the_same_modes(tmp_path: Path):
+    umask = os.umask(0)
+    try:
+        create_folder(str(tmp_path / 'folder'), permission_level=750)
+        create_file(str(tmp_path / 'folder' / 'file.txt'), permission_level=640)
+    finally:
+        os.umask(umask)
+
+    assert _mode(tmp_path / 'folder') == 0o750
+    assert _mode(tmp_path / 'folder' / 'file.txt') == 0o640
+    change_permissions(str(tmp_path / 'folder' / 'file.txt'), 600)
+    assert _mode(tmp_path / 'folder' / 'file.txt') == 0o600
+    with pytest.raises(ValueError):
+        create_file(str(tmp_path / 'other.txt'), permission_level=438)
@@ -0,0 +1,153 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from system_assistant.application.commands.request_system_help import (
+    RequestSystemHelpCommand,
+    RequestSystemHelpCommandHandler,
+)
+from system_assistant.application.gateways.chat import ChatGateway, InMemoryChatGateway
+from system_assistant.application.services.ai.base import LLM, FakeAIAgent
+from system_assistant.application.services.ai.context import ContextWindowManager, count_tokens
+from system_assistant.core.config import Config
+from system_assistant.core.types import SystemContext
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.db.sqlite.init import get_engine, init_db
+from system_assistant.infrastructure.gateways.chat.sqlite import SQLiteChatGateway
+
+
+class SummarizingLLM(LLM):
+    def __init__(self):
+        self.requests: list[str] = []
+
+    async def make_request(self, text: str) -> str:
+        self.requests.append(text)
+        return f'summary #{len(self.requests)}'
+
+
+def _turn(chat: Chat, i: int):
+    chat.add_message(Message(sender='user', content=f'question {i} ' + 'word ' * 50))
+    chat.add_message(Message(sender='assistant', content=f'answer {i} ' + 'word ' * 50))
+
+
+@pytest.mark.asyncio
+async def test_context_stays_within_budget_and_summary_is_incremental(tmp_path: Path):
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}')
+    await init_db(config)
+    gateway = SQLiteChatGateway(get_engine(config))
+    llm = SummarizingLLM()
+    manager = ContextWindowManager(llm, max_tokens=500)
+
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+    for i in range(20):
+        _turn(chat, i)
+        context = await manager.fit(chat)
+        await gateway.save(chat)
+        assert sum(count_tokens(m) for m in context.messages) <= 500
+        if await manager.summarize(chat):
+            await gateway.save(chat)
+
+    context = await manager.fit(chat)
+    assert context.messages[0].content == 'prompt'
+    assert context.messages[1].content.endswith(f'summary #{len(llm.requests)}')
+    assert context.messages[-1] is chat.messages[-1]
+    # Every summarization request only carries the messages that left the window since the last one
+    assert sum(text.count('question') for text in llm.requests) < 20
+
+    loaded = await gateway.get_window('chat', limit=10)
+    assert loaded is not None
+    assert loaded.summary == chat.summary
+    assert loaded.summary_seq == chat.summary_seq
+    await gateway.close()
+
+
+@pytest.mark.asyncio
+async def test_short_chat_is_sent_as_is():
+    manager = ContextWindowManager(SummarizingLLM(), max_tokens=500)
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+    _turn(chat, 0)
+
+    assert await manager.fit(chat) is chat
+    assert all(message.tokens is not None for message in chat.messages)
+
+
+@pytest.mark.asyncio
+async def test_fit_does_not_wait_for_summary():
+    llm = SummarizingLLM()
+    manager = ContextWindowManager(llm, max_tokens=300)
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+    for i in range(5):
+        _turn(chat, i)
+    for seq, message in enumerate(chat.messages):
+        message.seq = seq
+
+    context = await manager.fit(chat)
+    assert llm.requests == []
+    assert sum(count_tokens(m) for m in context.messages) <= 300
+
+    assert await manager.summarize(chat)
+    assert len(llm.requests) == 1
+    assert (await manager.fit(chat)).messages[1].content.endswith('summary #1')
+
+
+@pytest.mark.asyncio
+async def test_messages_that_slide_out_of_history_window_are_summarized():
+    gateway = InMemoryChatGateway()
+    llm = SummarizingLLM()
+    # Every loaded window fits the budget, only `history_limit` leaves messages out
+    handler = RequestSystemHelpCommandHandler(
+        gateway,
+        FakeAIAgent(),
+        history_limit=4,
+        context_window=ContextWindowManager(llm, max_tokens=100_000),
+    )
+
+    for i in range(10):
+        await handler.handle(RequestSystemHelpCommand(
+            message=f'question {i}',
+            system_context=SystemContext(
+                operating_system='Linux', distribution='Debian', cwd=Path('/'),
+            ),
+            chat_id='chat',
+        ))
+        await asyncio.gather(*handler._summaries)
+
+    window = await gateway.get_window('chat', limit=4)
+    assert window is not None
+    first_seq, summary_seq = window.messages[1].seq, window.summary_seq
+    assert first_seq is not None and summary_seq is not None
+    # The summary trails the window by the last turn at most and skips no message
+    assert first_seq - summary_seq <= 3
+    summarized = '\n'.join(llm.requests)
+    assert all(f'user: question {i}\n' in summarized for i in range((summary_seq + 1) // 2))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('storage', ['memory', 'sqlite'])
+async def test_stale_chat_does_not_overwrite_newer_summary(storage: str, tmp_path: Path):
+    gateway: ChatGateway
+    if storage == 'sqlite':
+        config = Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}')
+        await init_db(config)
+        gateway = SQLiteChatGateway(get_engine(config))
+    else:
+        gateway = InMemoryChatGateway()
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+    for i in range(5):
+        _turn(chat, i)
+    await gateway.save(chat)
+
+    # The next turn loads the chat before the summary of the last one is saved
+    stale = await gateway.get_window('chat', limit=4)
+    assert stale is not None
+    chat.summary, chat.summary_seq = 'summary up to 8', 8
+    await gateway.save(chat)
+    _turn(stale, 5)
+    await gateway.save(stale)
+
+    loaded = await gateway.get_window('chat', limit=4)
+    assert loaded is not None
+    assert (loaded.summary, loaded.summary_seq) == ('summary up to 8', 8)
+    await gateway.close()
@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+import time
+
+from system_assistant.application.services.ai.prompts import construct_system_assistant_prompt
+from system_assistant.core.digest import DirectoryDigest
+
+
+def _age(path: Path, seconds: float = 3600):
+    # Old enough for the cached digest to be trusted
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_digest_is_bounded_and_ranked(tmp_path: Path):
+    for i in range(5000):
+        (tmp_path / f'log-{i:05}-{"x" * 100}.txt').touch()
+    for name in ('src', 'tests', '.git'):
+        (tmp_path / name).mkdir()
+    for name in ('Dockerfile', 'docker-compose.yaml', 'readme.md', '.bashrc'):
+        (tmp_path / name).touch()
+
+    digest = DirectoryDigest(tmp_path, max_entries=10).render()
+    lines = digest.splitlines()
+
+    assert lines[0] == '3 folders, 5004 files (2 hidden)'
+    assert 'File types: .txt 5000' in digest
+    assert lines[2] == 'Notable: .git/, docker-compose.yaml, Dockerfile, readme.md'
+    assert lines[3].startswith('Entries: src/, tests/, log-')
+    assert lines[4].startswith('... 4993 more entries not shown')
+    assert len(digest) < 2000
+
+    prompt = construct_system_assistant_prompt('Linux', 'Debian', tmp_path)
+    assert lines[2] in prompt
+    assert len(prompt) < 6000
+
+
+def test_digest_is_cached_and_refreshed_incrementally(tmp_path: Path):
+    for i in range(100):
+        (tmp_path / f'{i}.py').touch()
+    _age(tmp_path)
+    digest = DirectoryDigest(tmp_path)
+
+    first = digest.render()
+    assert digest.render() is first
+    assert (digest.scans, digest.stats) == (1, 100)
+
+    (tmp_path / 'Dockerfile').touch()
+    _age(tmp_path, 1800)
+    second = digest.render()
+
+    assert 'Notable: Dockerfile' in second
+    # Only the new entry was looked at closely
+    assert (digest.scans, digest.stats) == (2, 101)
+
+
+def test_missing_and_empty_directories(tmp_path: Path):
+    assert DirectoryDigest(tmp_path).render() == 'Empty folder'
+    assert DirectoryDigest(tmp_path / 'missing').render().startswith("Can't be read")
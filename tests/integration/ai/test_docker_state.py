@@ -0,0 +1,155 @@
+import queue
+import time
+from typing import Any
+
+import docker.errors  # type: ignore[import-untyped]
+
+from system_assistant.infrastructure.services.ai.tools.docker_state import (
+    DockerState, container_from_attrs,
+)
+
+
+DROP = object()
+
+
+class Events:
+    def __init__(self):
+        self.queue: queue.Queue[Any] = queue.Queue()
+
+    def __iter__(self):
+        while (event := self.queue.get()) is not None:
+            if event is DROP:
+                raise ConnectionError('Daemon went away')
+            yield event
+
+    def close(self):
+        self.queue.put(None)
+
+
+class FakeAPI:
+    """The part of `docker.APIClient` the state uses, counting the calls that reach it"""
+
+    def __init__(self):
+        self.containers_by_id: dict[str, dict[str, Any]] = {}
+        self.images_by_id: dict[str, dict[str, Any]] = {}
+        self.calls = 0
+        self.streams: list[Events] = []
+
+    def run(self, id: str, name: str, state: str = 'running'):
+        self.containers_by_id[id] = {
+            'Id': id, 'Names': [f'/{name}'], 'Image': 'app', 'State': state, 'Status': 'Up',
+        }
+
+    def containers(self, all: bool = False, filters: dict | None = None) -> list[dict]:
+        self.calls += 1
+        return [
+            c for c in self.containers_by_id.values()
+            if (all or c['State'] == 'running') and (not filters or c['Id'] == filters['id'])
+        ]
+
+    def images(self) -> list[dict]:
+        self.calls += 1
+        return list(self.images_by_id.values())
+
+    def inspect_container(self, id: str) -> dict:
+        self.calls += 1
+        c = self.containers_by_id.get(id)
+        if c is None:
+            raise docker.errors.NotFound('No such container')
+        return {
+            'Id': id, 'Name': c['Names'][0], 'Config': {'Image': c['Image']},
+            'State': {'Status': c['State']},
+        }
+
+    def inspect_image(self, ref: str) -> dict:
+        self.calls += 1
+        if ref not in self.images_by_id:
+            raise docker.errors.NotFound('No such image')
+        return self.images_by_id[ref]
+
+    def events(self, decode: bool = False) -> Events:
+        stream = Events()
+        self.streams.append(stream)
+        return stream
+
+    def emit(self, type: str, action: str, id: str):
+        self.streams[-1].queue.put({'Type': type, 'Action': action, 'Actor': {'ID': id}})
+
+
+class FakeClient:
+    def __init__(self):
+        self.api = FakeAPI()
+
+
+def _wait(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Condition not met in time'
+        time.sleep(0.005)
+
+
+def test_queries_are_answered_from_memory_and_follow_events():
+    client = FakeClient()
+    client.api.run('a1', 'web')
+    state = DockerState(client, reconnect_delay=0.01)  # type: ignore[arg-type]
+    state.start()
+    _wait(lambda: state.live)
+
+    calls = client.api.calls
+    for _ in range(1000):
+        assert [c['name'] for c in state.containers()] == ['web']
+        assert state.container('web')['id'] == 'a1'  # type: ignore[index]
+    assert client.api.calls == calls
+
+    client.api.run('b2', 'db')
+    client.api.emit('container', 'start', 'b2')
+    _wait(lambda: len(state.containers()) == 2)
+
+    client.api.containers_by_id['a1']['State'] = 'exited'
+    client.api.emit('container', 'die', 'a1')
+    _wait(lambda: [c['name'] for c in state.containers()] == ['db'])
+    assert state.container('a1')['state'] == 'exited'  # type: ignore[index]
+
+    del client.api.containers_by_id['a1']
+    client.api.emit('container', 'destroy', 'a1')
+    _wait(lambda: state.container('a1') is None)
+    state.close()
+
+
+def test_dropped_stream_falls_back_to_daemon_and_reseeds():
+    client = FakeClient()
+    client.api.run('a1', 'web')
+    state = DockerState(client, reconnect_delay=0.2)  # type: ignore[arg-type]
+    state.start()
+    _wait(lambda: state.live)
+
+    client.api.streams[-1].queue.put(DROP)
+    _wait(lambda: not state.live)
+    # Missed while the stream is down, still seen through direct calls
+    client.api.run('b2', 'db')
+    calls = client.api.calls
+    assert len(state.containers()) == 2
+    assert client.api.calls == calls + 1
+
+    _wait(lambda: state.live)
+    assert len(client.api.streams) == 2
+    assert len(state.containers()) == 2
+    state.close()
+
+
+def test_tools_record_their_changes_before_the_event_arrives():
+    client = FakeClient()
+    state = DockerState(client)  # type: ignore[arg-type]
+    state.start()
+    _wait(lambda: state.live)
+
+    client.api.run('c3', 'worker')
+    state.record_container(container_from_attrs(client.api.inspect_container('c3')))
+    state.record_image({'id': 'sha:1', 'tags': ['app:latest']})
+    state.record_image({'id': 'sha:2', 'tags': ['app:latest']})
+
+    assert [c['name'] for c in state.containers()] == ['worker']
+    assert state.images() == [
+        {'id': 'sha:1', 'tags': []}, {'id': 'sha:2', 'tags': ['app:latest']},
+    ]
+    state.close()
@@ -0,0 +1,120 @@
+import asyncio
+from contextlib import aclosing
+import os
+import sys
+import threading
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+import pytest
+
+from system_assistant.infrastructure.services.ai.tools import report_output, with_timeout
+from system_assistant.infrastructure.services.ai.tools.docker_stream import (
+    iterate_in_thread, run_streaming,
+)
+from system_assistant.infrastructure.services.ai.tools.executor import ToolExecutor, ToolProgress
+
+
+LOG = 'import time\nfor i in range(3):\n    print(f"step {i}", flush=True)\n    time.sleep(0.2)'
+
+
+@pytest.mark.asyncio
+async def test_command_output_is_streamed_while_it_runs():
+    received: list[tuple[str, float]] = []
+    started_at = time.perf_counter()
+
+    result = await run_streaming(
+        sys.executable, '-c', LOG,
+        on_line=lambda line: received.append((line, time.perf_counter() - started_at)),
+    )
+
+    assert result.returncode == 0
+    assert [line for line, _ in received] == ['step 0', 'step 1', 'step 2']
+    # The first line arrived long before the command finished
+    assert received[0][1] < received[2][1] - 0.3
+
+
+@pytest.mark.asyncio
+async def test_only_output_tail_is_kept():
+    lines: list[str] = []
+
+    result = await run_streaming(
+        sys.executable, '-c', 'for i in range(1000): print(i)', on_line=lines.append, tail=5,
+    )
+
+    assert len(lines) == 1000
+    assert result.output == ['995', '996', '997', '998', '999']
+
+
+@pytest.mark.asyncio
+async def test_cancelled_command_is_terminated():
+    lines: list[str] = []
+    task = asyncio.create_task(run_streaming(
+        sys.executable, '-c', 'import os, time\nprint(os.getpid(), flush=True)\ntime.sleep(60)',
+        on_line=lines.append,
+    ))
+    while not lines:
+        await asyncio.sleep(0.01)
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    with pytest.raises(ProcessLookupError):
+        os.kill(int(lines[0]), 0)
+
+
+@pytest.mark.asyncio
+async def test_thread_is_stopped_when_consumer_leaves():
+    stopped = threading.Event()
+
+    def items():
+        for i in range(1000):
+            if stopped.wait(0.01):
+                return
+            yield i
+
+    async with aclosing(iterate_in_thread(items, stopped.set)) as chunks:
+        async for item in chunks:
+            if item == 2:
+                break
+
+    assert stopped.is_set()
+
+
+cancelled = asyncio.Event()
+
+
+async def _build(seconds: float) -> str:
+    """Build something"""
+    try:
+        for i in range(int(seconds / 0.05)):
+            report_output(f'layer {i}')
+            await asyncio.sleep(0.05)
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
+    return 'Built'
+
+
+build = with_timeout(tool('build')(_build), 0.3)
+
+
+@pytest.mark.asyncio
+async def test_async_tool_reports_output_and_is_cancelled_on_timeout():
+    progress: list[ToolProgress] = []
+    executor = ToolExecutor(on_progress=progress.append)
+    node = executor.node([build])
+
+    started_at = time.perf_counter()
+    result = await node.ainvoke({'messages': [AIMessage(content='', tool_calls=[
+        {'name': 'build', 'args': {'seconds': 5}, 'id': 'call-0'},
+    ])]})
+
+    assert time.perf_counter() - started_at < 1
+    assert cancelled.is_set()
+    assert 'did not finish in' in result['messages'][0].content
+    lines = [p.line for p in progress if p.status == 'output']
+    assert lines[:3] == ['layer 0', 'layer 1', 'layer 2']
+    assert executor.stats['build'].timeouts == 1
@@ -0,0 +1,102 @@
+import os
+from pathlib import Path
+import time
+
+import pytest
+
+from system_assistant.infrastructure.services.ai.tools.find import (
+    FileFinder, PathIndex, build_find_files_tool,
+)
+
+
+@pytest.fixture
+def tree(tmp_path: Path) -> Path:
+    files = {
+        'Dockerfile': 'FROM python:3.12',
+        'docker-compose.yaml': 'services: {}',
+        'src/app/main.py': 'print("hello")\n' * 100,
+        'src/app/util.py': 'TODO = 1',
+        'src/app/deep/er/still/notes.txt': 'TODO: write',
+        'node_modules/pkg/index.py': 'TODO',
+        '.git/config.py': 'TODO',
+        '.hidden/secret.py': 'TODO',
+        'build/out.py': 'TODO',
+        'data.bin': '\0TODO',
+    }
+    for name, content in files.items():
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    (tmp_path / '.gitignore').write_text('# build output\nbuild/\n')
+    return tmp_path
+
+
+def _paths(tree: Path, result) -> set[str]:
+    return {str(Path(m['path']).relative_to(tree)) for m in result.matches}
+
+
+def test_filters(tree: Path):
+    finder = FileFinder()
+
+    assert _paths(tree, finder.find(str(tree), name='*.PY')) == {
+        'src/app/main.py', 'src/app/util.py',
+    }
+    assert _paths(tree, finder.find(str(tree), name='docker*')) == {
+        'Dockerfile', 'docker-compose.yaml',
+    }
+    assert _paths(tree, finder.find(str(tree), name='*.py', min_size=1000)) == {'src/app/main.py'}
+    assert _paths(tree, finder.find(str(tree), contains='TODO')) == {
+        'src/app/util.py', 'src/app/deep/er/still/notes.txt',
+    }
+    assert 'build/out.py' in _paths(tree, finder.find(str(tree), include_ignored=True))
+    assert '.hidden/secret.py' in _paths(tree, finder.find(str(tree), include_hidden=True))
+
+    old = time.time() - 3600
+    os.utime(tree / 'Dockerfile', (old, old))
+    recent = finder.find(str(tree), name='Dockerfile', modified_after=time.time() - 60)
+    assert recent.matches == []
+
+
+def test_caps(tree: Path):
+    finder = FileFinder()
+
+    shallow = finder.find(str(tree), max_depth=2)
+    assert 'src/app/deep/er/still/notes.txt' not in _paths(tree, shallow)
+    assert shallow.truncated
+
+    capped = finder.find(str(tree), max_results=2)
+    assert len(capped.matches) == 2
+    assert capped.truncated
+    # Breadth first: the files next to the root come first
+    assert _paths(tree, capped) <= {'Dockerfile', 'docker-compose.yaml', 'data.bin'}
+
+
+def test_persistent_index_rescans_only_changed_directories(tree: Path, tmp_path_factory):
+    index_path = tmp_path_factory.mktemp('index') / 'index.json'
+    # Timestamps well before the scan, so the index may trust them
+    old = time.time() - 3600
+    for directory, _, _ in os.walk(tree):
+        os.utime(directory, (old, old))
+
+    first = FileFinder(index=PathIndex(tree, index_path))
+    assert len(first.find(str(tree), name='*.py').matches) == 2
+    assert first.index is not None and first.index.hits == 0
+    assert index_path.exists()
+
+    (tree / 'src' / 'app' / 'new.py').touch()
+    second = FileFinder(index=PathIndex(tree, index_path))
+    assert _paths(tree, second.find(str(tree), name='*.py')) == {
+        'src/app/main.py', 'src/app/util.py', 'src/app/new.py',
+    }
+    assert second.index is not None
+    assert second.index.misses == 1
+    assert second.index.hits == first.index.misses - 1
+
+
+def test_tool_searches_cwd_by_default(tree: Path):
+    find_files = build_find_files_tool(tree)
+
+    result = find_files.invoke({'name': 'main.py'})
+
+    assert [m['path'] for m in result['matches']] == [str(tree / 'src' / 'app' / 'main.py')]
+    assert result['truncated'] is False
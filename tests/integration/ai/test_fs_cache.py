@@ -0,0 +1,83 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from system_assistant.infrastructure.services.ai.tools import os as os_tools
+from system_assistant.infrastructure.services.ai.tools.fs_cache import FileSystemCache
+
+
+@pytest.fixture(params=[True, False], ids=['inotify', 'mtime'])
+def cache(request: pytest.FixtureRequest):
+    cache = FileSystemCache(use_inotify=request.param)
+    if request.param and cache._inotify is None:
+        pytest.skip('inotify is unavailable')
+    yield cache
+    cache.close()
+
+
+def test_results_are_reused_until_directory_changes(cache: FileSystemCache, tmp_path: Path):
+    (tmp_path / 'a.txt').touch()
+
+    assert cache.list_dir(str(tmp_path)) == ['a.txt']
+    assert cache.list_dir(str(tmp_path)) == ['a.txt']
+    assert cache.exists(str(tmp_path / 'b.txt')) is False
+    assert cache.exists(str(tmp_path / 'b.txt')) is False
+    assert cache.stats.hits == 2
+
+    # Changed behind the cache's back
+    os.mkdir(tmp_path / 'b.txt')
+    assert sorted(cache.list_dir(str(tmp_path))) == ['a.txt', 'b.txt']
+    assert cache.exists(str(tmp_path / 'b.txt')) is True
+
+    os.rmdir(tmp_path / 'b.txt')
+    assert cache.list_dir(str(tmp_path)) == ['a.txt']
+
+
+def test_entries_are_bounded_and_release_watches(cache: FileSystemCache, tmp_path: Path):
+    cache.max_entries = 2
+    folders = [tmp_path / str(i) for i in range(4)]
+    for folder in folders:
+        folder.mkdir()
+        cache.list_dir(str(folder))
+
+    assert len(cache._entries) == 2
+    assert cache.watches <= 2
+    assert cache.stats.evictions == 2
+
+
+def test_errors_are_not_cached(cache: FileSystemCache, tmp_path: Path):
+    missing = tmp_path / 'missing'
+    with pytest.raises(FileNotFoundError):
+        cache.list_dir(str(missing))
+
+    missing.mkdir()
+    assert cache.list_dir(str(missing)) == []
+    assert cache.watches <= 1
+
+
+def test_mutating_tools_invalidate(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    # Without inotify only the tools' own invalidation keeps the results fresh
+    cache = FileSystemCache(use_inotify=False)
+    monkeypatch.setattr(os_tools, 'fs_cache', cache)
+    monkeypatch.setattr(
+        'system_assistant.infrastructure.services.ai.tools.fs_cache._stat', lambda _: None,
+    )
+    folder = tmp_path / 'nested' / 'folder'
+
+    assert os_tools.is_valid_path(str(folder)) is False
+    assert os_tools.list_dir(str(tmp_path)) == []
+
+    os_tools.create_folder(str(folder), parents=True)
+    assert os_tools.is_valid_path(str(folder)) is True
+    assert os_tools.list_dir(str(tmp_path)) == ['nested']
+
+    os_tools.create_file(str(folder / 'file.txt'))
+    assert os_tools.list_dir(str(folder)) == ['file.txt']
+
+    os_tools.delete_file(str(folder / 'file.txt'))
+    assert os_tools.list_dir(str(folder)) == []
+
+    os_tools.delete_folder(str(folder))
+    assert os_tools.is_valid_path(str(folder)) is False
+    assert os_tools.list_dir(str(tmp_path / 'nested')) == []
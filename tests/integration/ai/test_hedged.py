@@ -0,0 +1,143 @@
+import time
+
+from langchain_core.tools import tool
+import pytest
+
+from system_assistant.core.config import Config
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.services.ai.deepseek import DeepSeekOpenAIAgent
+from system_assistant.infrastructure.services.ai.gemini import GeminiOpenAIAgent
+from system_assistant.infrastructure.services.ai.hedged import HedgedAIAgent, LatencyHistogram
+
+from .scripted import list_dir
+from .stub_openai import StubOpenAIServer
+
+
+def _chat(id: str = 'chat') -> Chat:
+    return Chat(id=id, title='title', messages=[
+        Message(sender='assistant', content='You are a system assistant'),
+        Message(sender='user', content='What is in this directory?'),
+    ])
+
+
+def _hedged(
+    deepseek: StubOpenAIServer,
+    gemini: StubOpenAIServer,
+    tools: list | None = None,
+    **kwargs,
+) -> HedgedAIAgent:
+    config = Config(
+        _deepseek_api_key='key',
+        _gemini_api_key='key',
+        deepseek_base_url=deepseek.url,
+        gemini_base_url=gemini.url,
+    )
+    return HedgedAIAgent(
+        [
+            DeepSeekOpenAIAgent(config, tools=tools or [], thread_namespace='deepseek'),
+            GeminiOpenAIAgent(config, tools=tools or [], thread_namespace='gemini'),
+        ],
+        **kwargs,
+    )
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for latency in [0.1] * 90 + [2.0] * 10:
+        histogram.observe(latency)
+
+    assert 0.1 <= histogram.percentile(0.5) < 0.13
+    assert 0.1 <= histogram.percentile(0.9) < 0.13
+    assert 2.0 <= histogram.percentile(0.95) < 2.4
+
+
+@pytest.mark.asyncio
+async def test_slow_provider_is_hedged_and_cancelled():
+    async with (
+        StubOpenAIServer('Slow answer', delay=2.0) as deepseek,
+        StubOpenAIServer('Fast answer', delay=0.05) as gemini,
+    ):
+        agent = _hedged(deepseek, gemini, default_delay=0.2)
+
+        started_at = time.perf_counter()
+        answer = await agent.chat(_chat())
+        elapsed = time.perf_counter() - started_at
+
+        assert answer['content'] == 'Fast answer'
+        assert elapsed < 1.0
+        assert (agent.stats.hedges, agent.stats.hedge_wins) == (1, 1)
+        assert deepseek.answered == 0
+        assert deepseek.disconnected == 1
+
+
+@tool
+def remove_file(path: str) -> str:
+    """Remove the file"""
+    return path
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('tools, hedges', [([list_dir], 1), ([list_dir, remove_file], 0)])
+async def test_only_requests_with_read_only_tools_are_hedged(tools: list, hedges: int):
+    async with (
+        StubOpenAIServer('Slow answer', delay=0.5) as deepseek,
+        StubOpenAIServer('Fast answer', delay=0.05) as gemini,
+    ):
+        agent = _hedged(deepseek, gemini, tools=tools, default_delay=0.1)
+
+        answer = await agent.chat(_chat())
+
+        # Both providers could call a tool that is not read-only
+        assert answer['content'] == ('Fast answer' if hedges else 'Slow answer')
+        assert agent.stats.hedges == hedges
+        assert gemini.requests == hedges
+
+
+@pytest.mark.asyncio
+async def test_hedge_threshold_follows_provider_latency():
+    async with (
+        StubOpenAIServer('DeepSeek answer', delay=0.05) as deepseek,
+        StubOpenAIServer('Gemini answer', delay=0.05) as gemini,
+    ):
+        agent = _hedged(deepseek, gemini, default_delay=10.0, min_samples=5)
+        for i in range(5):
+            assert (await agent.chat(_chat(f'chat-{i}')))['content'] == 'DeepSeek answer'
+        assert agent.stats.hedges == 0
+        threshold = agent.hedge_delay(agent.providers[0])
+        assert threshold < 1.0
+
+        # Ten times slower than usual: hedged long before the default delay
+        deepseek.delay = 1.5
+        answer = await agent.chat(_chat())
+
+        assert answer['content'] == 'Gemini answer'
+        assert agent.stats.hedges == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_provider_fails_over_and_is_skipped_when_open():
+    async with (
+        StubOpenAIServer('', status=400) as deepseek,
+        StubOpenAIServer('Gemini answer') as gemini,
+    ):
+        agent = _hedged(deepseek, gemini, failure_threshold=2, reset_timeout=60)
+
+        for i in range(4):
+            assert (await agent.chat(_chat(f'chat-{i}')))['content'] == 'Gemini answer'
+
+        assert agent.providers[0].breaker.state == 'open'
+        assert deepseek.requests == 2
+        assert agent.stats.failovers == 2
+
+
+@pytest.mark.asyncio
+async def test_every_provider_failing_raises():
+    async with (
+        StubOpenAIServer('', status=400) as deepseek,
+        StubOpenAIServer('', status=400) as gemini,
+    ):
+        agent = _hedged(deepseek, gemini)
+
+        with pytest.raises(Exception, match='Stub failure'):
+            await agent.chat(_chat())
@@ -0,0 +1,157 @@
+from pathlib import Path
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables.config import RunnableConfig
+from langchain_core.tools import tool
+import pytest
+
+from system_assistant.application.gateways.chat import InMemoryChatGateway
+from system_assistant.core.config import Config
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.db.sqlite.init import get_engine, init_db
+from system_assistant.infrastructure.services.ai.cached import CachedAIAgent
+from system_assistant.infrastructure.services.ai.checkpoint import BoundedMemorySaver
+
+from .scripted import ScriptedAgent, list_dir
+
+
+@tool
+def create_file() -> str:
+    """Create a file in current directory"""
+    return 'Created'
+
+
+def _chat(question: str, id: str = 'chat') -> Chat:
+    return Chat(id=id, title='title', messages=[
+        Message(sender='assistant', content='You are a system assistant'),
+        Message(sender='user', content=question),
+    ])
+
+
+def _agent(answers: list[AIMessage], tools: list | None = None, **kwargs) -> ScriptedAgent:
+    agent = ScriptedAgent(answers, tools=tools or [], **kwargs)
+    agent.update_settings(temperature=0)
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_repeated_question_is_answered_from_cache():
+    cached = CachedAIAgent(_agent([AIMessage(id='answer', content='A Dockerfile')]))
+
+    first = await cached.chat(_chat("What's in this folder?", id='first'))
+    second = await cached.chat(_chat("  what's in THIS folder? ", id='second'))
+
+    assert first['content'] == second['content'] == 'A Dockerfile'
+    assert second['chat_id'] == 'second'
+    assert (cached.stats.hits, cached.stats.misses) == (1, 1)
+    assert cached.stats.hit_rate == 0.5
+    assert cached.stats.saved_seconds > 0
+
+
+@pytest.mark.asyncio
+async def test_only_low_temperature_turns_are_cached():
+    agent = ScriptedAgent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i}') for i in range(2)], tools=[],
+    )
+    cached = CachedAIAgent(agent)
+
+    answers = [(await cached.chat(_chat('How do I list containers?')))['content'] for _ in range(2)]
+
+    assert answers == ['answer 0', 'answer 1']
+    assert (cached.stats.hits, cached.stats.bypasses) == (0, 2)
+
+
+@pytest.mark.asyncio
+async def test_turns_with_side_effects_are_not_cached():
+    def answers(tool_name: str, turn: int) -> list[AIMessage]:
+        return [
+            AIMessage(
+                id=f'call-{turn}',
+                content='',
+                tool_calls=[{'name': tool_name, 'args': {}, 'id': f'c-{turn}'}],
+            ),
+            AIMessage(id=f'answer-{turn}', content='Done'),
+        ]
+
+    cached = CachedAIAgent(_agent(
+        [*answers('create_file', 0), *answers('create_file', 1), *answers('list_dir', 2)],
+        tools=[list_dir, create_file],
+    ))
+
+    for _ in range(2):
+        await cached.chat(_chat('Create a file', id='create'))
+    for _ in range(2):
+        await cached.chat(_chat('List files', id='list'))
+
+    assert (cached.stats.hits, cached.stats.misses, cached.stats.bypasses) == (1, 3, 2)
+
+
+@pytest.mark.asyncio
+async def test_cache_is_persisted_and_expires(tmp_path: Path):
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}')
+    await init_db(config)
+    engine = get_engine(config)
+    engine.echo = False
+
+    cached = CachedAIAgent(_agent([AIMessage(id='answer', content='A Dockerfile')]), engine)
+    await cached.chat(_chat("What's in this folder?"))
+
+    # Restart with an empty provider script: a call would fail
+    restarted = CachedAIAgent(_agent([]), engine)
+    answer = await restarted.chat(_chat("What's in this folder?"))
+    assert answer['content'] == 'A Dockerfile'
+    assert restarted.stats.hits == 1
+
+    expired = CachedAIAgent(
+        _agent([AIMessage(id='answer', content='Two Dockerfiles')]), engine, ttl=0,
+    )
+    answer = await expired.chat(_chat("What's in this folder?"))
+    assert answer['content'] == 'Two Dockerfiles'
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_same_follow_up_after_different_history_is_not_shared():
+    cached = CachedAIAgent(_agent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i}') for i in range(4)],
+    ))
+
+    answers = []
+    for first_question in ('Which containers are running?', 'Which images are there?'):
+        chat = _chat(first_question, id=first_question)
+        chat.add_message(Message(sender='assistant', content='Two of them'))
+        chat.add_message(Message(sender='user', content='And the second one?'))
+        answers.append((await cached.chat(chat))['content'])
+
+    assert answers == ['answer 0', 'answer 1']
+    assert (cached.stats.hits, cached.stats.misses) == (0, 2)
+
+
+@pytest.mark.asyncio
+async def test_agent_thread_receives_cached_turns():
+    saver = BoundedMemorySaver()
+    agent = _agent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i}') for i in range(2)],
+        tools=[list_dir],
+        memory_saver=saver,
+    )
+    cached = CachedAIAgent(agent)
+    gateway = InMemoryChatGateway()
+    # Another chat asked the same question first, this one is answered from the cache
+    await cached.chat(_chat('question', id='other'))
+    chat = _chat('question')
+
+    for question in (None, 'other question'):
+        if question is not None:
+            chat.add_message(Message(sender='user', content=question))
+        answer = await cached.chat(chat)
+        chat.add_message(Message(sender='assistant', content=answer['content']))
+        await gateway.save(chat)
+
+    assert cached.stats.hits == 1
+    thread = saver.get_tuple(RunnableConfig(configurable={'thread_id': 'chat'}))
+    assert thread is not None
+    assert [m.content for m in thread.checkpoint['channel_values']['messages']] == [
+        'You are a system assistant', 'question', 'answer 0', 'other question', 'answer 1',
+    ]
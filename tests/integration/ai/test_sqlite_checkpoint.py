@@ -0,0 +1,72 @@
+from pathlib import Path
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables.config import RunnableConfig
+import pytest
+from sqlalchemy import func, select, text
+
+from system_assistant.core.config import Config
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.db.sqlite.init import get_engine, init_db
+from system_assistant.infrastructure.db.sqlite.tables import (
+    agent_checkpoint_blob_table,
+    agent_checkpoint_table,
+)
+from system_assistant.infrastructure.gateways.chat.sqlite import SQLiteChatGateway
+from system_assistant.infrastructure.services.ai.checkpoint import SQLiteCheckpointSaver
+
+from .scripted import ScriptedAgent, list_dir
+
+
+async def _turn(agent: ScriptedAgent, gateway: SQLiteChatGateway, chat: Chat, i: int):
+    chat.add_message(Message(sender='user', content=f'question {i}'))
+    answer = await agent.chat(chat)
+    chat.add_message(Message(sender='assistant', content=answer['content']))
+    await gateway.save(chat)
+
+
+@pytest.mark.asyncio
+async def test_resumed_session_continues_durable_thread(tmp_path: Path):
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}')
+    await init_db(config)
+    thread = RunnableConfig(configurable={'thread_id': 'chat'})
+
+    engine = get_engine(config)
+    engine.echo = False
+    gateway = SQLiteChatGateway(engine)
+    agent = ScriptedAgent(
+        [AIMessage(id=f'answer-{i}', content=f'answer {i}') for i in range(5)],
+        tools=[list_dir],
+        memory_saver=SQLiteCheckpointSaver(engine),
+    )
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+    for i in range(5):
+        await _turn(agent, gateway, chat, i)
+    async with engine.connect() as conn:
+        assert (await conn.execute(text('PRAGMA journal_mode'))).scalar() == 'wal'
+    await gateway.close()
+
+    # Restart: the thread is loaded from the database, only the new question is sent
+    engine = get_engine(config)
+    engine.echo = False
+    gateway = SQLiteChatGateway(engine)
+    saver = SQLiteCheckpointSaver(engine)
+    agent = ScriptedAgent(
+        [AIMessage(id='answer-5', content='answer 5')], tools=[list_dir], memory_saver=saver,
+    )
+    chat = await gateway.get_window('chat', limit=50)
+    assert chat is not None
+    await _turn(agent, gateway, chat, 5)
+
+    state = await agent._agent.aget_state(thread)  # type: ignore
+    assert [m.content for m in state.values['messages']] == [
+        'prompt', *(text for i in range(6) for text in (f'question {i}', f'answer {i}')),
+    ]
+    async with engine.connect() as conn:
+        checkpoints = await conn.scalar(select(func.count()).select_from(agent_checkpoint_table))
+        blobs = await conn.scalar(select(func.count()).select_from(agent_checkpoint_blob_table))
+    # Only the latest checkpoints and the channel values they reference are kept
+    assert checkpoints == saver.max_checkpoints
+    assert blobs < 20
+    await gateway.close()
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from system_assistant.application.commands.request_system_help import (
+    RequestSystemHelpCommand,
+    RequestSystemHelpCommandHandler,
+)
+from system_assistant.application.gateways.chat import InMemoryChatGateway
+from system_assistant.application.mediator import Mediator
+from system_assistant.core.types import AIAnswer, SystemContext
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+
+from .scripted import ScriptedAgent, list_dir
+
+
+def _chat() -> Chat:
+    return Chat(id='chat', title='title', messages=[
+        Message(sender='assistant', content='You are a system assistant'),
+        Message(sender='user', content='What is in this directory?'),
+    ])
+
+
+@pytest.mark.asyncio
+async def test_react_agent_streams_tokens_through_tool_calls():
+    agent = ScriptedAgent(
+        [
+            AIMessage(
+                id='call',
+                content='Let me look.',
+                tool_calls=[{'name': 'list_dir', 'args': {}, 'id': 'call-1'}],
+            ),
+            AIMessage(id='answer', content='There is a Dockerfile and a compose file'),
+        ],
+        tools=[list_dir],
+    )
+
+    chunks = [chunk async for chunk in agent.stream(_chat())]
+
+    assert ''.join(chunks) == 'Let me look.\n\nThere is a Dockerfile and a compose file'
+    assert len(chunks) > 10
+
+
+@pytest.mark.asyncio
+async def test_plain_model_answer_is_assembled_from_stream():
+    agent = ScriptedAgent([AIMessage(id='answer', content='Nothing to see here')], tools=[])
+
+    answer = await agent.chat(_chat())
+
+    assert answer == AIAnswer(chat_id='chat', is_successful=True, content='Nothing to see here')
+
+
+@pytest.mark.asyncio
+async def test_first_token_arrives_before_generation_ends_and_answer_is_saved():
+    content = ' '.join(f'word{i}' for i in range(30))
+    agent = ScriptedAgent([AIMessage(id='answer', content=content)], tools=[])
+    gateway = InMemoryChatGateway()
+    mediator = Mediator()
+    mediator.register_handlers(
+        RequestSystemHelpCommand, [RequestSystemHelpCommandHandler(gateway, agent)],
+    )
+
+    started_at = time.perf_counter()
+    first_chunk_at = None
+    chunks = []
+    async for chunk in mediator.stream_command(RequestSystemHelpCommand(
+        message='Say 30 words',
+        system_context=SystemContext.default(),
+        chat_id='chat',
+    )):
+        first_chunk_at = first_chunk_at or time.perf_counter()
+        chunks.append(chunk)
+    finished_at = time.perf_counter()
+
+    assert first_chunk_at is not None
+    time_to_first_chunk = first_chunk_at - started_at
+    print(
+        f'First chunk after {time_to_first_chunk * 1000:.0f}ms, '
+        f'whole answer after {(finished_at - started_at) * 1000:.0f}ms'
+    )
+    assert time_to_first_chunk < (finished_at - started_at) / 10
+    assert ''.join(chunks) == content
+    chat = await gateway.get_by_id('chat')
+    assert chat is not None
+    assert [(m.sender, m.content) for m in chat.messages[-2:]] == [
+        ('user', 'Say 30 words'), ('assistant', content),
+    ]
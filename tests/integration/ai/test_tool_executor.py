@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+import pytest
+
+from system_assistant.infrastructure.services.ai.tools import read_only, with_timeout
+from system_assistant.infrastructure.services.ai.tools.executor import ToolExecutor, ToolProgress
+
+
+DELAY = 0.3
+events: list[tuple[str, str, float]] = []
+
+
+@read_only
+@tool
+def disk_usage(path: str) -> str:
+    """Disk usage of the path"""
+    events.append(('start', f'disk_usage {path}', time.perf_counter()))
+    time.sleep(DELAY)
+    events.append(('end', f'disk_usage {path}', time.perf_counter()))
+    return '1G'
+
+
+@tool
+def create_file(path: str) -> str:
+    """Create a file"""
+    events.append(('start', f'create_file {path}', time.perf_counter()))
+    time.sleep(DELAY)
+    events.append(('end', f'create_file {path}', time.perf_counter()))
+    return 'Created'
+
+
+def _hang() -> str:
+    """Never finishes in time"""
+    time.sleep(1)
+    return 'Too late'
+
+
+hang = with_timeout(read_only(tool('hang')(_hang)), 0.1)
+
+
+def _calls(*calls: tuple[str, dict]) -> dict:
+    return {'messages': [AIMessage(content='', tool_calls=[
+        {'name': name, 'args': args, 'id': f'call-{i}'} for i, (name, args) in enumerate(calls)
+    ])]}
+
+
+@pytest.fixture(autouse=True)
+def clear_events():
+    events.clear()
+
+
+@pytest.mark.asyncio
+async def test_read_only_calls_run_concurrently_off_the_loop():
+    progress: list[ToolProgress] = []
+    node = ToolExecutor(on_progress=progress.append).node([disk_usage])
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    started_at = time.perf_counter()
+    result = await node.ainvoke(_calls(*(('disk_usage', {'path': f'/{i}'}) for i in range(4))))
+    elapsed = time.perf_counter() - started_at
+    ticker.cancel()
+
+    assert [m.content for m in result['messages']] == ['1G'] * 4
+    assert elapsed < 2 * DELAY
+    # The loop kept running while the tools were
+    assert ticks > DELAY / 0.01 / 2
+    assert [p.status for p in progress].count('finished') == 4
+
+
+@pytest.mark.asyncio
+async def test_mutating_calls_run_alone_in_order():
+    node = ToolExecutor().node([disk_usage, create_file])
+
+    result = await node.ainvoke(_calls(
+        ('disk_usage', {'path': '/a'}),
+        ('disk_usage', {'path': '/b'}),
+        ('create_file', {'path': '/a/file'}),
+        ('disk_usage', {'path': '/a'}),
+    ))
+
+    assert [m.tool_call_id for m in result['messages']] == [f'call-{i}' for i in range(4)]
+    order = [(kind, name) for kind, name, _ in sorted(events, key=lambda e: e[2])]
+    assert order[4:] == [
+        ('start', 'create_file /a/file'),
+        ('end', 'create_file /a/file'),
+        ('start', 'disk_usage /a'),
+        ('end', 'disk_usage /a'),
+    ]
+    assert {name for _, name in order[:2]} == {'disk_usage /a', 'disk_usage /b'}
+
+
+@pytest.mark.asyncio
+async def test_timed_out_call_returns_error_without_waiting():
+    progress: list[ToolProgress] = []
+    executor = ToolExecutor(timeout=10, on_progress=progress.append)
+    node = executor.node([hang, disk_usage])
+
+    started_at = time.perf_counter()
+    result = await node.ainvoke(_calls(('hang', {}), ('disk_usage', {'path': '/'})))
+
+    assert time.perf_counter() - started_at < 1
+    hung, usage = result['messages']
+    assert hung.status == 'error'
+    assert 'did not finish in' in hung.content
+    assert usage.content == '1G'
+    assert ('hang', 'timed out') in [(p.tool, p.status) for p in progress]
+    assert executor.stats['hang'].timeouts == 1
+    assert executor.stats['disk_usage'].calls == 1
+    assert executor.stats['disk_usage'].mean_seconds >= DELAY
@@ -0,0 +1,64 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+from system_assistant.core.config import Config
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.db.sqlite.init import get_engine, init_db
+from system_assistant.infrastructure.gateways.chat.sqlite import SQLiteChatGateway
+
+
+async def _build_sqlite_gateway(path: Path) -> SQLiteChatGateway:
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{path}')
+    await init_db(config)
+    engine = get_engine(config)
+    engine.echo = False
+    return SQLiteChatGateway(engine)
+
+
+def _run_cli(database: Path, *args: str) -> subprocess.CompletedProcess:
+    # A process of its own: the config reads the environment once, on import.
+    # Empty keys are not overridden by a local .env file
+    env = {
+        **os.environ,
+        'SQLITE_URL': f'sqlite+aiosqlite:///{database}',
+        'GOOGLE_API_KEY': '',
+        'BRAVE_SEARCH_API_KEY': '',
+        'DEEPSEEK_API_KEY': '',
+        'GEMINI_API_KEY': '',
+    }
+    return subprocess.run(
+        [sys.executable, '-m', 'system_assistant.entry.cli', *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+
+@pytest.mark.asyncio
+async def test_export_and_import_run_without_api_keys(tmp_path: Path):
+    source = await _build_sqlite_gateway(tmp_path / 'source.db')
+    await source.save_many([
+        Chat(id=f'chat-{i}', title=f'chat {i}', messages=[
+            Message(sender='assistant', content='prompt'),
+            Message(sender='user', content=f'question {i}'),
+        ])
+        for i in range(3)
+    ])
+    await source.close()
+
+    exported = _run_cli(tmp_path / 'source.db', 'export', str(tmp_path / 'chats.jsonl.gz'))
+    assert exported.returncode == 0, exported.stderr
+    imported = _run_cli(tmp_path / 'target.db', 'import', str(tmp_path / 'chats.jsonl.gz'))
+    assert imported.returncode == 0, imported.stderr
+
+    target = await _build_sqlite_gateway(tmp_path / 'target.db')
+    chat = await target.get_by_id('chat-2')
+    await target.close()
+    assert chat is not None
+    assert [m.content for m in chat.messages] == ['prompt', 'question 2']
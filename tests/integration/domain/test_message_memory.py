@@ -0,0 +1,61 @@
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable
+
+from system_assistant.domain.vo import Message
+
+
+MESSAGES = 100_000
+MESSAGES_PER_CHAT = 100
+PROMPT = 'You are built-in OS assistant. Directory list: ' + ', '.join(
+    f'file_{i}.txt' for i in range(150)
+)
+TOOL_OUTPUT = '\n'.join(f'drwxr-xr-x  2 user user 4096 Jan  1 00:00 folder_{i}' for i in range(120))
+
+
+@dataclass(eq=False)
+class PlainMessage:
+    """The message representation used before, kept as the baseline"""
+    sender: str
+    content: str
+    seq: int | None = None
+
+
+def _load(factory: Callable[..., object]) -> list[object]:
+    """Build messages from fresh strings, like rows coming from the database"""
+    messages = []
+    for i in range(MESSAGES):
+        seq = i % MESSAGES_PER_CHAT
+        if seq == 0:
+            sender, content = 'assistant', PROMPT
+        elif i % 20 == 0:
+            sender, content = 'assistant', TOOL_OUTPUT
+        else:
+            sender, content = ('user' if seq % 2 else 'assistant'), f'message number {i}'
+        messages.append(factory(
+            sender.encode().decode(), content.encode().decode(), seq=seq,
+        ))
+    return messages
+
+
+def _allocated_bytes(factory: Callable[..., object]) -> int:
+    tracemalloc.start()
+    messages = _load(factory)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(messages) == MESSAGES
+    return size
+
+
+def test_compact_messages_memory_at_100k():
+    plain = _allocated_bytes(PlainMessage)
+    compact = _allocated_bytes(Message)
+
+    assert compact < plain / 3, f'plain={plain / 2**20:.1f}MiB compact={compact / 2**20:.1f}MiB'
+
+
+def test_compressed_content_is_transparent():
+    message = Message(sender='assistant', content=TOOL_OUTPUT)
+
+    assert message.content_size < len(TOOL_OUTPUT)
+    assert message.content == TOOL_OUTPUT
@@ -0,0 +1,93 @@
+from pathlib import Path
+
+import pytest
+
+from system_assistant.application.commands.request_system_help import (
+    RequestSystemHelpCommand,
+    RequestSystemHelpCommandHandler,
+)
+from system_assistant.application.services.ai.base import FakeAIAgent
+from system_assistant.core.config import Config
+from system_assistant.core.types import SystemContext
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.db.sqlite.init import get_engine, init_db
+from system_assistant.infrastructure.gateways.chat.cached import CachedChatGateway
+from system_assistant.infrastructure.gateways.chat.sqlite import SQLiteChatGateway
+from system_assistant.infrastructure.gateways.chat.write_behind import WriteBehindChatGateway
+
+
+def _command(chat_id: str, message: str) -> RequestSystemHelpCommand:
+    return RequestSystemHelpCommand(
+        message=message,
+        system_context=SystemContext(
+            operating_system='Linux', distribution='Debian', cwd=Path('/'),
+        ),
+        chat_id=chat_id,
+    )
+
+
+@pytest.mark.asyncio
+async def test_hot_chat_is_served_from_memory(tmp_path: Path):
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}')
+    await init_db(config)
+    backend = SQLiteChatGateway(get_engine(config))
+    gateway = CachedChatGateway(backend)
+    handler = RequestSystemHelpCommandHandler(gateway, FakeAIAgent(), history_limit=4)
+
+    for i in range(6):
+        await handler.handle(_command('chat', f'question {i}'))
+
+    # The first turn misses (chat doesn't exist yet), every later one is a hit
+    assert gateway.stats.misses == 1
+    assert gateway.stats.hits == 5
+
+    cached = await gateway.get_window('chat', limit=4)
+    persisted = await backend.get_window('chat', limit=4)
+    assert cached is not None and persisted is not None
+    assert [(m.seq, m.content) for m in cached.messages] == [
+        (m.seq, m.content) for m in persisted.messages
+    ]
+    await gateway.close()
+
+
+@pytest.mark.asyncio
+async def test_chats_are_evicted_by_size(tmp_path: Path):
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}')
+    await init_db(config)
+    gateway = CachedChatGateway(SQLiteChatGateway(get_engine(config)), max_bytes=10_000)
+
+    for i in range(5):
+        chat = Chat(id=str(i), title='title', messages=[Message(sender='user', content='x' * 3000)])
+        await gateway.save(chat)
+
+    assert gateway.stats.evictions == 2
+    assert await gateway.get_by_id('0') is not None
+    assert gateway.stats.misses == 1
+    await gateway.close()
+
+
+@pytest.mark.asyncio
+async def test_write_behind_flushes_keep_chats_cached(tmp_path: Path):
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}')
+    await init_db(config)
+    backend = SQLiteChatGateway(get_engine(config))
+    cache = CachedChatGateway(backend)
+    gateway = WriteBehindChatGateway(cache)
+    handler = RequestSystemHelpCommandHandler(gateway, FakeAIAgent(), history_limit=4)
+
+    for i in range(6):
+        await handler.handle(_command('chat', f'question {i}'))
+        await gateway.flush()
+
+    # Flushed batches go through `save_many`, which updates the cached chat
+    assert cache.stats.misses == 1
+    assert cache.stats.hits == 5
+
+    cached = await cache.get_window('chat', limit=4)
+    persisted = await backend.get_window('chat', limit=4)
+    assert cached is not None and persisted is not None
+    assert [(m.seq, m.content) for m in cached.messages] == [
+        (m.seq, m.content) for m in persisted.messages
+    ]
+    await gateway.close()
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import socket
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any
+from urllib.parse import urlparse
+
+import pytest
+
+from system_assistant.core.config import Config
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.db.dgraph.init import init_db
+from system_assistant.infrastructure.gateways.chat.dgraph import DgraphChatGateway
+
+
+QUERY_DELAY = 0.2
+
+
+class StubTxn:
+    def __init__(self, client: 'StubDgraphClient'):
+        self.client = client
+
+    def query(self, query: str, variables: dict[str, str]):
+        if 'last_seq' in query:
+            # Numbering read of a save: the stored `last_seq`, without the round-trip delay
+            seqs = [m['last_seq'] for m in self.client.mutations if 'last_seq' in m]
+            return SimpleNamespace(json=json.dumps(
+                {'chat': [{'last_seq': max(seqs)}] if seqs else []},
+            ))
+        time.sleep(QUERY_DELAY)  # blocking, like a gRPC round-trip in pydgraph
+        return SimpleNamespace(json=json.dumps({'chat': []}))
+
+    def create_mutation(self, set_obj: dict[str, Any]):
+        return set_obj
+
+    def create_request(
+        self, query: str, variables: dict, mutations: list, commit_now: bool = False,
+    ):
+        return mutations
+
+    def do_request(self, request: list):
+        if self.client.error is not None:
+            raise self.client.error
+        self.client.mutations.extend(request)
+
+    def discard(self):
+        ...
+
+
+class StubDgraphClient:
+    def __init__(self, url: str):
+        self.mutations: list[dict[str, Any]] = []
+        self.error: Exception | None = None
+
+    def txn(self, read_only: bool = False) -> StubTxn:
+        return StubTxn(self)
+
+    def close(self):
+        ...
+
+
+def _dgraph_is_running(url: str) -> bool:
+    parsed = urlparse(url)
+    try:
+        with socket.create_connection((parsed.hostname, parsed.port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+@pytest.mark.asyncio
+async def test_requests_do_not_block_event_loop():
+    gateway = DgraphChatGateway('dgraph://stub:9080', client_factory=StubDgraphClient)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.create_task(ticker())
+    started_at = time.perf_counter()
+    await asyncio.gather(*(gateway.get_by_id(str(i)) for i in range(4)))
+    elapsed = time.perf_counter() - started_at
+    ticker_task.cancel()
+    await gateway.close()
+
+    assert ticks >= 10
+    assert elapsed < QUERY_DELAY * 2
+
+
+@pytest.mark.asyncio
+async def test_save_mutates_only_new_messages():
+    gateway = DgraphChatGateway('dgraph://stub:9080', pool_size=1, client_factory=StubDgraphClient)
+    client = gateway._clients[0]
+
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+    await gateway.save(chat)
+    chat.add_message(Message(sender='user', content='hello'))
+    await gateway.save(chat)
+    await gateway.close()
+
+    first, second = client.mutations
+    assert first['uid'] == second['uid'] == 'uid(chat)'
+    assert [m['seq'] for m in first['message']] == [0]
+    assert [(m['seq'], m['content']) for m in second['message']] == [(1, 'hello')]
+
+
+@pytest.mark.asyncio
+async def test_seq_comes_from_storage_with_several_writers():
+    gateway = DgraphChatGateway('dgraph://stub:9080', pool_size=1, client_factory=StubDgraphClient)
+
+    chat = Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+    await gateway.save(chat)
+    # Both loaded the chat before either of them saved
+    first, second = (
+        Chat(id='chat', title='title', messages=[Message(sender='assistant', content='prompt')])
+        for _ in range(2)
+    )
+    first.messages[0].seq = second.messages[0].seq = 0
+    first.add_message(Message(sender='user', content='first'))
+    second.add_message(Message(sender='user', content='second'))
+    await gateway.save(first)
+    await gateway.save(second)
+    await gateway.close()
+
+    assert first.messages[-1].seq == 1
+    assert second.messages[-1].seq == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_save_raises():
+    gateway = DgraphChatGateway('dgraph://stub:9080', pool_size=1, client_factory=StubDgraphClient)
+    gateway._clients[0].error = RuntimeError('unavailable')
+
+    chat = Chat(id='chat', title='title', messages=[Message(sender='user', content='hello')])
+    with pytest.raises(RuntimeError):
+        await gateway.save(chat)
+    await gateway.close()
+
+    assert chat.unsaved_messages() == chat.messages
+
+
+@pytest.mark.asyncio
+async def test_round_trip_against_local_dgraph():
+    config = Config()
+    if not _dgraph_is_running(config.dgraph_url):
+        pytest.skip('Dgraph is not running, start it with `docker compose up -d`')
+    await init_db(config)
+    gateway = DgraphChatGateway(config.dgraph_url)
+
+    chat = Chat(id=str(uuid.uuid4()), title='dgraph', messages=[
+        Message(sender='assistant', content='prompt'),
+        Message(sender='user', content='hello'),
+    ])
+    await gateway.save(chat)
+    window = await gateway.get_window(chat.id, limit=10)
+    assert window is not None
+    window.add_message(Message(sender='assistant', content='hi'))
+    await gateway.save(window)
+
+    loaded = await gateway.get_by_id(chat.id)
+    await gateway.close()
+    assert loaded is not None
+    assert [(m.seq, m.content) for m in loaded.messages] == [(0, 'prompt'), (1, 'hello'), (2, 'hi')]
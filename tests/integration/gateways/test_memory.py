@@ -0,0 +1,59 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from system_assistant.application.gateways.chat import InMemoryChatGateway
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+
+
+def _chat(id: str, content_size: int = 1000) -> Chat:
+    return Chat(id=id, title='title', messages=[Message(sender='user', content='x' * content_size)])
+
+
+@pytest.mark.asyncio
+async def test_memory_budget_is_respected():
+    gateway = InMemoryChatGateway(max_bytes=10_000)
+
+    for i in range(50):
+        await gateway.save(_chat(str(i)))
+
+    stats = gateway.stats()
+    assert stats.resident_bytes <= 10_000
+    assert stats.resident_chats == 8
+    assert stats.evictions == 42
+    assert await gateway.get_by_id('0') is None
+    assert await gateway.get_by_id('49') is not None
+
+
+@pytest.mark.asyncio
+async def test_evicted_chats_are_spilled_to_disk(tmp_path: Path):
+    gateway = InMemoryChatGateway(max_chats=1, spill_dir=tmp_path)
+
+    await gateway.save(_chat('first'))
+    await gateway.save(_chat('second'))
+    assert gateway.stats().spilled_chats == 1
+
+    window = await gateway.get_window('first', limit=10)
+    assert window is not None
+    window.add_message(Message(sender='assistant', content='answer'))
+    await gateway.save(window)
+
+    first = await gateway.get_by_id('first')
+    assert first is not None
+    assert [(m.seq, m.sender) for m in first.messages] == [(0, 'user'), (1, 'assistant')]
+
+    await gateway.close()
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_idle_chats_expire():
+    gateway = InMemoryChatGateway(ttl=0.05)
+
+    await gateway.save(_chat('idle'))
+    await asyncio.sleep(0.1)
+
+    assert await gateway.get_by_id('idle') is None
+    assert gateway.stats().resident_chats == 0
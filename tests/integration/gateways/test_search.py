@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import pytest
+
+from system_assistant.application.gateways.chat import ChatGateway, InMemoryChatGateway
+from system_assistant.application.mediator import Mediator
+from system_assistant.application.queries.search_chats import (
+    SearchChatsQuery,
+    SearchChatsQueryHandler,
+)
+from system_assistant.core.config import Config
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.db.sqlite.init import get_engine, init_db
+from system_assistant.infrastructure.gateways.chat.sqlite import SQLiteChatGateway
+
+
+async def _build_sqlite_gateway(tmp_path: Path) -> SQLiteChatGateway:
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}')
+    await init_db(config)
+    engine = get_engine(config)
+    engine.echo = False
+    return SQLiteChatGateway(engine)
+
+
+async def _fill(gateway: ChatGateway):
+    docker_chat = Chat(id='docker', title='docker', messages=[
+        Message(sender='assistant', content='You are a system assistant'),
+        Message(sender='user', content='How do I restart a docker container?'),
+        Message(sender='assistant', content='Run `docker restart <container>`'),
+    ])
+    await gateway.save(docker_chat)
+    disk_chat = Chat(id='disk', title='disk', messages=[
+        Message(sender='assistant', content='You are a system assistant'),
+        Message(sender='user', content='Why is my disk full?'),
+    ])
+    await gateway.save(disk_chat)
+    # Indexed incrementally: only the message added by this save is new
+    docker_chat.add_message(Message(sender='user', content='And a docker compose service?'))
+    await gateway.save(docker_chat)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('storage', ['memory', 'sqlite'])
+async def test_search_chats(tmp_path: Path, storage: str):
+    gateway: ChatGateway
+    if storage == 'sqlite':
+        gateway = await _build_sqlite_gateway(tmp_path)
+    else:
+        gateway = InMemoryChatGateway()
+    await _fill(gateway)
+    mediator = Mediator()
+    mediator.register_handlers(SearchChatsQuery, [SearchChatsQueryHandler(gateway)])
+
+    hits = await mediator.handle_query(SearchChatsQuery(text='docker'))
+    assert {(hit.chat_id, hit.seq) for hit in hits} == {('docker', 1), ('docker', 2), ('docker', 3)}
+    assert [hit.rank for hit in hits] == sorted(hit.rank for hit in hits)
+    assert all('[docker]' in hit.snippet.lower() for hit in hits)
+
+    page = await mediator.handle_query(SearchChatsQuery(text='docker', limit=2, offset=1))
+    assert [(hit.chat_id, hit.seq) for hit in page] == [(hit.chat_id, hit.seq) for hit in hits[1:3]]
+
+    hits = await mediator.handle_query(SearchChatsQuery(text='disk full'))
+    assert [(hit.chat_id, hit.seq, hit.sender) for hit in hits] == [('disk', 1, 'user')]
+
+    # Every word has to match; FTS5 syntax in the text is matched literally
+    assert await mediator.handle_query(SearchChatsQuery(text='disk docker')) == []
+    assert await mediator.handle_query(SearchChatsQuery(text='"docker" OR')) == []
+
+    await gateway.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_index_built_for_existing_messages(tmp_path: Path):
+    gateway = await _build_sqlite_gateway(tmp_path)
+    await _fill(gateway)
+    async with gateway.engine.begin() as conn:
+        await conn.exec_driver_sql('DROP TABLE message_fts')
+    await init_db(Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}'))
+
+    hits = await gateway.search('compose')
+    assert [(hit.chat_id, hit.seq) for hit in hits] == [('docker', 3)]
+    await gateway.close()
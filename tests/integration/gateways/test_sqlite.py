@@ -0,0 +1,99 @@
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import event
+
+from system_assistant.core.config import Config
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.db.sqlite.init import get_engine, init_db
+from system_assistant.infrastructure.gateways.chat.sqlite import SQLiteChatGateway
+
+
+def _build_gateway(tmp_path: Path) -> tuple[Config, SQLiteChatGateway]:
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{tmp_path / "database.db"}')
+    engine = get_engine(config)
+    engine.echo = False
+    return config, SQLiteChatGateway(engine)
+
+
+def _build_chat(messages_count: int) -> Chat:
+    return Chat(
+        id=str(uuid.uuid4()),
+        title='benchmark',
+        messages=[
+            Message(sender='user' if i % 2 else 'assistant', content=f'message {i}')
+            for i in range(messages_count)
+        ],
+    )
+
+
+def _count_written_rows(gateway: SQLiteChatGateway) -> list[int]:
+    """Number of rows each statement inserts into or updates in the message table"""
+    written: list[int] = []
+
+    @event.listens_for(gateway.engine.sync_engine, 'before_cursor_execute')
+    def count(conn, cursor, statement: str, parameters, context, executemany: bool):
+        if statement.startswith(('INSERT INTO message', 'UPDATE message')):
+            written.append(len(parameters) if executemany else 1)
+
+    return written
+
+
+@pytest.mark.asyncio
+async def test_save_appends_only_new_messages(tmp_path: Path):
+    config, gateway = _build_gateway(tmp_path)
+    await init_db(config)
+
+    chat = _build_chat(3)
+    await gateway.save(chat)
+    assert [m.seq for m in chat.messages] == [0, 1, 2]
+
+    loaded = await gateway.get_by_id(chat.id)
+    assert loaded is not None
+    loaded.add_message(Message(sender='user', content='new'))
+    await gateway.save(loaded)
+
+    reloaded = await gateway.get_by_id(chat.id)
+    assert reloaded is not None
+    assert [m.seq for m in reloaded.messages] == [0, 1, 2, 3]
+    assert reloaded.messages[-1].content == 'new'
+
+
+@pytest.mark.asyncio
+async def test_save_cost_does_not_grow_with_history(tmp_path: Path):
+    config, gateway = _build_gateway(tmp_path)
+    await init_db(config)
+
+    chat = _build_chat(10_000)
+    written = _count_written_rows(gateway)
+    await gateway.save(chat)
+    assert written == [10_000]
+
+    for i in range(30):
+        written.clear()
+        chat.add_message(Message(sender='user', content=f'turn {i}'))
+        await gateway.save(chat)
+        assert written == [1]
+
+
+@pytest.mark.asyncio
+async def test_get_window_loads_system_prompt_and_page(tmp_path: Path):
+    config, gateway = _build_gateway(tmp_path)
+    await init_db(config)
+
+    chat = _build_chat(100)
+    await gateway.save(chat)
+
+    latest = await gateway.get_window(chat.id, limit=5)
+    assert latest is not None
+    assert [m.seq for m in latest.messages] == [0, 95, 96, 97, 98, 99]
+
+    after = await gateway.get_window(chat.id, limit=3, after_seq=10)
+    assert after is not None
+    assert [m.seq for m in after.messages] == [0, 11, 12, 13]
+
+    latest.add_message(Message(sender='user', content='new'))
+    await gateway.save(latest)
+    assert latest.messages[-1].seq == 100
@@ -0,0 +1,93 @@
+from pathlib import Path
+import tracemalloc
+
+import pytest
+
+from system_assistant.application.gateways.chat import InMemoryChatGateway
+from system_assistant.application.services.transfer import (
+    copy_chats,
+    export_chats,
+    import_chats,
+)
+from system_assistant.core.config import Config
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import Message
+from system_assistant.infrastructure.db.sqlite.init import get_engine, init_db
+from system_assistant.infrastructure.gateways.chat.sqlite import SQLiteChatGateway
+
+
+async def _build_sqlite_gateway(path: Path) -> SQLiteChatGateway:
+    config = Config(sqlite_url=f'sqlite+aiosqlite:///{path}')
+    await init_db(config)
+    engine = get_engine(config)
+    engine.echo = False
+    return SQLiteChatGateway(engine)
+
+
+def _build_chat(i: int, messages_count: int = 10) -> Chat:
+    chat = Chat(id=f'chat-{i:06}', title=f'chat {i}', messages=[
+        Message(sender='user' if j % 2 else 'assistant', content=f'chat {i} message {j}')
+        for j in range(messages_count)
+    ])
+    if i % 2:
+        chat.summary, chat.summary_seq = f'summary {i}', 3
+    return chat
+
+
+def _as_rows(chat: Chat) -> tuple:
+    return (
+        chat.id,
+        chat.title,
+        chat.summary,
+        chat.summary_seq,
+        [(m.sender, m.content, m.seq) for m in chat.messages],
+    )
+
+
+@pytest.mark.asyncio
+async def test_copy_memory_to_sqlite_and_back_through_compressed_file(tmp_path: Path):
+    memory = InMemoryChatGateway()
+    for i in range(1200):
+        await memory.save(_build_chat(i, messages_count=i % 7 + 1))
+
+    target = await _build_sqlite_gateway(tmp_path / 'target.db')
+    progress_updates = []
+    progress = await copy_chats(
+        memory, target, batch_size=100, on_progress=lambda p: progress_updates.append(p.chats),
+    )
+    assert progress.chats == 1200
+    assert progress_updates == list(range(100, 1201, 100))
+
+    dump = tmp_path / 'chats.jsonl.gz'
+    assert (await export_chats(target, dump, batch_size=100)).chats == 1200
+    restored = await _build_sqlite_gateway(tmp_path / 'restored.db')
+    assert (await import_chats(restored, dump, batch_size=100)).chats == 1200
+
+    expected = sorted([_as_rows(chat) async for batch in memory.iter_chats() for chat in batch])
+    assert sorted([_as_rows(chat) async for batch in restored.iter_chats() for chat in batch]) == expected
+    await target.close()
+    await restored.close()
+
+
+@pytest.mark.asyncio
+async def test_export_memory_does_not_grow_with_chats(tmp_path: Path):
+    """Batches are streamed, so exporting ~20MiB of history takes a fraction of it in memory"""
+    gateway = await _build_sqlite_gateway(tmp_path / 'database.db')
+    for start in range(0, 2000, 100):
+        await gateway.save_many([
+            Chat(id=f'chat-{i:06}', title=f'chat {i}', messages=[
+                Message(sender='user', content=f'{i} {j} '.ljust(1024, 'x')) for j in range(10)
+            ])
+            for i in range(start, start + 100)
+        ])
+
+    tracemalloc.start()
+    progress = await export_chats(gateway, tmp_path / 'chats.jsonl', batch_size=50)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    await gateway.close()
+    print(f'Exported {progress}, peak memory {peak / 2**20:.1f}MiB')
+
+    assert progress.chats == 2000
+    assert (tmp_path / 'chats.jsonl').stat().st_size > 20 * 2**20
+    assert peak < 8 * 2**20
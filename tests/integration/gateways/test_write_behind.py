@@ -0,0 +1,190 @@
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+import pytest
+
+from system_assistant.application.commands.request_system_help import (
+    RequestSystemHelpCommand,
+    RequestSystemHelpCommandHandler,
+)
+from system_assistant.application.gateways.chat import ChatGateway, InMemoryChatGateway
+from system_assistant.application.services.ai.base import FakeAIAgent
+from system_assistant.core.exceptions import UnexpectedApplicationException
+from system_assistant.core.types import SystemContext
+from system_assistant.domain.entities.chat import Chat
+from system_assistant.domain.vo import ID, Message
+from system_assistant.infrastructure.gateways.chat.write_behind import WriteBehindChatGateway
+
+
+SAVE_DELAY = 0.05
+
+
+class SlowChatGateway(InMemoryChatGateway):
+    """Memory gateway that pretends every save is a slow database commit"""
+
+    def __init__(self):
+        super().__init__()
+        self.saves = 0
+
+    async def save(self, chat: Chat) -> ID:
+        await asyncio.sleep(SAVE_DELAY)
+        self.saves += 1
+        return await super().save(chat)
+
+
+def _command(chat_id: str) -> RequestSystemHelpCommand:
+    return RequestSystemHelpCommand(
+        message='what is in this folder?',
+        system_context=SystemContext(
+            operating_system='Linux', distribution='Debian', cwd=Path('/'),
+        ),
+        chat_id=chat_id,
+    )
+
+
+async def _median_turn_latency(gateway: ChatGateway, turns: int = 10) -> float:
+    handler = RequestSystemHelpCommandHandler(gateway, FakeAIAgent())
+    timings = []
+    for i in range(turns):
+        started_at = time.perf_counter()
+        await handler.handle(_command(f'chat-{i}'))
+        timings.append(time.perf_counter() - started_at)
+    return statistics.median(timings)
+
+
+@pytest.mark.asyncio
+async def test_turn_latency_with_and_without_write_behind():
+    direct = await _median_turn_latency(SlowChatGateway())
+
+    backend = SlowChatGateway()
+    write_behind = WriteBehindChatGateway(backend)
+    deferred = await _median_turn_latency(write_behind)
+    await write_behind.close()
+
+    assert direct >= SAVE_DELAY
+    assert deferred < direct / 5
+    assert len(backend.chats) == 10
+
+
+@pytest.mark.asyncio
+async def test_pending_saves_of_same_chat_are_coalesced():
+    backend = SlowChatGateway()
+    gateway = WriteBehindChatGateway(backend, flush_interval=0.1)
+
+    chat = Chat(id='chat', title='title')
+    for i in range(5):
+        chat.add_message(Message(sender='user', content=str(i)))
+        await gateway.save(chat)
+    await gateway.close()
+
+    assert backend.saves == 1
+    assert [m.seq for m in chat.messages] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_save_waits_for_room_when_queue_is_full():
+    backend = SlowChatGateway()
+    gateway = WriteBehindChatGateway(backend, max_pending=1, flush_interval=0)
+
+    await gateway.save(Chat(id='first', title='title'))
+    started_at = time.perf_counter()
+    await gateway.save(Chat(id='second', title='title'))
+    waited = time.perf_counter() - started_at
+    await gateway.close()
+
+    assert waited >= SAVE_DELAY * 0.9
+    assert set(backend.chats) == {'first', 'second'}
+
+
+class BatchCountingChatGateway(InMemoryChatGateway):
+    def __init__(self):
+        super().__init__()
+        self.batches: list[list[ID]] = []
+
+    async def save_many(self, chats: list[Chat]) -> None:
+        self.batches.append([chat.id for chat in chats])
+        await super().save_many(chats)
+
+
+@pytest.mark.asyncio
+async def test_pending_chats_are_flushed_in_one_batch():
+    backend = BatchCountingChatGateway()
+    gateway = WriteBehindChatGateway(backend, flush_interval=0.1)
+
+    for i in range(5):
+        await gateway.save(Chat(id=str(i), title='title'))
+    await gateway.close()
+
+    assert backend.batches == [['0', '1', '2', '3', '4']]
+
+
+@pytest.mark.asyncio
+async def test_unsaved_messages_of_two_objects_of_same_chat_are_merged():
+    backend = InMemoryChatGateway()
+    gateway = WriteBehindChatGateway(backend, flush_interval=0.1)
+
+    first = Chat(id='chat', title='title')
+    first.add_message(Message(sender='user', content='first'))
+    await gateway.save(first)
+    second = Chat(id='chat', title='title')
+    second.add_message(Message(sender='user', content='second'))
+    await gateway.save(second)
+    await gateway.close()
+
+    saved = await backend.get_by_id('chat')
+    assert saved is not None
+    assert [(m.content, m.seq) for m in saved.messages] == [('first', 0), ('second', 1)]
+    assert second.messages[0].seq == 1
+
+
+class FailingChatGateway(InMemoryChatGateway):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.attempts = 0
+
+    async def save_many(self, chats: list[Chat]) -> None:
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError('database is down')
+        await super().save_many(chats)
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_retried_with_backoff():
+    backend = FailingChatGateway(failures=2)
+    gateway = WriteBehindChatGateway(backend, flush_interval=0, retry_backoff=0.05)
+
+    started_at = time.perf_counter()
+    await gateway.save(Chat(id='chat', title='title'))
+    while 'chat' not in backend.chats:
+        await asyncio.sleep(0.01)
+    waited = time.perf_counter() - started_at
+    await gateway.close()
+
+    assert backend.attempts == 3
+    # Two retries: 0.05 and then 0.1 seconds later
+    assert waited >= 0.15 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_close_raises_when_chats_are_left_unsaved():
+    backend = FailingChatGateway(failures=100)
+    gateway = WriteBehindChatGateway(
+        backend, flush_interval=0, max_retries=2, retry_backoff=0.01,
+    )
+
+    chat = Chat(id='chat', title='title')
+    chat.add_message(Message(sender='user', content='question'))
+    await gateway.save(chat)
+    while backend.attempts < 3:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+
+    # The batch was given up instead of being retried forever
+    assert backend.attempts == 3
+    assert chat.unsaved_messages() == chat.messages
+    with pytest.raises(UnexpectedApplicationException, match='chat'):
+        await gateway.close()
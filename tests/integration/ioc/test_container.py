@@ -0,0 +1,52 @@
+import typing as t
+
+from punq import Container  # type: ignore[import-untyped]
+
+from system_assistant.application.commands.request_system_help import (
+    RequestSystemHelpCommand,
+    RequestSystemHelpCommandHandler,
+)
+from system_assistant.application.mediator import Mediator
+from system_assistant.application.services.ai.context import ContextWindowManager
+from system_assistant.core.config import Config
+from system_assistant.infrastructure.ioc import (
+    init_base_container,
+    register_gateway,
+    register_llm,
+    register_mediator,
+    register_mediator_handlers,
+)
+
+
+def _container(config: Config | None = None) -> Container:
+    container = init_base_container()
+    if config is not None:
+        container.register(Config, instance=config)
+    register_gateway(container, 'memory')
+    register_llm(container, llm_type='fake')
+    register_mediator_handlers(container)
+    register_mediator(container)
+    return container
+
+
+def test_request_system_help_handler_is_resolved():
+    container = _container()
+
+    handler = t.cast(
+        RequestSystemHelpCommandHandler, container.resolve(RequestSystemHelpCommandHandler),
+    )
+    assert isinstance(handler._context_window, ContextWindowManager)
+
+    mediator = t.cast(Mediator, container.resolve(Mediator))
+    assert isinstance(
+        mediator.command_handlers[RequestSystemHelpCommand][0], RequestSystemHelpCommandHandler,
+    )
+
+
+def test_history_limit_comes_from_config():
+    container = _container(Config(history_limit=7))
+
+    handler = t.cast(
+        RequestSystemHelpCommandHandler, container.resolve(RequestSystemHelpCommandHandler),
+    )
+    assert handler._history_limit == 7
@@ -0,0 +1,124 @@
+import asyncio
+import base64
+import json
+from pathlib import Path
+import shutil
+import ssl
+import subprocess
+import time
+
+import httpx
+import pytest
+
+from system_assistant.core.config import Config
+from system_assistant.infrastructure.services.http import build_http_client, prewarm
+from system_assistant.infrastructure.services.text_to_speech.google import (
+    GoogleTextToSpeechService,
+)
+
+
+AUDIO = b'mp3 bytes'
+
+
+class TLSStub:
+    """HTTPS server on localhost answering every request like the text-to-speech API"""
+
+    def __init__(self, cert: Path, key: Path):
+        self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        self.context.load_cert_chain(cert, key)
+        self.connections = 0
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None
+        return f'https://localhost:{self._server.sockets[0].getsockname()[1]}'
+
+    async def __aenter__(self) -> 'TLSStub':
+        self._server = await asyncio.start_server(
+            self._handle, '127.0.0.1', 0, ssl=self.context,
+        )
+        return self
+
+    async def __aexit__(self, *args):
+        assert self._server is not None
+        self._server.close()
+        for writer in self._writers:
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        body = json.dumps({'audioContent': base64.b64encode(AUDIO).decode()}).encode()
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.decode().split('\r\n'):
+                    if line.lower().startswith('content-length:'):
+                        length = int(line.split(':')[1])
+                await reader.readexactly(length)
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    + f'Content-Length: {len(body)}\r\n\r\n'.encode()
+                    + (b'' if head.startswith(b'HEAD') else body)
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+@pytest.fixture
+def certificate(tmp_path: Path) -> tuple[Path, Path]:
+    if shutil.which('openssl') is None:
+        pytest.skip('openssl is required to make a certificate')
+    cert, key = tmp_path / 'cert.pem', tmp_path / 'key.pem'
+    subprocess.run(
+        [
+            'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+            '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost',
+            '-keyout', str(key), '-out', str(cert),
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+@pytest.mark.asyncio
+async def test_shared_client_reuses_connection(certificate: tuple[Path, Path]):
+    cert, key = certificate
+    sentences = 20
+
+    async with TLSStub(cert, key) as stub:
+        # Before: a client per sentence, every sentence pays for a TCP and TLS handshake
+        started_at = time.perf_counter()
+        for _ in range(sentences):
+            async with httpx.AsyncClient(verify=ssl.create_default_context(cafile=cert)) as client:
+                service = GoogleTextToSpeechService('key', client, base_url=stub.url)
+                assert await service.synthesize('Hello there', 'bytes') == AUDIO
+        per_request = time.perf_counter() - started_at
+        assert stub.connections == sentences
+
+    async with TLSStub(cert, key) as stub:
+        client = build_http_client(Config(), verify=ssl.create_default_context(cafile=cert))
+        service = GoogleTextToSpeechService('key', client, base_url=stub.url)
+        await prewarm(client, [stub.url])
+        started_at = time.perf_counter()
+        for _ in range(sentences):
+            assert await service.synthesize('Hello there', 'bytes') == AUDIO
+        shared = time.perf_counter() - started_at
+        await client.aclose()
+
+        assert stub.connections == 1
+
+    print(
+        f'{sentences} sentences: client per request {per_request * 1000:.0f}ms, '
+        f'shared prewarmed client {shared * 1000:.0f}ms'
+    )
+    assert shared < per_request
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from typing import AsyncIterator
+
+import pytest
+
+from system_assistant.application.services.text_to_speech.pipeline import speak, split_sentences
+
+
+SENTENCES = [
+    f'This is sentence number {i} of the answer, it has a few more words.' for i in range(6)
+]
+TOKEN_DELAY = 0.005
+SYNTHESIS_DELAY_PER_CHAR = 0.0005
+PLAYBACK_DELAY = 0.04
+
+
+async def _generate_answer() -> AsyncIterator[str]:
+    """Fake agent stream: the answer word by word"""
+    for sentence in SENTENCES:
+        for word in sentence.split():
+            await asyncio.sleep(TOKEN_DELAY)
+            yield f'{word} '
+
+
+class FakeTextToSpeech:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def synthesize(self, text: str) -> bytes:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(SYNTHESIS_DELAY_PER_CHAR * len(text))
+        self.in_flight -= 1
+        return text.encode()
+
+
+class FakePlayer:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_audio_at: float | None = None
+        self.played: list[str] = []
+
+    def play(self, speech: bytes):
+        self.first_audio_at = self.first_audio_at or time.perf_counter()
+        time.sleep(PLAYBACK_DELAY)
+        self.played.append(speech.decode())
+
+
+@pytest.mark.asyncio
+async def test_sentences_are_split_while_streaming():
+    chunks = ['Hi. ', 'Short. This sentence', ' is long enough to go alone! Then', ' the tail']
+
+    async def stream() -> AsyncIterator[str]:
+        for chunk in chunks:
+            yield chunk
+
+    assert [sentence async for sentence in split_sentences(stream())] == [
+        'Hi. Short. This sentence is long enough to go alone!', 'Then the tail',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_first_audio_after_one_sentence_instead_of_whole_answer():
+    # Before: the whole answer is generated, then synthesized, then played
+    text_to_speech, player = FakeTextToSpeech(), FakePlayer()
+    text = ''.join([chunk async for chunk in _generate_answer()])
+    player.play(await text_to_speech.synthesize(text.strip()))
+    assert player.first_audio_at is not None
+    sequential = player.first_audio_at - player.started_at
+
+    text_to_speech, player = FakeTextToSpeech(), FakePlayer()
+    await speak(
+        split_sentences(_generate_answer()), text_to_speech.synthesize, player.play, prefetch=2,
+    )
+    assert player.first_audio_at is not None
+    pipelined = player.first_audio_at - player.started_at
+    print(f'First audio after: sequential={sequential * 1000:.0f}ms, pipelined={pipelined * 1000:.0f}ms')
+
+    assert player.played == SENTENCES
+    assert text_to_speech.max_in_flight <= 2
+    assert pipelined < sequential / 3